@@ -0,0 +1,78 @@
+"""
+Vehicle access resolution shared by the REST views and the WebSocket consumers.
+
+``is_admin`` is the single admin check. ``permitted_vehicle_ids`` returns
+the ids of the vehicles a non-admin user holds a ``VehicleUserPermission``
+on, from a per-process cache (bounded LRU with the TTL of the user cache),
+so access checks stop re-running the permission subquery on every request,
+connection and ingestion batch. Saving or deleting a permission invalidates
+the user's entry in every worker through the event bus once the transaction
+commits. A worker whose bus listener is not running would miss those
+invalidations, so it reads the permissions from the database instead, like
+``tracking.cache.cache_enabled`` does for positions.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from core import events
+from .principals import UserStateCache
+
+ACCESS_CHANGED_EVENT = 'accounts.vehicle_access_changed'
+
+access_cache = UserStateCache()
+
+
+def is_admin(user):
+    """Whether ``user`` may see and manage every vehicle (ADMIN role, staff or superuser)."""
+    if not (user and user.is_authenticated):
+        return False
+    return bool(
+        user.is_superuser or
+        user.is_staff or
+        str(getattr(user, 'role', '') or '').upper() == 'ADMIN'
+    )
+
+
+def _apply_access_changed(payload):
+    access_cache.invalidate(payload['user_id'])
+
+
+events.subscribe(ACCESS_CHANGED_EVENT, _apply_access_changed)
+
+
+def invalidate_vehicle_access(user_id):
+    """Forget the cached vehicle ids of a user in every worker once the transaction commits."""
+    transaction.on_commit(lambda: events.publish(ACCESS_CHANGED_EVENT, {'user_id': user_id}))
+
+
+def permitted_vehicle_ids(user):
+    """Frozen set of the vehicle ids ``user`` holds a permission on; None for admins (no restriction)."""
+    if is_admin(user):
+        return None
+    cached = events.listener.running
+    vehicle_ids = access_cache.get(user.id) if cached else None
+    if vehicle_ids is None:
+        from planning.models import VehicleUserPermission
+        vehicle_ids = frozenset(
+            VehicleUserPermission.objects.filter(user_id=user.id).values_list('vehicle_id', flat=True)
+        )
+        if cached:
+            access_cache.put(user.id, vehicle_ids)
+    return vehicle_ids
+
+
+def can_access_vehicle(user, vehicle_id):
+    """Whether ``user`` is an admin or holds a permission on the vehicle."""
+    vehicle_ids = permitted_vehicle_ids(user)
+    if vehicle_ids is None:
+        return True
+    try:
+        return int(vehicle_id) in vehicle_ids
+    except (TypeError, ValueError):
+        return False
+
+
+@receiver(post_save, sender='planning.VehicleUserPermission')
+@receiver(post_delete, sender='planning.VehicleUserPermission')
+def permission_changed(sender, instance, **kwargs):
+    invalidate_vehicle_access(instance.user_id)
@@ -5,3 +5,6 @@ class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
 
+    def ready(self):
+        # تسجيل مستقبلات إشارات صلاحيات المركبات وتغييرات المستخدمين
+        from . import access, principals  # noqa: F401
@@ -1,4 +1,5 @@
 from rest_framework import permissions
+from .access import is_admin
 
 class IsAdminRole(permissions.BasePermission):
     """
@@ -11,12 +12,7 @@ class IsAdminRole(permissions.BasePermission):
             return False
         
         # التحقق من الصلاحيات الإدارية بكافة أشكالها لضمان الوصول
-        is_admin = (
-            user.is_superuser or 
-            user.is_staff or 
-            getattr(user, 'role', '').upper() == 'ADMIN'
-        )
-        return is_admin
+        return is_admin(user)
 
 class IsAdminOrReadOnly(permissions.BasePermission):
     """
@@ -33,12 +29,7 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         if not (user and user.is_authenticated):
             return False
             
-        is_admin = (
-            user.is_superuser or 
-            user.is_staff or 
-            getattr(user, 'role', '').upper() == 'ADMIN'
-        )
-        return is_admin
+        return is_admin(user)
 
 class VehicleAccessPermission(permissions.BasePermission):
     """
@@ -57,12 +48,7 @@ class VehicleAccessPermission(permissions.BasePermission):
             return True
         
         # أي عملية تغيير تتطلب صلاحيات مسؤول
-        is_admin = (
-            user.is_superuser or 
-            user.is_staff or 
-            getattr(user, 'role', '').upper() == 'ADMIN'
-        )
-        return is_admin
+        return is_admin(user)
 
     def has_object_permission(self, request, view, obj):
         user = request.user
@@ -70,12 +56,7 @@ class VehicleAccessPermission(permissions.BasePermission):
             return False
 
         # المسؤول لديه صلاحية كاملة على أي كائن مركبة
-        is_admin = (
-            user.is_superuser or 
-            user.is_staff or 
-            getattr(user, 'role', '').upper() == 'ADMIN'
-        )
-        if is_admin:
+        if is_admin(user):
             return True
         
         # المستخدم العادي لديه صلاحية القراءة فقط للمركبات التي تظهر له
@@ -96,12 +77,7 @@ class PlanAccessPermission(permissions.BasePermission):
             return False
 
         # الأدمن لديه صلاحية مطلقة
-        is_admin = (
-            user.is_superuser or 
-            user.is_staff or 
-            getattr(user, 'role', '').upper() == 'ADMIN'
-        )
-        if is_admin:
+        if is_admin(user):
             return True
         
         # السماح للمالك فقط بالتعديل أو الحذف
@@ -0,0 +1,162 @@
+"""
+Lightweight authenticated users for the WebSocket handshake.
+
+``authenticate_token`` verifies an access token once and returns a
+``UserPrincipal`` built from a small per-process cache of the user's role and
+``is_active``, ``is_staff`` and ``is_superuser`` flags, so a reconnect storm
+costs one query per user rather than one per connection. The cache is bounded
+(LRU), its entries expire after USER_CACHE_TTL_SECONDS, and ``invalidate_user``
+drops an entry in every worker through the event bus once a save that
+changes any of those fields commits.
+"""
+import threading
+import time
+from collections import OrderedDict
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from core import events
+
+USER_CHANGED_EVENT = 'accounts.user_changed'
+# Columns of the cached user row, in the order of load_user_state
+USER_STATE_FIELDS = ('email', 'role', 'is_active', 'is_staff', 'is_superuser')
+
+
+class UserPrincipal:
+    """The fields of an authenticated user the tracking code needs, without a model instance."""
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, email, role, is_active=True, is_staff=False, is_superuser=False, full_name=''):
+        self.id = self.pk = id
+        self.email = email
+        self.role = role
+        self.is_active = is_active
+        self.is_staff = is_staff
+        self.is_superuser = is_superuser
+        self.full_name = full_name or email
+
+    def __str__(self):
+        return self.email
+
+    def __repr__(self):
+        return f'<UserPrincipal {self.id} {self.email} {self.role}>'
+
+
+class UserStateCache:
+    """Bounded LRU of user id -> cached state (e.g. the row of ``load_user_state``) with a TTL."""
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or getattr(settings, 'USER_CACHE_MAX_ENTRIES', 10000)
+        self.ttl = ttl or getattr(settings, 'USER_CACHE_TTL_SECONDS', 60)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or now - entry[0] > self.ttl:
+                self._entries.pop(user_id, None)
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.stats['hits'] += 1
+            return entry[1]
+
+    def put(self, user_id, state):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), state)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.stats['invalidations'] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, 'entries': len(self._entries)}
+
+
+user_cache = UserStateCache()
+
+
+def _apply_user_changed(payload):
+    user_cache.invalidate(payload['user_id'])
+
+
+events.subscribe(USER_CHANGED_EVENT, _apply_user_changed)
+
+
+def invalidate_user(user_id):
+    """Forget the cached state of a user in every worker once the transaction commits."""
+    transaction.on_commit(lambda: events.publish(USER_CHANGED_EVENT, {'user_id': user_id}))
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    # Saves that touch none of the cached fields (e.g. last_login) keep the entry
+    if update_fields is not None and not set(update_fields) & set(USER_STATE_FIELDS):
+        return
+    invalidate_user(instance.pk)
+
+
+def load_user_state(user_id):
+    """``(email, role, is_active, is_staff, is_superuser)`` of a user from the database, cached; None if missing."""
+    row = get_user_model().objects.filter(id=user_id).values_list(*USER_STATE_FIELDS).first()
+    if row is None:
+        return None
+    state = tuple(row)
+    user_cache.put(user_id, state)
+    return state
+
+
+def verified_access_token(raw_token):
+    """The decoded access token (signature, expiry and type checked once), or None."""
+    try:
+        return AccessToken(raw_token)
+    except TokenError:
+        return None
+
+
+async def authenticate_token(raw_token):
+    """``UserPrincipal`` of a raw access token, or None when invalid or inactive.
+
+    Only a cache miss leaves the event loop for a database query. The role
+    and the active, staff and superuser flags come from the cached user row,
+    so a demotion applies before the token expires; only the display name
+    comes from the token.
+    """
+    token = verified_access_token(raw_token)
+    if token is None:
+        return None
+    user_id = token.get(jwt_settings.USER_ID_CLAIM)
+    if user_id is None:
+        return None
+    state = user_cache.get(user_id)
+    if state is None:
+        state = await database_sync_to_async(load_user_state)(user_id)
+    if state is None:
+        return None
+    email, role, is_active, is_staff, is_superuser = state
+    if not is_active:
+        return None
+    return UserPrincipal(
+        id=user_id,
+        email=email,
+        role=role,
+        is_active=is_active,
+        is_staff=is_staff,
+        is_superuser=is_superuser,
+        full_name=token.get('full_name', ''),
+    )
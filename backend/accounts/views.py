@@ -154,6 +154,7 @@ def admin_users_update_view(request, user_id):
     if is_active is not None:
         user.is_active = bool(is_active)
     
+    # Saving drops the cached role/is_active used by the WebSocket authentication in every worker
     user.save()
     serializer = UserSerializer(user)
     return Response(serializer.data)
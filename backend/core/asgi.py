@@ -20,6 +20,7 @@ django_asgi_app = get_asgi_application()
 from channels.routing import ProtocolTypeRouter, URLRouter
 from tracking.middleware import JWTAuthMiddleware
 from core import routing
+from core.events import EventBusMiddleware
 
 # 5. تعريف مكدس الـ WebSocket مع حماية JWT وتوجيه المسارات
 # المسارات مستخرجة من core/routing.py
@@ -30,7 +31,8 @@ websocket_middleware_stack = JWTAuthMiddleware(
 )
 
 # 6. التوجيه النهائي للبروتوكولات (HTTP و WebSocket)
-application = ProtocolTypeRouter({
+# مع تشغيل مستمع ناقل الأحداث على حلقة الخادم عند أول اتصال
+application = EventBusMiddleware(ProtocolTypeRouter({
     "http": django_asgi_app,
     "websocket": websocket_middleware_stack,
-})
\ No newline at end of file
+}))
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Process-wide event bus built on the channel layer.
+
+Every worker process listens on its own channel, which is a member of a
+single group. ``publish`` sends to that group, so each worker (the sender
+included) runs the handlers registered for the event type. With the Redis
+channel layer this keeps in-process caches coherent across daphne workers;
+with the in-memory layer it degrades to a local dispatch.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+logger = logging.getLogger(__name__)
+
+BUS_GROUP = 'tracking_events'
+# Channel layers expire group membership (one day by default); re-join well before that
+REJOIN_SECONDS = 3600
+
+_handlers = defaultdict(list)
+
+
+def subscribe(event_type, handler):
+    """Register ``handler(payload)`` for an event type (synchronous, must not block)."""
+    if handler not in _handlers[event_type]:
+        _handlers[event_type].append(handler)
+
+
+def dispatch(event_type, payload):
+    """Run the local handlers of an event."""
+    for handler in list(_handlers.get(event_type, ())):
+        try:
+            handler(payload)
+        except Exception:
+            logger.exception('Event handler failed for %s', event_type)
+
+
+async def _send(event_type, payload):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    await channel_layer.group_send(BUS_GROUP, {
+        'type': 'bus.event',
+        'event': event_type,
+        'payload': {**payload, '_origin': listener.channel_name},
+    })
+
+
+async def apublish(event_type, payload):
+    """Publish an event to every worker process.
+
+    Handlers in this process run immediately, so local state never waits for
+    the round trip; the listener skips the echo of events sent from here.
+    """
+    dispatch(event_type, payload)
+    try:
+        await _send(event_type, payload)
+    except Exception:
+        logger.exception('Failed to publish %s', event_type)
+
+
+def publish(event_type, payload):
+    """Synchronous ``apublish`` for views, signals and database threads."""
+    dispatch(event_type, payload)
+    try:
+        async_to_sync(_send)(event_type, payload)
+    except Exception:
+        logger.exception('Failed to publish %s', event_type)
+
+
+class EventListener:
+    """Receive bus events for this process from the channel layer."""
+
+    def __init__(self):
+        self.channel_name = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start listening from inside the running event loop (idempotent)."""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def astart(self):
+        self.start()
+
+    async def _run(self):
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        self.channel_name = await channel_layer.new_channel()
+        await channel_layer.group_add(BUS_GROUP, self.channel_name)
+        rejoin_task = asyncio.create_task(self._rejoin(channel_layer))
+        try:
+            while True:
+                try:
+                    message = await channel_layer.receive(self.channel_name)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception('Event bus receive failed')
+                    await asyncio.sleep(1)
+                    continue
+
+                payload = message.get('payload') or {}
+                if payload.get('_origin') == self.channel_name:
+                    continue
+                dispatch(message.get('event'), payload)
+        finally:
+            rejoin_task.cancel()
+
+    async def _rejoin(self, channel_layer):
+        while True:
+            await asyncio.sleep(REJOIN_SECONDS)
+            await channel_layer.group_add(BUS_GROUP, self.channel_name)
+
+
+listener = EventListener()
+
+
+class EventBusMiddleware:
+    """ASGI middleware that starts this worker's listener with its first connection.
+
+    The listener needs the server's long-lived event loop, so it is started
+    from the ASGI application rather than from ``AppConfig.ready``. Sync code
+    (views, WSGI, management commands, tests) only checks
+    ``listener.running`` and reads the database while it is False.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        listener.start()
+        return await self.app(scope, receive, send)
@@ -2,11 +2,15 @@
 WebSocket routing configuration.
 """
 from django.urls import re_path
-from tracking.consumers import LiveTrackingConsumer
+from tracking.consumers import FleetTrackingConsumer, LiveTrackingConsumer, LocationIngestConsumer
 
 # تعريف قائمة المسارات الخاصة ببروتوكول WebSocket
 websocket_urlpatterns = [
     # توجيه طلبات التتبع الحي إلى LiveTrackingConsumer
     # المسار المستخدم في الواجهة الأمامية سيكون: ws://domain/ws/tracking/live/?vehicle_id=ID
     re_path(r'^ws/tracking/live/$', LiveTrackingConsumer.as_asgi()),
+    # متابعة عدة مركبات أو مناطق عبر اتصال واحد: ws://domain/ws/tracking/fleet/
+    re_path(r'^ws/tracking/fleet/$', FleetTrackingConsumer.as_asgi()),
+    # استقبال دفعات المواقع الحقيقية من أجهزة التتبع: ws://domain/ws/tracking/ingest/
+    re_path(r'^ws/tracking/ingest/$', LocationIngestConsumer.as_asgi()),
 ]
\ No newline at end of file
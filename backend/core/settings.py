@@ -191,6 +191,11 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Users authenticated on WebSocket handshakes (accounts/principals.py): cached role and
+# is_active per user, invalidated when an admin updates the user
+USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000))
+USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL_SECONDS', 60))
+
 # Channels Configuration
 CHANNEL_LAYERS = {
     'default': {
@@ -207,4 +212,71 @@ if os.getenv('USE_REDIS', 'False') != 'True':
         'default': {
             'BACKEND': 'channels.layers.InMemoryChannelLayer'
         }
-    }
\ No newline at end of file
+    }
+# Live tracking simulation
+# Interval (seconds) between two positions of a simulated vehicle
+SIMULATION_TICK_SECONDS = float(os.getenv('SIMULATION_TICK_SECONDS', 2))
+# Average speed (km/h) of simulated vehicles along their route; each vehicle varies by up to 15%
+SIMULATION_SPEED_KMH = float(os.getenv('SIMULATION_SPEED_KMH', 45))
+# Streaming flags of watched vehicles are re-read this often (seconds), so a
+# lost streaming event cannot leave a vehicle paused or running for good
+SIMULATION_STREAMING_RESYNC_SECONDS = float(os.getenv('SIMULATION_STREAMING_RESYNC_SECONDS', 30))
+
+# Write-behind buffer for vehicle locations (tracking/writer.py)
+LOCATION_WRITER_BATCH_SIZE = int(os.getenv('LOCATION_WRITER_BATCH_SIZE', 500))
+LOCATION_WRITER_FLUSH_SECONDS = float(os.getenv('LOCATION_WRITER_FLUSH_SECONDS', 1.0))
+LOCATION_WRITER_MAX_QUEUE = int(os.getenv('LOCATION_WRITER_MAX_QUEUE', 10000))
+
+# Maximum number of points accepted in one ingestion request or WebSocket frame
+LOCATION_INGEST_MAX_POINTS = int(os.getenv('LOCATION_INGEST_MAX_POINTS', 5000))
+
+# In-process latest position cache (tracking/cache.py)
+POSITION_CACHE_MAX_ENTRIES = int(os.getenv('POSITION_CACHE_MAX_ENTRIES', 50000))
+POSITION_CACHE_TTL_SECONDS = int(os.getenv('POSITION_CACHE_TTL_SECONDS', 600))
+
+# Partitioning of the location history (tracking/partitions.py, manage_location_partitions)
+LOCATION_PARTITION_INTERVAL = os.getenv('LOCATION_PARTITION_INTERVAL', 'month')  # 'day' or 'month'
+LOCATION_PARTITIONS_AHEAD = int(os.getenv('LOCATION_PARTITIONS_AHEAD', 3))
+# Number of past intervals to keep; None keeps every partition
+LOCATION_PARTITION_RETENTION = int(os.environ['LOCATION_PARTITION_RETENTION']) if os.getenv('LOCATION_PARTITION_RETENTION') else None
+# Lower bound (days before `to`/now) applied to history queries without `from`; None disables it
+LOCATION_HISTORY_DEFAULT_DAYS = int(os.environ['LOCATION_HISTORY_DEFAULT_DAYS']) if os.getenv('LOCATION_HISTORY_DEFAULT_DAYS') else None
+
+# Rollups of the location history (tracking/rollups.py, rollup_locations)
+# Raw points older than this are deleted once rolled up; None keeps them
+LOCATION_RAW_RETENTION_DAYS = int(os.getenv('LOCATION_RAW_RETENTION_DAYS', 30)) or None
+# Minute rollups older than this are deleted; None keeps them (hour rollups are always kept)
+LOCATION_MINUTE_ROLLUP_RETENTION_DAYS = int(os.environ['LOCATION_MINUTE_ROLLUP_RETENTION_DAYS']) if os.getenv('LOCATION_MINUTE_ROLLUP_RETENTION_DAYS') else None
+# Automatic history resolution: ranges up to RAW_MAX_HOURS return raw points,
+# up to MINUTE_MAX_DAYS minute rollups, longer ones hour rollups
+LOCATION_HISTORY_RAW_MAX_HOURS = int(os.getenv('LOCATION_HISTORY_RAW_MAX_HOURS', 6))
+LOCATION_HISTORY_MINUTE_MAX_DAYS = int(os.getenv('LOCATION_HISTORY_MINUTE_MAX_DAYS', 7))
+# Automatic resolution falls back to raw points when the newest rollup is
+# older than this at the end of the range (rollup_locations has not caught up)
+LOCATION_ROLLUP_MAX_LAG_MINUTES = int(os.getenv('LOCATION_ROLLUP_MAX_LAG_MINUTES', 5))
+
+# Cursor pagination of the location history endpoints (tracking/pagination.py)
+LOCATION_HISTORY_PAGE_SIZE = int(os.getenv('LOCATION_HISTORY_PAGE_SIZE', 20))
+LOCATION_HISTORY_MAX_PAGE_SIZE = int(os.getenv('LOCATION_HISTORY_MAX_PAGE_SIZE', 5000))
+
+# Streaming export of the location history (tracking/export.py)
+LOCATION_EXPORT_CHUNK_SIZE = int(os.getenv('LOCATION_EXPORT_CHUNK_SIZE', 2000))
+
+# Maximum points in one `?format=packed` track response (tracking/renderers.py)
+LOCATION_PACKED_MAX_POINTS = int(os.getenv('LOCATION_PACKED_MAX_POINTS', 1000000))
+
+# Multiplexed fleet WebSocket (tracking.consumers.FleetTrackingConsumer)
+FLEET_FRAME_SECONDS = float(os.getenv('FLEET_FRAME_SECONDS', 0.25))
+FLEET_MAX_VEHICLES = int(os.getenv('FLEET_MAX_VEHICLES', 5000))
+# Grid cells (degrees) of the spatial index and viewport subscriptions (tracking/spatial.py)
+SPATIAL_CELL_DEGREES = float(os.getenv('SPATIAL_CELL_DEGREES', 0.05))
+# Viewports covering more cells than this receive the whole fleet stream, filtered per connection
+FLEET_MAX_VIEWPORT_CELLS = int(os.getenv('FLEET_MAX_VIEWPORT_CELLS', 400))
+# Outbound buffering of the tracking WebSockets (tracking/outbound.py): minimum seconds between
+# messages of the single vehicle stream (0 = as fast as the client keeps up) and the highest
+# rate (frames per second) a client may request with ?max_rate=
+LIVE_FRAME_SECONDS = float(os.getenv('LIVE_FRAME_SECONDS', 0))
+TRACKING_MAX_CLIENT_RATE = float(os.getenv('TRACKING_MAX_CLIENT_RATE', 20))
+
+# Maximum plans accepted by one bulk scheduling request (POST /api/plans/bulk/)
+PLAN_BULK_MAX_PLANS = int(os.getenv('PLAN_BULK_MAX_PLANS', 500))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning', '0002_plan_created_by'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='plan',
+            index=models.Index(fields=['created_by', 'id'], name='planning_pl_created_175459_idx'),
+        ),
+    ]
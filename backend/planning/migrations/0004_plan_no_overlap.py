@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:39
+
+import django.contrib.postgres.constraints
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+import planning.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('planning', '0003_plan_created_by_id_index'),
+    ]
+
+    operations = [
+        # GiST support for the vehicle equality part of the constraint
+        BtreeGistExtension(),
+        migrations.AddConstraint(
+            model_name='plan',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status__in', ['PLANNED', 'ACTIVE'])), expressions=[(planning.models.TsTzRange('start_at', 'end_at'), '&&'), ('vehicle', '=')], name='planning_plan_no_overlap'),
+        ),
+    ]
@@ -1,10 +1,21 @@
-from django.db import models
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
+from django.db import IntegrityError, models, transaction
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 from vehicles.models import Vehicle
 
 User = get_user_model()
 
+# اسم قيد قاعدة البيانات الذي يمنع تداخل الخطط النشطة على نفس المركبة
+PLAN_OVERLAP_CONSTRAINT = 'planning_plan_no_overlap'
+
+
+class TsTzRange(models.Func):
+    """PostgreSQL ``tstzrange(start, end)`` (half-open ``[)`` by default)."""
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
 
 class Personnel(models.Model):
     """Personnel model."""
@@ -53,6 +64,18 @@ class Plan(models.Model):
             models.Index(fields=['vehicle', '-start_at']),
             models.Index(fields=['personnel', '-start_at']),
             models.Index(fields=['status', '-start_at']),
+            models.Index(fields=['created_by', 'id']),
+        ]
+        constraints = [
+            # ضمان عدم التداخل حتى مع الكتابات المتزامنة (يتطلب امتداد btree_gist)
+            ExclusionConstraint(
+                name=PLAN_OVERLAP_CONSTRAINT,
+                expressions=[
+                    (TsTzRange('start_at', 'end_at'), RangeOperators.OVERLAPS),
+                    ('vehicle', RangeOperators.EQUAL),
+                ],
+                condition=models.Q(status__in=['PLANNED', 'ACTIVE']),
+            ),
         ]
 
     def __str__(self):
@@ -106,8 +129,16 @@ class Plan(models.Model):
 
     def save(self, *args, **kwargs):
         """Override save to run validation."""
-        self.full_clean()
-        super().save(*args, **kwargs)
+        # clean() already checks overlaps; the exclusion constraint only catches concurrent writers
+        self.full_clean(validate_constraints=False)
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except IntegrityError as exc:
+            if PLAN_OVERLAP_CONSTRAINT not in str(exc):
+                raise
+            message = 'This plan overlaps with another plan saved for the same vehicle at the same time.'
+            raise ValidationError({'start_at': message, 'end_at': message})
 
 
 class VehicleUserPermission(models.Model):
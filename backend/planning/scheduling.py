@@ -0,0 +1,145 @@
+"""
+Bulk plan scheduling.
+
+``schedule_plans`` checks a batch of plans with a fixed number of queries:
+the vehicles and personnel of the whole batch are looked up once, the
+PLANNED and ACTIVE plans stored for those vehicles in the batch's time
+window are read once, and a sort-and-sweep per vehicle finds every overlap
+among the submitted plans and with the stored ones. The batch is inserted
+atomically with one bulk insert, or rejected with all of its errors and
+conflicts. The exclusion constraint of Plan enforces the same rule against
+concurrent writers; a violation is reported as conflicts as well.
+"""
+import heapq
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from django.dispatch import Signal
+from vehicles.models import Vehicle
+from .models import PLAN_OVERLAP_CONSTRAINT, Personnel, Plan
+
+# Plans in these states hold their vehicle (the others never conflict)
+BLOCKING_STATUSES = (Plan.Status.PLANNED, Plan.Status.ACTIVE)
+
+# Sent once a scheduled batch commits, with ``plans`` (bulk inserts send no post_save)
+plans_scheduled = Signal()
+
+
+class ScheduleError(Exception):
+    """A rejected batch: field ``errors`` by plan index and/or overlap ``conflicts``."""
+
+    def __init__(self, errors=None, conflicts=None):
+        super().__init__('Plan batch rejected')
+        self.errors = errors or {}
+        self.conflicts = conflicts or []
+
+
+def overlapping_pairs(intervals):
+    """Yield ``(key_a, key_b)`` for every pair of overlapping ``[start, end)`` intervals.
+
+    ``intervals`` holds ``(start, end, key)`` tuples. Sweeping them by start
+    with a heap of the intervals still open costs O(n log n + pairs).
+    """
+    open_intervals = []
+    for order, (start, end, key) in enumerate(sorted(intervals, key=lambda interval: interval[:2])):
+        while open_intervals and open_intervals[0][0] <= start:
+            heapq.heappop(open_intervals)
+        for _, _, other in open_intervals:
+            yield other, key
+        heapq.heappush(open_intervals, (end, order, key))
+
+
+def find_conflicts(plans):
+    """Every overlap of the unsaved ``plans`` among themselves and with stored plans.
+
+    Conflicts are ``{'index', 'vehicle', 'with_index'}`` between two submitted
+    plans (by position) and ``{'index', 'vehicle', 'plan', 'start_at', 'end_at'}``
+    with a stored plan.
+    """
+    blocking = [(index, plan) for index, plan in enumerate(plans) if plan.status in BLOCKING_STATUSES]
+    if not blocking:
+        return []
+
+    by_vehicle = defaultdict(list)
+    for index, plan in blocking:
+        by_vehicle[plan.vehicle_id].append((plan.start_at, plan.end_at, ('new', index)))
+    stored = {}
+    for plan_id, vehicle_id, start_at, end_at in Plan.objects.filter(
+        vehicle_id__in=list(by_vehicle),
+        status__in=BLOCKING_STATUSES,
+        start_at__lt=max(plan.end_at for _, plan in blocking),
+        end_at__gt=min(plan.start_at for _, plan in blocking),
+    ).values_list('id', 'vehicle_id', 'start_at', 'end_at'):
+        stored[plan_id] = (start_at, end_at)
+        by_vehicle[vehicle_id].append((start_at, end_at, ('plan', plan_id)))
+
+    conflicts = []
+    for vehicle_id, intervals in by_vehicle.items():
+        for first, second in overlapping_pairs(intervals):
+            if first[0] == 'plan' and second[0] == 'plan':
+                continue
+            if first[0] == 'plan' or (second[0] == 'new' and second[1] < first[1]):
+                first, second = second, first
+            conflict = {'index': first[1], 'vehicle': vehicle_id}
+            if second[0] == 'new':
+                conflict['with_index'] = second[1]
+            else:
+                start_at, end_at = stored[second[1]]
+                conflict.update(plan=second[1], start_at=start_at, end_at=end_at)
+            conflicts.append(conflict)
+    conflicts.sort(key=lambda conflict: (conflict['index'], conflict.get('with_index', -1), conflict.get('plan', 0)))
+    return conflicts
+
+
+def build_plans(rows, user):
+    """Unsaved plans of validated rows and the errors of rows that cannot be scheduled."""
+    vehicles = dict(
+        Vehicle.objects.filter(id__in={row['vehicle'] for row in rows}).values_list('id', 'status')
+    )
+    personnel = set(
+        Personnel.objects.filter(id__in={row['personnel'] for row in rows}).values_list('id', flat=True)
+    )
+    plans, errors = [], {}
+    for index, row in enumerate(rows):
+        row_errors = {}
+        if row['vehicle'] not in vehicles:
+            row_errors['vehicle'] = 'Vehicle not found'
+        elif vehicles[row['vehicle']] == Vehicle.Status.MAINTENANCE:
+            row_errors['vehicle'] = 'Vehicle is under maintenance and cannot be booked'
+        if row['personnel'] not in personnel:
+            row_errors['personnel'] = 'Personnel not found'
+        if row_errors:
+            errors[index] = row_errors
+        plans.append(Plan(
+            vehicle_id=row['vehicle'],
+            personnel_id=row['personnel'],
+            created_by=user,
+            start_at=row['start_at'],
+            end_at=row['end_at'],
+            description=row.get('description', ''),
+            status=row.get('status', Plan.Status.PLANNED),
+        ))
+    return plans, errors
+
+
+def schedule_plans(rows, user):
+    """Create the plans of validated ``rows`` all at once, or raise ``ScheduleError``."""
+    plans, errors = build_plans(rows, user)
+    if errors:
+        raise ScheduleError(errors=errors)
+
+    with transaction.atomic():
+        conflicts = find_conflicts(plans)
+        if conflicts:
+            raise ScheduleError(conflicts=conflicts)
+        try:
+            with transaction.atomic():
+                created = Plan.objects.bulk_create(plans)
+        except IntegrityError as exc:
+            if PLAN_OVERLAP_CONSTRAINT not in str(exc):
+                raise
+            # A concurrent writer got there first; its plans are visible now
+            raise ScheduleError(conflicts=find_conflicts(plans) or [
+                {'detail': 'Conflicts with plans saved concurrently, please retry'}
+            ])
+        transaction.on_commit(lambda: plans_scheduled.send(sender=Plan, plans=created))
+    return created
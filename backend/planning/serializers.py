@@ -1,3 +1,4 @@
+from django.db.models import Count, OuterRef, Subquery
 from rest_framework import serializers
 from .models import Plan, Personnel, VehicleUserPermission
 from vehicles.serializers import VehicleSerializer
@@ -11,6 +12,14 @@ class PersonnelSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+def user_plan_number_annotation():
+    """Per-row subquery counting the creator's plans up to each plan id (the user plan number)."""
+    earlier = Plan.objects.filter(
+        created_by_id=OuterRef('created_by_id'), id__lte=OuterRef('id')
+    ).order_by().values('created_by_id').annotate(number=Count('id')).values('number')
+    return Subquery(earlier)
+
+
 class PlanSerializer(serializers.ModelSerializer):
     """Plan serializer."""
     vehicle_info = VehicleSerializer(source='vehicle', read_only=True)
@@ -31,15 +40,33 @@ class PlanSerializer(serializers.ModelSerializer):
         """
         حساب رقم الخطة التسلسلي للمستخدم الذي أنشأها فقط.
         """
-        if obj.created_by:
+        # القيمة محسوبة مسبقاً في الاستعلام نفسه (انظر user_plan_number_annotation)
+        if hasattr(obj, 'annotated_user_plan_number'):
+            return obj.annotated_user_plan_number
+        if obj.created_by_id:
             # نقوم بعدّ الخطط التي أنشأها نفس المستخدم والتي لها معرف (ID) أصغر من أو يساوي المعرف الحالي
             return Plan.objects.filter(
-                created_by=obj.created_by, 
+                created_by_id=obj.created_by_id, 
                 id__lte=obj.id
             ).count()
         return None
 
 
+class PlanScheduleItemSerializer(serializers.Serializer):
+    """One plan of a bulk scheduling request (related ids are resolved per batch)."""
+    vehicle = serializers.IntegerField()
+    personnel = serializers.IntegerField()
+    start_at = serializers.DateTimeField()
+    end_at = serializers.DateTimeField()
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    status = serializers.ChoiceField(choices=Plan.Status.choices, default=Plan.Status.PLANNED)
+
+    def validate(self, attrs):
+        if attrs['start_at'] >= attrs['end_at']:
+            raise serializers.ValidationError({'end_at': 'End time must be after start time'})
+        return attrs
+
+
 class VehicleUserPermissionSerializer(serializers.ModelSerializer):
     """Vehicle user permission serializer."""
     vehicle_info = VehicleSerializer(source='vehicle', read_only=True)
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.test import SimpleTestCase, TestCase
+from vehicles.models import Vehicle
+from .models import Personnel, Plan
+from .scheduling import ScheduleError, find_conflicts, overlapping_pairs, schedule_plans
+
+BASE = datetime(2030, 1, 1, 8, 0, tzinfo=dt_timezone.utc)
+
+
+def at(hours):
+    return BASE + timedelta(hours=hours)
+
+
+class OverlappingPairsTests(SimpleTestCase):
+    """The sweep reports every overlapping pair of half-open intervals exactly once."""
+
+    def pairs(self, intervals):
+        return {frozenset(pair) for pair in overlapping_pairs(intervals)}
+
+    def test_touching_intervals_do_not_overlap(self):
+        self.assertEqual(self.pairs([(0, 10, 'a'), (10, 20, 'b')]), set())
+
+    def test_partial_overlap(self):
+        self.assertEqual(self.pairs([(5, 15, 'b'), (0, 10, 'a')]), {frozenset('ab')})
+
+    def test_nested_intervals_overlap_their_container_only(self):
+        self.assertEqual(
+            self.pairs([(0, 100, 'a'), (10, 20, 'b'), (30, 40, 'c'), (20, 30, 'd')]),
+            {frozenset('ab'), frozenset('ac'), frozenset('ad')},
+        )
+
+    def test_same_start(self):
+        self.assertEqual(self.pairs([(0, 5, 'a'), (0, 10, 'b'), (5, 10, 'c')]), {frozenset('ab'), frozenset('bc')})
+
+    def test_no_duplicate_pairs(self):
+        pairs = list(overlapping_pairs([(0, 10, key) for key in 'abcd']))
+        self.assertEqual(len(pairs), 6)
+        self.assertEqual(len({frozenset(pair) for pair in pairs}), 6)
+
+
+class FindConflictsTests(TestCase):
+    """Conflicts of a batch among its plans and with the stored PLANNED/ACTIVE plans."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vehicle = Vehicle.objects.create(plate='PLN-1', brand='Ford', model='Transit', year=2020)
+        cls.other_vehicle = Vehicle.objects.create(plate='PLN-2', brand='Ford', model='Transit', year=2020)
+        cls.personnel = Personnel.objects.create(full_name='Driver')
+        cls.stored = Plan.objects.create(
+            vehicle=cls.vehicle, personnel=cls.personnel,
+            start_at=at(2), end_at=at(4), status=Plan.Status.ACTIVE,
+        )
+        Plan.objects.create(
+            vehicle=cls.vehicle, personnel=cls.personnel,
+            start_at=at(6), end_at=at(8), status=Plan.Status.CANCELED,
+        )
+
+    def plan(self, start, end, vehicle=None, status=Plan.Status.PLANNED):
+        return Plan(
+            vehicle=vehicle or self.vehicle, personnel=self.personnel,
+            start_at=at(start), end_at=at(end), status=status,
+        )
+
+    def test_conflict_with_stored_plan(self):
+        self.assertEqual(find_conflicts([self.plan(3, 5)]), [{
+            'index': 0, 'vehicle': self.vehicle.id, 'plan': self.stored.id,
+            'start_at': self.stored.start_at, 'end_at': self.stored.end_at,
+        }])
+
+    def test_plans_touching_a_stored_plan_do_not_conflict(self):
+        self.assertEqual(find_conflicts([self.plan(0, 2), self.plan(4, 6)]), [])
+
+    def test_conflict_between_batch_plans_uses_the_lower_index(self):
+        # The later plan in the batch starts first; the conflict is still reported on index 0
+        self.assertEqual(
+            find_conflicts([self.plan(11, 13), self.plan(10, 12)]),
+            [{'index': 0, 'vehicle': self.vehicle.id, 'with_index': 1}],
+        )
+
+    def test_batch_and_stored_conflicts_are_sorted(self):
+        conflicts = find_conflicts([self.plan(10, 12), self.plan(3, 11)])
+        self.assertEqual(
+            [(conflict['index'], conflict.get('with_index'), conflict.get('plan')) for conflict in conflicts],
+            [(0, 1, None), (1, None, self.stored.id)],
+        )
+
+    def test_other_vehicles_and_non_blocking_plans_never_conflict(self):
+        self.assertEqual(find_conflicts([
+            self.plan(3, 5, vehicle=self.other_vehicle),
+            self.plan(3, 5, status=Plan.Status.CANCELED),
+            self.plan(6, 8),
+        ]), [])
+
+    def test_rejected_batch_creates_nothing(self):
+        rows = [
+            {'vehicle': self.vehicle.id, 'personnel': self.personnel.id, 'start_at': at(10), 'end_at': at(12)},
+            {'vehicle': self.vehicle.id, 'personnel': self.personnel.id, 'start_at': at(3), 'end_at': at(5)},
+        ]
+        with self.assertRaises(ScheduleError) as raised:
+            schedule_plans(rows, user=None)
+        self.assertEqual([conflict['index'] for conflict in raised.exception.conflicts], [1])
+        self.assertEqual(Plan.objects.filter(vehicle=self.vehicle).count(), 2)
@@ -1,9 +1,16 @@
+from django.conf import settings
 from rest_framework import viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError as DRFValidationError
 from django.core.exceptions import ValidationError as DjangoValidationError
 from .models import Plan, Personnel, VehicleUserPermission
-from .serializers import PlanSerializer, PersonnelSerializer, VehicleUserPermissionSerializer
+from .scheduling import ScheduleError, schedule_plans
+from .serializers import (
+    PlanSerializer, PersonnelSerializer, PlanScheduleItemSerializer, VehicleUserPermissionSerializer,
+    user_plan_number_annotation
+)
+from accounts.access import is_admin
 from accounts.permissions import IsAdminRole, PlanAccessPermission, IsAdminOrReadOnly
 from vehicles.models import Vehicle
 
@@ -24,13 +31,17 @@ class PlanViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Filter plans so users only see the ones they created."""
         user = self.request.user
+        # جلب المركبة والموظف والمنشئ ورقم الخطة في الاستعلام نفسه بدلاً من استعلام لكل صف
+        plans = Plan.objects.select_related('vehicle', 'personnel', 'created_by').annotate(
+            annotated_user_plan_number=user_plan_number_annotation()
+        )
         
         # المسؤول يرى جميع الخطط في النظام
-        if user.role == 'ADMIN':
-            return Plan.objects.all()
+        if is_admin(user):
+            return plans
         
         # المستخدم العادي يرى فقط الخطط التي قام بإنشائها بنفسه (عبر حقل created_by)
-        return Plan.objects.filter(created_by=user)
+        return plans.filter(created_by=user)
 
     def get_permissions(self):
         """Override permissions logic."""
@@ -63,6 +74,41 @@ class PlanViewSet(viewsets.ModelViewSet):
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_schedule(self, request):
+        """Create many plans at once: all of them or none, reporting every conflict."""
+        rows = request.data.get('plans') if isinstance(request.data, dict) else request.data
+        max_plans = getattr(settings, 'PLAN_BULK_MAX_PLANS', 500)
+        if not isinstance(rows, list) or not rows:
+            return Response(
+                {'error': 'Expected a non-empty list of plans (or {"plans": [...]})'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(rows) > max_plans:
+            return Response(
+                {'error': f'At most {max_plans} plans can be scheduled at once'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        serializer = PlanScheduleItemSerializer(data=rows, many=True)
+        if not serializer.is_valid():
+            errors = {index: row_errors for index, row_errors in enumerate(serializer.errors) if row_errors}
+            return Response({'errors': errors, 'conflicts': []}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            created = schedule_plans(serializer.validated_data, request.user)
+        except ScheduleError as exc:
+            return Response(
+                {'errors': exc.errors, 'conflicts': exc.conflicts},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        plans = self.get_queryset().filter(id__in=[plan.id for plan in created]).order_by('start_at', 'id')
+        return Response(
+            {'created': len(created), 'plans': PlanSerializer(plans, many=True).data},
+            status=status.HTTP_201_CREATED
+        )
+
     def update(self, request, *args, **kwargs):
         """Update a plan with ownership and vehicle status check."""
         user = request.user
@@ -70,7 +116,7 @@ class PlanViewSet(viewsets.ModelViewSet):
         vehicle_id = request.data.get('vehicle')
         
         # التأكد من أن المستخدم هو المالك أو مسؤول (Admin)
-        if user.role != 'ADMIN' and instance.created_by != user:
+        if not is_admin(user) and instance.created_by != user:
             return Response(
                 {"detail": "ليس لديك صلاحية لتعديل هذه الخطة."}, 
                 status=status.HTTP_403_FORBIDDEN
@@ -80,7 +126,7 @@ class PlanViewSet(viewsets.ModelViewSet):
         if vehicle_id:
             try:
                 vehicle = Vehicle.objects.get(id=vehicle_id)
-                if vehicle.status == 'MAINTENANCE' and user.role != 'ADMIN':
+                if vehicle.status == 'MAINTENANCE' and not is_admin(user):
                     raise DRFValidationError({
                         "vehicle": "لا يمكن نقل الخطة لمركبة في وضع التصليح."
                     })
@@ -95,7 +141,7 @@ class PlanViewSet(viewsets.ModelViewSet):
         user = request.user
 
         # السماح بالحذف إذا كان المستخدم مسؤولاً أو هو من أنشأ الخطة
-        if user.role == 'ADMIN' or instance.created_by == user:
+        if is_admin(user) or instance.created_by == user:
             return super().destroy(request, *args, **kwargs)
         
         return Response(
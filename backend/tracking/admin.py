@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import VehicleLocation
+from .models import VehicleCurrentLocation, VehicleLocation, VehicleLocationRollup
 
 
 @admin.register(VehicleLocation)
@@ -10,3 +10,21 @@ class VehicleLocationAdmin(admin.ModelAdmin):
     readonly_fields = ('recorded_at',)
     ordering = ('-recorded_at',)
     date_hierarchy = 'recorded_at'
+
+
+@admin.register(VehicleCurrentLocation)
+class VehicleCurrentLocationAdmin(admin.ModelAdmin):
+    list_display = ('vehicle', 'lat', 'lng', 'speed', 'heading', 'source', 'recorded_at')
+    list_filter = ('source',)
+    search_fields = ('vehicle__plate', 'vehicle__brand', 'vehicle__model')
+    readonly_fields = ('updated_at',)
+    ordering = ('-recorded_at',)
+
+
+@admin.register(VehicleLocationRollup)
+class VehicleLocationRollupAdmin(admin.ModelAdmin):
+    list_display = ('vehicle', 'resolution', 'bucket', 'lat', 'lng', 'avg_speed', 'max_speed', 'distance_km', 'point_count')
+    list_filter = ('resolution', 'vehicle')
+    search_fields = ('vehicle__plate', 'vehicle__brand', 'vehicle__model')
+    ordering = ('-bucket',)
+    date_hierarchy = 'bucket'
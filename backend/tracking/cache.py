@@ -0,0 +1,131 @@
+"""
+In-process cache of the latest position of each vehicle.
+
+The location write path publishes a ``tracking.positions`` event on the event bus after
+every flush; each worker applies it to its own cache, so the cache stays
+coherent across daphne workers. Entries hold the live tracking message of the
+vehicle as built by ``location_message``.
+"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from core import events
+
+POSITIONS_EVENT = 'tracking.positions'
+
+
+class LatestPositionCache:
+    """Bounded LRU of vehicle id -> latest location message with a TTL."""
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or getattr(settings, 'POSITION_CACHE_MAX_ENTRIES', 50000)
+        self.ttl = ttl or getattr(settings, 'POSITION_CACHE_TTL_SECONDS', 600)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'updates': 0, 'evictions': 0, 'expired': 0}
+
+    def _timestamp(self, message):
+        recorded_at = parse_datetime(message['recorded_at'])
+        return recorded_at.timestamp() if recorded_at else 0.0
+
+    def get(self, vehicle_id):
+        found, _ = self.get_many([vehicle_id])
+        return found.get(vehicle_id)
+
+    def get_many(self, vehicle_ids):
+        """Return ``(found, missing)`` for the given vehicle ids."""
+        now = time.monotonic()
+        found = {}
+        missing = []
+        with self._lock:
+            for vehicle_id in vehicle_ids:
+                entry = self._entries.get(vehicle_id)
+                if entry is not None and now - entry[1] > self.ttl:
+                    del self._entries[vehicle_id]
+                    self.stats['expired'] += 1
+                    entry = None
+                if entry is None:
+                    missing.append(vehicle_id)
+                    continue
+                self._entries.move_to_end(vehicle_id)
+                found[vehicle_id] = entry[2]
+            self.stats['hits'] += len(found)
+            self.stats['misses'] += len(missing)
+        return found, missing
+
+    def put_many(self, messages):
+        """Store messages, ignoring any that are older than the cached one."""
+        now = time.monotonic()
+        with self._lock:
+            for message in messages:
+                vehicle_id = message['vehicle_id']
+                timestamp = self._timestamp(message)
+                entry = self._entries.get(vehicle_id)
+                if entry is not None and entry[0] > timestamp:
+                    continue
+                self._entries[vehicle_id] = (timestamp, now, message)
+                self._entries.move_to_end(vehicle_id)
+                self.stats['updates'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def discard(self, vehicle_id):
+        with self._lock:
+            self._entries.pop(vehicle_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, 'size': len(self._entries)}
+
+
+position_cache = LatestPositionCache()
+
+
+def _apply_positions(payload):
+    position_cache.put_many(payload.get('positions', ()))
+
+
+events.subscribe(POSITIONS_EVENT, _apply_positions)
+
+
+def location_message(location):
+    """Live tracking message for one stored location."""
+    return {
+        'type': 'location',
+        'vehicle_id': location.vehicle_id,
+        'lat': float(location.lat),
+        'lng': float(location.lng),
+        'speed': location.speed,
+        'heading': location.heading,
+        'source': location.source,
+        'recorded_at': location.recorded_at.isoformat(),
+    }
+
+
+def latest_locations(locations):
+    """Reduce locations to the newest one per vehicle."""
+    latest = {}
+    for location in locations:
+        current = latest.get(location.vehicle_id)
+        if current is None or location.recorded_at > current.recorded_at:
+            latest[location.vehicle_id] = location
+    return list(latest.values())
+
+
+def cache_enabled():
+    """The cache is only trusted while this process receives bus updates."""
+    return events.listener.running
+
+
+def publish_positions(locations):
+    """Announce freshly written locations to every worker's cache."""
+    messages = [location_message(location) for location in latest_locations(locations)]
+    if messages:
+        events.publish(POSITIONS_EVENT, {'positions': messages})
@@ -1,18 +1,152 @@
 import json
 import asyncio
-import math
-import random
+from collections import Counter
 from datetime import timedelta
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db.models import Min, Q
 from django.utils import timezone
 from vehicles.models import Vehicle
-from .models import VehicleLocation
-from planning.models import Plan, VehicleUserPermission
+from planning.models import Plan
+from accounts.access import access_cache, is_admin, permitted_vehicle_ids
+from core import events
+from .cache import cache_enabled, location_message, position_cache
+from .geo import in_bbox, parse_bbox
+from .ingest import ingest_points
+from .models import VehicleCurrentLocation
+from .outbound import OutboundBuffer, client_options
+from .signals import ACCESS_GROUP
+from .simulation import engine, vehicle_group_name
+from .spatial import FLEET_GROUP, cell_group_name, ensure_index_loaded, grid_index
+
+# الهامش الزمني حول نافذة الخطة
+PLAN_BUFFER = timedelta(minutes=15)
+
+
+def current_plans(user, vehicle_ids=None):
+    """Current plan per vehicle (id -> Plan) among the vehicles ``user`` holds a permission on.
+
+    A plan is current when it is PLANNED or ACTIVE and its window, widened by
+    PLAN_BUFFER, contains now. PLANNED plans are activated with ``save()`` so
+    their validation and signals run. ``vehicle_ids=None`` checks every
+    permitted vehicle. Admins hold no permissions and get no plans.
+    """
+    now = timezone.now()
+    plans = Plan.objects.filter(
+        vehicle_id__in=permitted_vehicle_ids(user) or (),
+        start_at__lte=now + PLAN_BUFFER,
+        end_at__gte=now - PLAN_BUFFER,
+        status__in=[Plan.Status.PLANNED, Plan.Status.ACTIVE],
+    )
+    if vehicle_ids is not None:
+        plans = plans.filter(vehicle_id__in=vehicle_ids)
+
+    current = {}
+    # The plan that ends last wins when two windows touch, so watchers re-check as late as possible
+    for plan in plans.order_by('vehicle_id', 'end_at'):
+        if plan.status == Plan.Status.PLANNED:
+            plan.status = Plan.Status.ACTIVE
+            plan.save()
+        current[plan.vehicle_id] = plan
+    return current
+
+
+def trackable_vehicles(user, vehicle_ids=None):
+    """Vehicles (id -> simulation route) the user may watch live right now.
+
+    Admins may watch every vehicle. Other users need a permission on the
+    vehicle and a current plan (see ``current_plans``, which also activates
+    it). ``vehicle_ids=None`` checks every vehicle at once.
+    """
+    vehicles = Vehicle.objects.only('id', 'simulation_route')
+    if vehicle_ids is not None:
+        vehicles = vehicles.filter(id__in=vehicle_ids)
+    if not is_admin(user):
+        vehicles = vehicles.filter(id__in=list(current_plans(user, vehicle_ids)))
+    return {vehicle.id: vehicle.get_simulation_route() for vehicle in vehicles}
+
+
+def next_access_change(user):
+    """When the vehicles ``user`` may watch change next, or None.
+
+    That is the end of the earliest current plan window or the start of the
+    earliest upcoming one. Changes to plans and permissions themselves are
+    pushed by tracking.signals.
+    """
+    now = timezone.now()
+    plans = Plan.objects.filter(
+        vehicle_id__in=permitted_vehicle_ids(user) or (),
+        end_at__gte=now - PLAN_BUFFER,
+        status__in=[Plan.Status.PLANNED, Plan.Status.ACTIVE],
+    ).aggregate(
+        current_end=Min('end_at', filter=Q(start_at__lte=now + PLAN_BUFFER)),
+        next_start=Min('start_at', filter=Q(start_at__gt=now + PLAN_BUFFER)),
+    )
+    changes = []
+    if plans['current_end']:
+        changes.append(plans['current_end'] + PLAN_BUFFER)
+    if plans['next_start']:
+        changes.append(plans['next_start'] - PLAN_BUFFER)
+    return min(changes, default=None)
+
+
+async def sleep_until(moment):
+    # ثانية إضافية حتى تكون نافذة الخطة قد انتهت فعلاً عند إعادة التحقق
+    await asyncio.sleep(max((moment - timezone.now()).total_seconds(), 0) + 1)
+
+
+def stored_locations(vehicle_ids):
+    """Location messages from the current-position table (fills the cache)."""
+    messages = {
+        current.vehicle_id: location_message(current)
+        for current in VehicleCurrentLocation.objects.filter(vehicle_id__in=vehicle_ids)
+    }
+    position_cache.put_many(messages.values())
+    return messages
+
+
+def stored_locations_in_bbox(bbox, vehicle_ids=None):
+    """Location messages of the vehicles whose current position is inside ``bbox``."""
+    south, west, north, east = bbox
+    currents = VehicleCurrentLocation.objects.filter(lat__gte=south, lat__lte=north)
+    if west <= east:
+        currents = currents.filter(lng__gte=west, lng__lte=east)
+    if vehicle_ids is not None:
+        currents = currents.filter(vehicle_id__in=vehicle_ids)
+    messages = {current.vehicle_id: location_message(current) for current in currents}
+    position_cache.put_many(messages.values())
+    return {
+        vehicle_id: message for vehicle_id, message in messages.items()
+        if in_bbox(bbox, message['lat'], message['lng'])
+    }
+
+
+def viewport_locations(bbox, vehicle_ids=None):
+    """Location messages of the vehicles inside ``bbox``, optionally limited to ``vehicle_ids``.
+
+    Served from the grid index and the position cache while this worker
+    receives bus updates; otherwise from the current-location table.
+    """
+    if not cache_enabled():
+        return stored_locations_in_bbox(bbox, vehicle_ids)
+    ensure_index_loaded()
+    inside = grid_index.vehicles_in_bbox(bbox)
+    if vehicle_ids is not None:
+        inside = {vehicle_id: inside[vehicle_id] for vehicle_id in inside.keys() & vehicle_ids}
+    found, missing = position_cache.get_many(list(inside))
+    if missing:
+        found.update(stored_locations(missing))
+    return found
+
 
 class LiveTrackingConsumer(AsyncWebsocketConsumer):
     """
     WebSocket consumer لتعقب المركبات حياً مع تفعيل الخطط تلقائياً والتحقق من الصلاحيات.
+
+    المواقع تمر عبر OutboundBuffer: يُرسل آخر موقع فقط إذا تأخر العميل، بمعدل أقصى
+    ?max_rate= (رسالة/ثانية). مع ?ack_window=N تحمل الرسائل "seq" ويرد العميل بـ
+    {"action": "ack", "seq": n}.
     """
 
     async def connect(self):
@@ -21,6 +155,10 @@ class LiveTrackingConsumer(AsyncWebsocketConsumer):
         self.user = None
         self.vehicle = None
         self.stream_task = None
+        self.simulation = None
+        self.group_name = None
+        self.buffer = None
+        self.watching_access = False
         
         # استخراج المعاملات من Query String
         query_string = self.scope.get('query_string', b'').decode()
@@ -53,15 +191,47 @@ class LiveTrackingConsumer(AsyncWebsocketConsumer):
         self.active_plan = await self.get_and_activate_plan()
         
         # السماح للآدمن بالتتبع دائماً، أما المستخدم العادي فيحتاج لخطة نشطة وصلاحية
-        if self.user.role != 'ADMIN' and not self.active_plan:
+        if not is_admin(self.user) and not self.active_plan:
             await self.close(code=4003)  
             return
         
-        # قبول الاتصال
+        # قبول الاتصال والانضمام إلى مجموعة بث السيارة
         await self.accept()
-        
-        # بدء مهمة بث المواقع
-        self.stream_task = asyncio.create_task(self.stream_locations())
+        interval, ack_window = client_options(
+            self.scope, getattr(settings, 'LIVE_FRAME_SECONDS', 0)
+        )
+        self.buffer = OutboundBuffer(self.send_batch, interval, ack_window)
+        self.buffer.start()
+        self.group_name = vehicle_group_name(self.vehicle_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+
+        # إرسال آخر موقع معروف فوراً دون انتظار الدورة القادمة
+        snapshot = await self.get_current_location()
+        if snapshot:
+            self.buffer.put('location', self.vehicle_id, snapshot)
+
+        # تسجيل المشاهد لدى محرك المحاكاة المشترك (حركة واحدة لكل سيارة مهما كان عدد المشاهدين)
+        route = self.vehicle.get_simulation_route()
+        self.simulation = engine.acquire(self.vehicle_id, route)
+        if self.simulation is None:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'message': 'No simulation route found.'
+            }))
+            return
+
+        if self.simulation.streaming is False:
+            self.buffer.put('status', self.vehicle_id, {
+                'type': 'status',
+                'message': 'Simulation Paused',
+                'streaming': False
+            })
+
+        # مراقبة صلاحية الخطة لغير الآدمن: مؤقت واحد عند نهاية الخطة، وإشعارات عند تغيير الخطط أو الصلاحيات
+        if not is_admin(self.user):
+            self.watching_access = True
+            await self.channel_layer.group_add(ACCESS_GROUP, self.channel_name)
+            self.restart_plan_watch()
 
     async def disconnect(self, close_code):
         """تنظيف المهام عند قطع الاتصال."""
@@ -71,6 +241,15 @@ class LiveTrackingConsumer(AsyncWebsocketConsumer):
                 await self.stream_task
             except asyncio.CancelledError:
                 pass
+        if self.buffer:
+            await self.buffer.stop()
+        if self.simulation is not None:
+            engine.release(self.vehicle_id)
+            self.simulation = None
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if self.watching_access:
+            await self.channel_layer.group_discard(ACCESS_GROUP, self.channel_name)
 
     @database_sync_to_async
     def get_vehicle(self, vehicle_id):
@@ -79,110 +258,512 @@ class LiveTrackingConsumer(AsyncWebsocketConsumer):
         except Vehicle.DoesNotExist:
             return None
 
+    async def get_current_location(self):
+        """آخر موقع معروف من الذاكرة المؤقتة، وعند عدم توفره من جدول المواقع الحالية."""
+        if cache_enabled():
+            cached = position_cache.get(self.vehicle_id)
+            if cached:
+                return cached
+        return await self.get_stored_location()
+
+    @database_sync_to_async
+    def get_stored_location(self):
+        current = VehicleCurrentLocation.objects.filter(vehicle_id=self.vehicle_id).first()
+        if not current:
+            return None
+        message = location_message(current)
+        position_cache.put_many([message])
+        return message
+
     @database_sync_to_async
     def get_and_activate_plan(self):
         """
-        البحث عن خطة متاحة للمستخدم وتفعيلها (ACTIVE) إذا كان الوقت مناسباً.
+        الخطة الحالية للمستخدم على هذه السيارة (مع تفعيلها إن كانت PLANNED)،
+        عبر نفس مسار FleetTrackingConsumer حتى لا تختلف قواعد الوصول بينهما.
         """
-        now = timezone.now()
-        buffer_time = timedelta(minutes=15)
-        
-        # التحقق أولاً من وجود صلاحية للمستخدم على هذه السيارة
-        has_permission = VehicleUserPermission.objects.filter(
-            user=self.user, 
-            vehicle_id=self.vehicle_id
-        ).exists()
-        
-        if not has_permission and self.user.role != 'ADMIN':
-            return None
+        return current_plans(self.user, [self.vehicle_id]).get(self.vehicle_id)
 
-        # البحث عن خطة (PLANNED أو ACTIVE) ضمن النافذة الزمنية
-        plan = Plan.objects.filter(
-            vehicle_id=self.vehicle_id,
-            start_at__lte=now + buffer_time,
-            end_at__gte=now - buffer_time,
-            status__in=['PLANNED', 'ACTIVE']
-        ).first()
-
-        # إذا كانت الخطة موجودة ولكنها PLANNED، يتم تفعيلها فوراً
-        if plan and plan.status == 'PLANNED':
-            plan.status = 'ACTIVE'
-            plan.save()
-            
-        return plan
+    def restart_plan_watch(self, check_now=False):
+        if self.stream_task:
+            self.stream_task.cancel()
+        self.stream_task = asyncio.create_task(self.watch_plan(check_now))
 
-    async def stream_locations(self):
-        """بث تحديثات الموقع الوهمية."""
-        route = await database_sync_to_async(self.vehicle.get_simulation_route)()
-        
-        if not route or len(route) < 2:
-            await self.send(text_data=json.dumps({
-                'type': 'error',
-                'message': 'No simulation route found.'
-            }))
-            return
-        
-        current_index = 0
-        progress = 0.0
-        
+    async def watch_plan(self, check_now=False):
+        """انتظار نهاية نافذة الخطة ثم إعادة التحقق (لغير الآدمن) بدل الاستعلام في كل دورة."""
         while True:
-            # تحديث بيانات السيارة لفحص مفتاح البث
-            vehicle_obj = await database_sync_to_async(Vehicle.objects.get)(id=self.vehicle_id)
-            
-            if not vehicle_obj.is_streaming:
-                await self.send(text_data=json.dumps({
-                    'type': 'status',
-                    'message': 'Simulation Paused',
-                    'streaming': False
-                }))
-                await asyncio.sleep(5)
-                continue
-
-            # التحقق من استمرار صلاحية الوقت (لغير الآدمن)
-            if self.user.role != 'ADMIN':
-                is_valid = await self.get_and_activate_plan()
-                if not is_valid:
+            if check_now:
+                self.active_plan = await self.get_and_activate_plan()
+                if not self.active_plan:
                     await self.send(text_data=json.dumps({
                         'type': 'status',
                         'message': 'Plan expired',
                         'streaming': False
                     }))
                     await self.close(code=4003)
-                    break
-
-            # حساب الموقع (بقية المنطق الخاص بك صحيحة)
-            start_point = route[current_index]
-            end_point = route[(current_index + 1) % len(route)]
-            
-            lat = start_point[0] + (end_point[0] - start_point[0]) * progress
-            lng = start_point[1] + (end_point[1] - start_point[1]) * progress
-            
-            location_data = {
-                'type': 'location',
-                'vehicle_id': self.vehicle_id,
-                'lat': round(lat, 6),
-                'lng': round(lng, 6),
-                'speed': round(45.0 + random.uniform(-5, 5), 2),
-                'recorded_at': timezone.now().isoformat()
-            }
-            
-            await self.send(text_data=json.dumps(location_data))
-            await self.save_location(lat, lng)
-            
-            progress += 0.1
-            if progress >= 1.0:
-                progress = 0.0
-                current_index = (current_index + 1) % len(route)
-            
-            await asyncio.sleep(2)
+                    return
+            await sleep_until(self.active_plan.end_at + PLAN_BUFFER)
+            check_now = True
 
-    @database_sync_to_async
-    def save_location(self, lat, lng):
-        VehicleLocation.objects.create(
-            vehicle=self.vehicle,
-            lat=lat,
-            lng=lng,
-            speed=45.0,
-            recorded_at=timezone.now(),
-            source='SIMULATED'
-        )
\ No newline at end of file
+    async def access_changed(self, event):
+        """تغيّرت خطة أو صلاحية على السيارة: إعادة التحقق فوراً."""
+        if self.vehicle_id not in event['vehicle_ids'] or event['user_id'] not in (None, self.user.id):
+            return
+        if event['user_id'] is not None:
+            # قد يصل الإشعار قبل حدث إبطال الذاكرة المؤقتة من العامل الآخر
+            access_cache.invalidate(self.user.id)
+        self.restart_plan_watch(check_now=True)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """استقبال إشعارات الاستلام {"action": "ack", "seq": n} فقط."""
+        try:
+            payload = json.loads(text_data or bytes_data or b'')
+            if payload.get('action') == 'ack':
+                self.buffer.ack(int(payload['seq']))
+        except (ValueError, TypeError, KeyError, AttributeError):
+            pass
+
+    async def send_batch(self, batch, seq):
+        """إرسال آخر موقع ثم تغيير الحالة (إن وجد) كرسائل منفصلة كما كانت."""
+        for kind in ('location', 'status'):
+            message = batch.get(kind, {}).get(self.vehicle_id)
+            if message:
+                if seq is not None:
+                    message = {**message, 'seq': seq}
+                await self.send(text_data=json.dumps(message))
+
+    async def location_update(self, event):
+        """إضافة الموقع الذي بثه محرك المحاكاة إلى طابور الإرسال (الأحدث يستبدل الأقدم)."""
+        self.buffer.put('location', self.vehicle_id, event['location'])
+
+    async def tracking_status(self, event):
+        """إرسال تغييرات حالة البث (إيقاف/استئناف) إلى العميل."""
+        self.buffer.put('status', self.vehicle_id, {
+            'type': 'status',
+            'message': event['message'],
+            'streaming': event['streaming']
+        })
+
+
+class FleetTrackingConsumer(AsyncWebsocketConsumer):
+    """
+    WebSocket consumer متعدد الاشتراكات: اتصال واحد لكل تبويب لمتابعة الأسطول كاملاً.
+
+    رسائل العميل:
+      {"action": "subscribe" | "unsubscribe", "vehicles": [1, 2, ...]}
+      {"action": "subscribe", "id": "map", "bbox": [south, west, north, east]}
+      {"action": "unsubscribe", "id": "map", "bbox": null}
+      {"action": "ack", "seq": n}
+    إعادة الاشتراك بنفس المعرف تستبدل المنطقة (تحريك الخريطة أو تكبيرها).
+    المنطقة تستمع فقط لمجموعات الخلايا ولا تشغّل المحاكاة، فتصغير الخريطة لا يشغّل
+    محاكاة الأسطول كاملاً؛ الاشتراك بالمعرفات وحده يشغّلها.
+    التحديثات تُجمع في OutboundBuffer (آخر موقع لكل مركبة) وتُرسل كإطار واحد كل
+    FLEET_FRAME_SECONDS أو بمعدل ?max_rate= الأبطأ:
+      {"type": "frame", "positions": [...], "enter": [ids], "leave": [ids], "status": [...]}
+    "max_rate" في رسالة الاشتراك بالمركبات يحدد معدلاً أقصى لمواقع تلك المركبات، ومع
+    ?ack_window=N تحمل الإطارات "seq" ولا يُرسل أكثر من N إطاراً دون إشعار استلام.
+    """
+
+    async def connect(self):
+        self.user = self.scope.get('user')
+        self.vehicles = set()
+        # معرف المنطقة -> (bbox, الخلايا أو None لمجموعة الأسطول)
+        self.bboxes = {}
+        # المركبات الظاهرة داخل المناطق -> آخر موقع (lat, lng)
+        self.visible = {}
+        # عدد المناطق التي تستخدم كل خلية، وعدد المناطق الكبيرة التي تستخدم مجموعة الأسطول
+        self.cells = Counter()
+        self.fleet_bboxes = 0
+        # المركبات المسموح بها لغير الآدمن (None للآدمن = الكل)
+        self.allowed = None
+        self.acquired = Counter()
+        self.buffer = None
+        self.recheck_task = None
+
+        if not self.user or not self.user.is_authenticated:
+            await self.close(code=4001)
+            return
+
+        await self.accept()
+        interval, ack_window = client_options(
+            self.scope, getattr(settings, 'FLEET_FRAME_SECONDS', 0.25)
+        )
+        self.buffer = OutboundBuffer(self.send_frame, interval, ack_window)
+        self.buffer.start()
+        if not is_admin(self.user):
+            await self.channel_layer.group_add(ACCESS_GROUP, self.channel_name)
+            self.restart_permission_watch()
+
+    async def disconnect(self, close_code):
+        if self.recheck_task:
+            self.recheck_task.cancel()
+            try:
+                await self.recheck_task
+            except asyncio.CancelledError:
+                pass
+        if self.buffer:
+            await self.buffer.stop()
+        for vehicle_id, count in self.acquired.items():
+            for _ in range(count):
+                engine.release(vehicle_id)
+        self.acquired.clear()
+        groups = [vehicle_group_name(vehicle_id) for vehicle_id in self.vehicles]
+        groups += [cell_group_name(cell) for cell in self.cells]
+        if self.fleet_bboxes:
+            groups.append(FLEET_GROUP)
+        if self.recheck_task:
+            groups.append(ACCESS_GROUP)
+        await asyncio.gather(*(
+            self.channel_layer.group_discard(group, self.channel_name) for group in groups
+        ))
+
+    async def send_json(self, content):
+        await self.send(text_data=json.dumps(content))
+
+    async def send_error(self, message):
+        await self.send_json({'type': 'error', 'message': message})
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            payload = json.loads(text_data or bytes_data or b'')
+        except ValueError:
+            await self.send_error('Invalid JSON')
+            return
+        if isinstance(payload, dict) and payload.get('action') == 'ack':
+            try:
+                self.buffer.ack(int(payload['seq']))
+            except (KeyError, TypeError, ValueError):
+                await self.send_error('"seq" must be a frame number')
+            return
+        if not isinstance(payload, dict) or payload.get('action') not in ('subscribe', 'unsubscribe'):
+            await self.send_error('Expected {"action": "subscribe" | "unsubscribe", ...}')
+            return
+        subscribe = payload['action'] == 'subscribe'
+
+        if 'vehicles' in payload:
+            vehicle_ids = payload['vehicles']
+            try:
+                vehicle_ids = {int(vehicle_id) for vehicle_id in vehicle_ids}
+            except (TypeError, ValueError):
+                await self.send_error('"vehicles" must be a list of vehicle ids')
+                return
+            max_rate = payload.get('max_rate')
+            if max_rate is not None and (not isinstance(max_rate, (int, float)) or max_rate <= 0):
+                await self.send_error('"max_rate" must be a positive number of updates per second')
+                return
+            if subscribe:
+                await self.subscribe_vehicles(vehicle_ids, max_rate)
+            else:
+                await self.unsubscribe_vehicles(vehicle_ids)
+
+        if 'bbox' in payload:
+            bbox_id = str(payload.get('id', 'default'))
+            if not subscribe:
+                await self.unsubscribe_bbox(bbox_id)
+                return
+            bbox = parse_bbox(payload['bbox'])
+            if bbox is None:
+                await self.send_error('"bbox" must be [south, west, north, east] in degrees')
+                return
+            await self.subscribe_bbox(bbox_id, bbox)
+
+    # --- الاشتراك بالمعرفات ---
+
+    async def subscribe_vehicles(self, vehicle_ids, max_rate=None):
+        if max_rate is not None:
+            # تغيير المعدل للمركبات المشترك بها مسبقاً أيضاً
+            for vehicle_id in vehicle_ids & self.vehicles:
+                self.buffer.set_rate('positions', vehicle_id, max_rate)
+        vehicle_ids -= self.vehicles
+        max_vehicles = getattr(settings, 'FLEET_MAX_VEHICLES', 5000)
+        if len(self.vehicles) + len(vehicle_ids) > max_vehicles:
+            await self.send_error(f'At most {max_vehicles} vehicles can be watched per connection')
+            return
+
+        # التحقق من الصلاحيات والخطط دفعة واحدة
+        routes = await database_sync_to_async(trackable_vehicles)(self.user, vehicle_ids)
+        accepted = set(routes)
+        self.vehicles |= accepted
+        await asyncio.gather(*(
+            self.channel_layer.group_add(vehicle_group_name(vehicle_id), self.channel_name)
+            for vehicle_id in accepted
+        ))
+        for vehicle_id, route in routes.items():
+            self.acquire(vehicle_id, route)
+            self.buffer.set_rate('positions', vehicle_id, max_rate)
+        for vehicle_id, location in (await self.get_current_locations(accepted)).items():
+            self.buffer.put('positions', vehicle_id, location)
+
+        await self.send_json({
+            'type': 'subscribed',
+            'vehicles': sorted(accepted),
+            'denied': sorted(vehicle_ids - accepted),
+        })
+
+    async def unsubscribe_vehicles(self, vehicle_ids):
+        vehicle_ids &= self.vehicles
+        self.vehicles -= vehicle_ids
+        await asyncio.gather(*(
+            self.channel_layer.group_discard(vehicle_group_name(vehicle_id), self.channel_name)
+            for vehicle_id in vehicle_ids
+        ))
+        for vehicle_id in vehicle_ids:
+            self.release(vehicle_id)
+            self.buffer.set_rate('positions', vehicle_id, None)
+            self.buffer.discard('status', vehicle_id)
+            if vehicle_id not in self.visible:
+                self.buffer.drop('positions', vehicle_id)
+        await self.send_json({'type': 'unsubscribed', 'vehicles': sorted(vehicle_ids)})
+
+    # --- الاشتراك بالمنطقة (نافذة الخريطة) ---
+
+    async def subscribe_bbox(self, bbox_id, bbox):
+        previous = self.bboxes.pop(bbox_id, None)
+
+        if not is_admin(self.user):
+            self.allowed = set(await database_sync_to_async(current_plans)(self.user))
+        inside = await database_sync_to_async(viewport_locations)(bbox, self.allowed)
+
+        # الانضمام إلى مجموعات الخلايا الجديدة قبل مغادرة القديمة حتى لا تضيع أي رسالة
+        cells = await self.join_cells(bbox)
+        self.bboxes[bbox_id] = (bbox, cells)
+        if previous:
+            await self.leave_cells(previous[1])
+
+        for vehicle_id, location in inside.items():
+            self.show(vehicle_id, location)
+        self.hide_outside()
+        await self.send_json({'type': 'subscribed', 'bbox': bbox_id, 'vehicles': sorted(inside)})
+
+    async def unsubscribe_bbox(self, bbox_id):
+        entry = self.bboxes.pop(bbox_id, None)
+        if entry:
+            await self.leave_cells(entry[1])
+            self.hide_outside()
+        await self.send_json({'type': 'unsubscribed', 'bbox': bbox_id})
+
+    async def join_cells(self, bbox):
+        """الانضمام إلى مجموعات الخلايا التي تغطيها المنطقة، وإرجاع الخلايا (None لمجموعة الأسطول)."""
+        max_cells = getattr(settings, 'FLEET_MAX_VIEWPORT_CELLS', 400)
+        cells = grid_index.cells_in_bbox(bbox, limit=max_cells)
+        if cells is None:
+            # منطقة كبيرة جداً: استقبال مواقع الأسطول كاملاً وتصفيتها هنا
+            if not self.fleet_bboxes:
+                await self.channel_layer.group_add(FLEET_GROUP, self.channel_name)
+            self.fleet_bboxes += 1
+            return None
+        new_cells = [cell for cell in cells if not self.cells[cell]]
+        self.cells.update(cells)
+        await asyncio.gather(*(
+            self.channel_layer.group_add(cell_group_name(cell), self.channel_name)
+            for cell in new_cells
+        ))
+        return cells
+
+    async def leave_cells(self, cells):
+        if cells is None:
+            self.fleet_bboxes -= 1
+            if not self.fleet_bboxes:
+                await self.channel_layer.group_discard(FLEET_GROUP, self.channel_name)
+            return
+        self.cells.subtract(cells)
+        unused = [cell for cell in cells if self.cells[cell] <= 0]
+        for cell in unused:
+            del self.cells[cell]
+        await asyncio.gather(*(
+            self.channel_layer.group_discard(cell_group_name(cell), self.channel_name)
+            for cell in unused
+        ))
+
+    def in_view(self, lat, lng):
+        return any(in_bbox(bbox, lat, lng) for bbox, _ in self.bboxes.values())
+
+    def show(self, vehicle_id, location):
+        if vehicle_id not in self.visible:
+            self.buffer.put('enter', vehicle_id, vehicle_id)
+            self.buffer.discard('leave', vehicle_id)
+        self.visible[vehicle_id] = (location['lat'], location['lng'])
+        self.buffer.put('positions', vehicle_id, location)
+
+    def hide(self, vehicle_id):
+        del self.visible[vehicle_id]
+        self.buffer.put('leave', vehicle_id, vehicle_id)
+        self.buffer.discard('enter', vehicle_id)
+        if vehicle_id not in self.vehicles:
+            self.buffer.drop('positions', vehicle_id)
+
+    def hide_outside(self):
+        """إخفاء المركبات التي لم تعد داخل أي منطقة بعد تغيير المناطق."""
+        for vehicle_id, (lat, lng) in list(self.visible.items()):
+            if not self.in_view(lat, lng):
+                self.hide(vehicle_id)
+
+    # --- المحاكاة ---
+
+    def acquire(self, vehicle_id, route):
+        simulation = engine.acquire(vehicle_id, route)
+        if simulation is None:
+            return False
+        self.acquired[vehicle_id] += 1
+        if simulation.streaming is False:
+            self.buffer.put('status', vehicle_id, {
+                'vehicle_id': vehicle_id, 'message': 'Simulation Paused', 'streaming': False
+            })
+        return True
+
+    def release(self, vehicle_id):
+        if self.acquired[vehicle_id] > 0:
+            self.acquired[vehicle_id] -= 1
+            engine.release(vehicle_id)
+        if self.acquired[vehicle_id] <= 0:
+            del self.acquired[vehicle_id]
+
+    async def get_current_locations(self, vehicle_ids):
+        """آخر المواقع من الذاكرة المؤقتة، والباقي من جدول المواقع الحالية في استعلام واحد."""
+        found, missing = {}, list(vehicle_ids)
+        if cache_enabled():
+            found, missing = position_cache.get_many(missing)
+        if missing:
+            found.update(await database_sync_to_async(stored_locations)(missing))
+        return found
+
+    # --- الإرسال المجمع ---
+
+    async def send_frame(self, batch, seq):
+        """إرسال التحديثات المتراكمة كإطار واحد."""
+        frame = {'type': 'frame'}
+        if seq is not None:
+            frame['seq'] = seq
+        if 'positions' in batch:
+            frame['positions'] = list(batch['positions'].values())
+        if 'enter' in batch:
+            frame['enter'] = sorted(batch['enter'])
+        if 'leave' in batch:
+            frame['leave'] = sorted(batch['leave'])
+        if 'status' in batch:
+            frame['status'] = list(batch['status'].values())
+        await self.send_json(frame)
+
+    def restart_permission_watch(self):
+        if self.recheck_task:
+            self.recheck_task.cancel()
+        self.recheck_task = asyncio.create_task(self.watch_permissions())
+
+    async def watch_permissions(self):
+        """إعادة التحقق عند انتهاء أقرب خطة أو بدء خطة قادمة فقط (لغير الآدمن)."""
+        while True:
+            change = await database_sync_to_async(next_access_change)(self.user)
+            if change is None:
+                return
+            await sleep_until(change)
+            await self.recheck_permissions()
+
+    async def recheck_permissions(self):
+        routes = await database_sync_to_async(trackable_vehicles)(self.user)
+        if self.bboxes:
+            self.allowed = set(routes)
+            for vehicle_id in list(self.visible):
+                if vehicle_id not in self.allowed:
+                    self.hide(vehicle_id)
+        expired = self.vehicles - set(routes)
+        if expired:
+            await self.unsubscribe_vehicles(expired)
+            await self.send_json({
+                'type': 'status',
+                'message': 'Plan expired',
+                'vehicles': sorted(expired),
+                'streaming': False,
+            })
+
+    # --- رسائل مجموعات البث ---
+
+    async def location_update(self, event):
+        location = event['location']
+        if location['vehicle_id'] in self.vehicles:
+            self.buffer.put('positions', location['vehicle_id'], location)
+
+    async def tracking_status(self, event):
+        vehicle_id = event.get('vehicle_id')
+        if vehicle_id in self.vehicles:
+            self.buffer.put('status', vehicle_id, {
+                'vehicle_id': vehicle_id,
+                'message': event['message'],
+                'streaming': event['streaming'],
+            })
+
+    async def access_changed(self, event):
+        """تغيّرت خطة أو صلاحية: إعادة التحقق وحساب موعد التغيير القادم."""
+        if event['user_id'] not in (None, self.user.id):
+            return
+        vehicle_ids = set(event['vehicle_ids'])
+        if event['user_id'] is not None:
+            access_cache.invalidate(self.user.id)
+        elif not vehicle_ids & self.vehicles:
+            # تجاهل خطط المركبات التي لا يملك المستخدم صلاحية عليها دون أي استعلام عند توفر الذاكرة المؤقتة
+            permitted = access_cache.get(self.user.id) if events.listener.running else None
+            if permitted is None:
+                permitted = await database_sync_to_async(permitted_vehicle_ids)(self.user)
+            if not vehicle_ids & permitted:
+                return
+        if not self.bboxes and not vehicle_ids & self.vehicles:
+            self.restart_permission_watch()
+            return
+        await self.recheck_permissions()
+        self.restart_permission_watch()
+
+    async def cell_positions(self, event):
+        """مواقع خلايا الشبكة: تحديد الدخول إلى المناطق والخروج منها."""
+        for location in event['positions']:
+            vehicle_id = location['vehicle_id']
+            if self.allowed is not None and vehicle_id not in self.allowed:
+                continue
+            if self.in_view(location['lat'], location['lng']):
+                self.show(vehicle_id, location)
+            elif vehicle_id in self.visible:
+                self.hide(vehicle_id)
+
+    async def fleet_positions(self, event):
+        """مواقع الأسطول كاملاً (للمناطق الكبيرة) تُعالج بنفس طريقة الخلايا."""
+        await self.cell_positions(event)
+
+
+class LocationIngestConsumer(AsyncWebsocketConsumer):
+    """
+    WebSocket consumer لاستقبال دفعات المواقع الحقيقية (REAL) من أجهزة التتبع.
+    كل رسالة تحتوي على قائمة نقاط أو {"points": [...], "seq": n} ويتم الرد بإشعار استلام.
+    الإرسال محصور بالمسؤولين: صلاحية المستخدم على المركبة تسمح بالمشاهدة فقط.
+    """
+
+    async def connect(self):
+        self.user = self.scope.get('user')
+        if not self.user or not self.user.is_authenticated:
+            await self.close(code=4001)
+            return
+        if not is_admin(self.user):
+            await self.close(code=4003)
+            return
+        await self.accept()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            payload = json.loads(text_data or bytes_data or b'')
+        except ValueError:
+            await self.send(text_data=json.dumps({'type': 'error', 'message': 'Invalid JSON'}))
+            return
+
+        seq = None
+        points = payload
+        if isinstance(payload, dict):
+            seq = payload.get('seq')
+            points = payload.get('points')
+
+        max_points = getattr(settings, 'LOCATION_INGEST_MAX_POINTS', 5000)
+        if not isinstance(points, list) or not points or len(points) > max_points:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'seq': seq,
+                'message': f'Expected a list of 1 to {max_points} points'
+            }))
+            return
+
+        result = await database_sync_to_async(ingest_points)(points)
+        await self.send(text_data=json.dumps({'type': 'ack', 'seq': seq, **result}))
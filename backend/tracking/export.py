@@ -0,0 +1,51 @@
+"""
+Streaming export of the location history.
+
+Rows are read through a server-side cursor (``QuerySet.iterator``) and encoded
+chunk by chunk by one of the export renderers, so memory stays constant
+whatever the size of the export.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from .models import VehicleLocation
+
+EXPORT_FIELDS = ('vehicle_id', 'lat', 'lng', 'speed', 'heading', 'recorded_at', 'source')
+
+
+def export_rows(vehicle_ids, from_datetime, to_datetime):
+    """Iterate the raw points of the vehicles in the window, by vehicle and time."""
+    queryset = VehicleLocation.objects.filter(
+        vehicle_id__in=vehicle_ids, recorded_at__gte=from_datetime
+    )
+    if to_datetime:
+        queryset = queryset.filter(recorded_at__lte=to_datetime)
+    return queryset.order_by('vehicle_id', 'recorded_at').values_list(*EXPORT_FIELDS).iterator(
+        chunk_size=getattr(settings, 'LOCATION_EXPORT_CHUNK_SIZE', 2000)
+    )
+
+
+async def _aiterate(chunks):
+    """Pull a synchronous iterator from the request's sync thread.
+
+    Under ASGI Django would otherwise collect a synchronous iterator into a
+    list before sending it. Every ``next`` runs in the thread that ran the
+    view, which owns the database connection and its server-side cursor.
+    """
+    sentinel = object()
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(chunks, sentinel)
+        if chunk is sentinel:
+            break
+        yield chunk
+
+
+def streaming_response(request, chunks, content_type, filename):
+    """StreamingHttpResponse that streams under both WSGI and ASGI."""
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = _aiterate(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
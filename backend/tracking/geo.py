@@ -0,0 +1,63 @@
+"""
+Small geodesy helpers shared by the tracking modules.
+"""
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in kilometres between two points in degrees."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (float(lat1), float(lng1), float(lat2), float(lng2)))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bearing_degrees(lat1, lng1, lat2, lng2):
+    """Initial compass bearing from the first point to the second (0 = north)."""
+    lat1, lat2 = math.radians(lat1), math.radians(lat2)
+    delta_lng = math.radians(lng2 - lng1)
+    x = math.sin(delta_lng) * math.cos(lat2)
+    y = math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(delta_lng)
+    return math.degrees(math.atan2(x, y)) % 360
+
+
+def parse_bbox(value):
+    """Validate a ``[south, west, north, east]`` box; return floats or None.
+
+    ``west`` may be greater than ``east`` for a box crossing the antimeridian.
+    """
+    if not isinstance(value, (list, tuple)) or len(value) != 4:
+        return None
+    try:
+        south, west, north, east = (float(part) for part in value)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        return None
+    return south, west, north, east
+
+
+def in_bbox(bbox, lat, lng):
+    south, west, north, east = bbox
+    if not south <= lat <= north:
+        return False
+    if west <= east:
+        return west <= lng <= east
+    return lng >= west or lng <= east
+
+
+def bbox_around(lat, lng, radius_km):
+    """``[south, west, north, east]`` box enclosing a circle (west > east across the antimeridian)."""
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = max(lat - lat_delta, -90.0), min(lat + lat_delta, 90.0)
+    cos_lat = math.cos(math.radians(max(abs(south), abs(north))))
+    if cos_lat < 1e-6 or lat_delta / cos_lat >= 180:
+        return south, -180.0, north, 180.0
+    lng_delta = lat_delta / cos_lat
+    west = (lng - lng_delta + 180) % 360 - 180
+    east = (lng + lng_delta + 180) % 360 - 180
+    return south, west, north, east
@@ -0,0 +1,215 @@
+"""
+Batch ingestion of real tracker positions.
+
+Points are validated column by column with the same rules as
+``VehicleLocation.clean`` (no per-row ``full_clean``), de-duplicated on
+``(vehicle, recorded_at)`` within the batch and against the database, and then
+inserted in bulk, skipping points that a concurrent writer stored first. The
+newest inserted point of each vehicle is pushed to that vehicle's live
+tracking group and to the position caches.
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from vehicles.models import Vehicle
+from .cache import latest_locations, location_message, publish_positions
+from .models import VehicleCurrentLocation, VehicleLocation
+from .simulation import vehicle_group_name
+from .spatial import broadcast_positions
+
+COORDINATE_QUANTUM = Decimal('0.000001')
+
+
+def _to_float(value):
+    if value is None or isinstance(value, bool):
+        raise ValueError
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError
+    return value
+
+
+def _to_datetime(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    if isinstance(value, str):
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValueError
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+    raise ValueError
+
+
+def parse_points(points):
+    """Convert raw point dicts into typed tuples.
+
+    Returns ``(rows, errors)`` where ``rows`` holds
+    ``(index, vehicle_id, lat, lng, speed, heading, recorded_at)`` tuples and
+    ``errors`` maps point indexes to field errors.
+    """
+    rows = []
+    errors = {}
+    for index, point in enumerate(points):
+        if not isinstance(point, dict):
+            errors[index] = {'non_field_errors': 'Each point must be an object'}
+            continue
+
+        point_errors = {}
+        try:
+            vehicle_id = int(point.get('vehicle', point.get('vehicle_id')))
+        except (TypeError, ValueError):
+            point_errors['vehicle'] = 'A valid vehicle id is required'
+            vehicle_id = None
+
+        values = {}
+        for field in ('lat', 'lng'):
+            try:
+                values[field] = _to_float(point.get(field))
+            except (TypeError, ValueError):
+                point_errors[field] = 'A valid number is required'
+        for field in ('speed', 'heading'):
+            value = point.get(field)
+            try:
+                values[field] = None if value is None else _to_float(value)
+            except (TypeError, ValueError):
+                point_errors[field] = 'A valid number is required'
+        try:
+            recorded_at = _to_datetime(point.get('recorded_at'))
+        except (TypeError, ValueError, OverflowError, OSError):
+            point_errors['recorded_at'] = 'A valid ISO 8601 datetime or epoch seconds is required'
+            recorded_at = None
+
+        if point_errors:
+            errors[index] = point_errors
+            continue
+        rows.append((
+            index, vehicle_id, values['lat'], values['lng'],
+            values['speed'], values['heading'], recorded_at,
+        ))
+    return rows, errors
+
+
+def validate_rows(rows, errors):
+    """Apply the ``VehicleLocation.clean`` range rules to a whole batch."""
+    valid = []
+    for row in rows:
+        index, _, lat, lng, speed, heading, _ = row
+        row_errors = {}
+        if lat < -90 or lat > 90:
+            row_errors['lat'] = 'Latitude must be between -90 and 90'
+        if lng < -180 or lng > 180:
+            row_errors['lng'] = 'Longitude must be between -180 and 180'
+        if speed is not None and speed < 0:
+            row_errors['speed'] = 'Speed cannot be negative'
+        if heading is not None and (heading < 0 or heading >= 360):
+            row_errors['heading'] = 'Heading must be between 0 and 360 degrees'
+        if row_errors:
+            errors[index] = row_errors
+        else:
+            valid.append(row)
+    return valid
+
+
+def existing_vehicle_ids(vehicle_ids):
+    """Return the subset of ``vehicle_ids`` that belong to existing vehicles."""
+    return set(Vehicle.objects.filter(id__in=vehicle_ids).values_list('id', flat=True))
+
+
+async def send_latest(channel_layer, messages):
+    """Send location messages to their vehicle groups, grid cells and the fleet group."""
+    for message in messages:
+        await channel_layer.group_send(
+            vehicle_group_name(message['vehicle_id']),
+            {'type': 'location.update', 'location': message},
+        )
+    await broadcast_positions(channel_layer, messages)
+
+
+def publish_latest(locations):
+    """Send the newest location of every vehicle to its live tracking group.
+
+    The same messages go to the grid cell and fleet groups; every send of the
+    batch runs in one trip to the event loop.
+    """
+    messages = [location_message(location) for location in latest_locations(locations)]
+    if messages:
+        async_to_sync(send_latest)(get_channel_layer(), messages)
+
+
+def ingest_points(points, publish=True):
+    """Validate, de-duplicate and store a batch of REAL positions.
+
+    Callers are responsible for authorising the reporter (admins only).
+    Returns a summary with the number of accepted and duplicate points and the
+    errors of every rejected point (by index in the submitted batch).
+    """
+    rows, errors = parse_points(points)
+    rows = validate_rows(rows, errors)
+
+    existing_vehicles = existing_vehicle_ids({row[1] for row in rows})
+    known_rows = []
+    for row in rows:
+        if row[1] in existing_vehicles:
+            known_rows.append(row)
+        else:
+            errors[row[0]] = {'vehicle': 'Vehicle not found'}
+
+    # De-duplicate inside the batch, then against what is already stored
+    seen = set()
+    unique_rows = []
+    for row in known_rows:
+        key = (row[1], row[6])
+        if key not in seen:
+            seen.add(key)
+            unique_rows.append(row)
+
+    if unique_rows:
+        existing = set(
+            VehicleLocation.objects.filter(
+                vehicle_id__in={row[1] for row in unique_rows},
+                recorded_at__in={row[6] for row in unique_rows},
+            ).values_list('vehicle_id', 'recorded_at')
+        )
+        unique_rows = [row for row in unique_rows if (row[1], row[6]) not in existing]
+
+    locations = [
+        VehicleLocation(
+            vehicle_id=vehicle_id,
+            lat=Decimal(lat).quantize(COORDINATE_QUANTUM),
+            lng=Decimal(lng).quantize(COORDINATE_QUANTUM),
+            speed=speed,
+            heading=heading,
+            recorded_at=recorded_at,
+            source=VehicleLocation.Source.REAL,
+        )
+        for _, vehicle_id, lat, lng, speed, heading, recorded_at in unique_rows
+    ]
+    if locations:
+        with transaction.atomic():
+            # Rows inserted concurrently by another writer are skipped and not reported
+            locations = VehicleLocation.objects.insert_new(
+                locations,
+                batch_size=getattr(settings, 'LOCATION_WRITER_BATCH_SIZE', 500),
+            )
+            VehicleCurrentLocation.objects.upsert_latest(locations)
+    if locations:
+        publish_positions(locations)
+        if publish:
+            publish_latest(locations)
+
+    return {
+        'received': len(points),
+        'accepted': len(locations),
+        'duplicates': len(known_rows) - len(locations),
+        'rejected': [
+            {'index': index, 'errors': errors[index]} for index in sorted(errors)
+        ],
+    }
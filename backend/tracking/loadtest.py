@@ -0,0 +1,175 @@
+"""
+Helpers of the load generating management commands (simulate_fleet,
+bench_websockets): a synthetic fleet with routes, users, permissions and
+plans, and latency summaries.
+"""
+import math
+import random
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from accounts.access import invalidate_vehicle_access
+from vehicles.models import Vehicle
+from planning.models import Personnel, Plan, VehicleUserPermission
+from .geo import EARTH_RADIUS_KM
+
+SIMULATOR_PERSONNEL = 'Fleet Simulator'
+
+
+def summarize(samples):
+    """Count, mean and p50/p95/p99/max of a list of numbers (None when empty)."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def percentile(value):
+        return ordered[min(len(ordered) - 1, math.ceil(value / 100 * len(ordered)) - 1)]
+
+    return {
+        'count': len(ordered),
+        'mean': round(sum(ordered) / len(ordered), 3),
+        'p50': round(percentile(50), 3),
+        'p95': round(percentile(95), 3),
+        'p99': round(percentile(99), 3),
+        'max': round(ordered[-1], 3),
+    }
+
+
+def synthetic_route(rng, center, radius_km, points=12):
+    """Closed, irregular loop of ``[lat, lng]`` points around a random spot near ``center``."""
+    lat0, lng0 = center
+    km_per_degree = math.pi * EARTH_RADIUS_KM / 180
+    offset = radius_km * math.sqrt(rng.random())
+    angle = rng.uniform(0, 2 * math.pi)
+    lat = lat0 + offset * math.cos(angle) / km_per_degree
+    lng = lng0 + offset * math.sin(angle) / (km_per_degree * math.cos(math.radians(lat0)))
+
+    loop_km = rng.uniform(1, 5)
+    route = []
+    for index in range(points):
+        step = 2 * math.pi * index / points
+        radius = loop_km * rng.uniform(0.6, 1.0)
+        route.append([
+            round(lat + radius * math.cos(step) / km_per_degree, 6),
+            round(lng + radius * math.sin(step) / (km_per_degree * math.cos(math.radians(lat))), 6),
+        ])
+    return route
+
+
+def sim_user_email(prefix, index):
+    return f'{prefix.lower().strip("-")}-user-{index}@example.com'
+
+
+def ensure_ingest_user(prefix='SIM-'):
+    """Admin service account that reports the simulated positions (ingestion is admin-only).
+
+    It is named like the fleet users, so ``remove_fleet`` deletes it with them.
+    """
+    User = get_user_model()
+    email = sim_user_email(prefix, 'ingest')
+    user, created = User.objects.get_or_create(
+        email=email, defaults={'username': email, 'role': User.Role.ADMIN},
+    )
+    if created:
+        user.set_unusable_password()
+        user.save(update_fields=['password'])
+    return user
+
+
+def ensure_fleet(vehicles, users, prefix='SIM-', center=(41.0082, 28.9784), radius_km=30,
+                 seed=0, plan_hours=24):
+    """Create the missing simulated vehicles, users, permissions and plans.
+
+    Vehicle ``i`` has plate ``{prefix}{i:06d}`` and belongs to user
+    ``i % users``, which gets a permission and an ACTIVE plan covering the
+    next ``plan_hours`` on it (kept while at least half of it is left). Existing rows are reused, so runs are
+    repeatable. Returns ``{user: [vehicle ids]}``.
+    """
+    rng = random.Random(seed)
+    User = get_user_model()
+    plates = [f'{prefix}{index:06d}' for index in range(vehicles)]
+    routes = [synthetic_route(rng, center, radius_km) for _ in plates]
+
+    with transaction.atomic():
+        existing = dict(Vehicle.objects.filter(plate__in=plates).values_list('plate', 'id'))
+        Vehicle.objects.bulk_create(
+            [
+                Vehicle(
+                    plate=plate, brand='Simulated', model='Load test', year=2024,
+                    simulation_route=route, is_streaming=True,
+                )
+                for plate, route in zip(plates, routes) if plate not in existing
+            ],
+            batch_size=1000,
+        )
+        ids = dict(Vehicle.objects.filter(plate__in=plates).values_list('plate', 'id'))
+
+        owners = []
+        for index in range(users):
+            user, created = User.objects.get_or_create(
+                email=sim_user_email(prefix, index),
+                defaults={'username': sim_user_email(prefix, index), 'role': User.Role.USER},
+            )
+            if created:
+                user.set_unusable_password()
+                user.save(update_fields=['password'])
+            owners.append(user)
+
+        fleet = {user: [] for user in owners}
+        for index, plate in enumerate(plates):
+            fleet[owners[index % users]].append(ids[plate])
+
+        VehicleUserPermission.objects.bulk_create(
+            [
+                VehicleUserPermission(user=user, vehicle_id=vehicle_id)
+                for user, vehicle_ids in fleet.items() for vehicle_id in vehicle_ids
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        # bulk_create sends no signals
+        for user in owners:
+            invalidate_vehicle_access(user.id)
+
+        now = timezone.now()
+        personnel, _ = Personnel.objects.get_or_create(full_name=SIMULATOR_PERSONNEL)
+        covered = set(Plan.objects.filter(
+            vehicle_id__in=ids.values(),
+            personnel=personnel,
+            status=Plan.Status.ACTIVE,
+            start_at__lte=now,
+            end_at__gte=now + timedelta(hours=plan_hours / 2),
+        ).values_list('vehicle_id', flat=True))
+        # Close the simulator plans that end too soon; the new ones may not overlap them
+        Plan.objects.filter(
+            personnel=personnel,
+            status__in=[Plan.Status.PLANNED, Plan.Status.ACTIVE],
+            vehicle_id__in=[vehicle_id for vehicle_id in ids.values() if vehicle_id not in covered],
+        ).update(status=Plan.Status.COMPLETED)
+        Plan.objects.bulk_create(
+            [
+                Plan(
+                    vehicle_id=vehicle_id, personnel=personnel, status=Plan.Status.ACTIVE,
+                    start_at=now, end_at=now + timedelta(hours=plan_hours),
+                    description='Created by the fleet simulator',
+                )
+                for vehicle_id in ids.values() if vehicle_id not in covered
+            ],
+            batch_size=1000,
+        )
+    return fleet
+
+
+def remove_fleet(prefix='SIM-'):
+    """Delete the simulated vehicles (with their locations, permissions and plans) and users."""
+    User = get_user_model()
+    vehicles = Vehicle.objects.filter(plate__startswith=prefix, brand='Simulated')
+    users = User.objects.filter(
+        email__startswith=sim_user_email(prefix, '').split('@')[0], email__endswith='@example.com'
+    )
+    counts = vehicles.count(), users.count()
+    vehicles.delete()
+    users.delete()
+    Personnel.objects.filter(full_name=SIMULATOR_PERSONNEL, plans__isnull=True).delete()
+    return counts
@@ -0,0 +1,54 @@
+"""
+Django management command to compare the location history serializers.
+Reads the same rows through the nested ModelSerializer and the compact
+columnar path and reports time and payload size of each.
+"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from tracking.models import VehicleLocation
+from tracking.serializers import CompactLocationSerializer, VehicleLocationSerializer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark VehicleLocationSerializer against the compact serialization path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vehicle', type=int, help='Only read locations of this vehicle')
+        parser.add_argument('--rows', type=int, default=1000, help='Rows per run (one page)')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per serializer; the best is reported')
+
+    def handle(self, *args, **options):
+        queryset = VehicleLocation.objects.order_by('-recorded_at', '-id')
+        if options['vehicle']:
+            queryset = queryset.filter(vehicle_id=options['vehicle'])
+        rows = options['rows']
+        if not queryset.exists():
+            raise CommandError('No locations to benchmark')
+
+        renderer = JSONRenderer()
+
+        def nested():
+            page = list(queryset.select_related('vehicle')[:rows])
+            return renderer.render(VehicleLocationSerializer(page, many=True).data)
+
+        def compact():
+            page = list(queryset.values(*CompactLocationSerializer.value_fields())[:rows])
+            return renderer.render(CompactLocationSerializer(page).data)
+
+        results = {}
+        for name, run in (('serializer', nested), ('compact', compact)):
+            best = None
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                body = run()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = (best, len(body))
+            self.stdout.write(f'{name:>10}: {best * 1000:8.1f} ms  {len(body):>10} bytes')
+
+        speedup = results['serializer'][0] / results['compact'][0]
+        ratio = results['compact'][1] / results['serializer'][1]
+        self.stdout.write(self.style.SUCCESS(
+            f'compact is {speedup:.1f}x faster with {ratio:.0%} of the payload'
+        ))
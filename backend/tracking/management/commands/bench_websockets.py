@@ -0,0 +1,190 @@
+"""
+Django management command to benchmark the live tracking WebSocket.
+Runs the ASGI application of core/asgi.py in-process on the in-memory
+channel layer, opens many concurrent ``ws/tracking/live/`` connections
+authenticated with minted JWTs for the simulated fleet users, and measures
+connect time, time to first location, end-to-end update latency, memory per
+connection and event loop lag. The results are written as JSON so runs can
+be compared between commits.
+"""
+import asyncio
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone as dt_timezone
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.utils.dateparse import parse_datetime
+from rest_framework_simplejwt.tokens import AccessToken
+from tracking.loadtest import ensure_fleet, summarize
+
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent live tracking WebSocket connections in-process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=1000, help='Concurrent WebSocket connections')
+        parser.add_argument('--vehicles', type=int, default=100, help='Watched vehicles (connections are spread over them)')
+        parser.add_argument('--users', type=int, default=10, help='Non-admin users the connections log in as')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds to measure once all are connected')
+        parser.add_argument('--tick', type=float, default=0.5, help='Simulation tick in seconds')
+        parser.add_argument('--connect-concurrency', type=int, default=100, help='Handshakes in flight')
+        parser.add_argument('--prefix', default='SIM-', help='Plate prefix of the simulated vehicles')
+        parser.add_argument('--no-tracemalloc', action='store_true', help='Skip the memory measurement (faster)')
+        parser.add_argument('--output', default='bench-websockets.json', help='JSON results file')
+
+    def handle(self, *args, **options):
+        if options['connections'] < 1 or options['vehicles'] < 1 or options['users'] < 1:
+            raise CommandError('--connections, --vehicles and --users must be positive')
+
+        fleet = ensure_fleet(
+            options['vehicles'], min(options['users'], options['vehicles']), prefix=options['prefix']
+        )
+        # Every connection logs in as the owner of the vehicle it watches
+        targets = [
+            (str(AccessToken.for_user(user)), vehicle_id)
+            for user, vehicle_ids in fleet.items() for vehicle_id in vehicle_ids
+        ]
+        targets = [targets[index % len(targets)] for index in range(options['connections'])]
+
+        with override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER, SIMULATION_TICK_SECONDS=options['tick']):
+            results = asyncio.run(self.run(targets, options))
+
+        results.update({
+            'commit': _git_commit(),
+            'created_at': datetime.now(dt_timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'config': {
+                name: options[name]
+                for name in ('connections', 'vehicles', 'users', 'duration', 'tick', 'connect_concurrency')
+            },
+        })
+        with open(options['output'], 'w') as output:
+            json.dump(results, output, indent=2)
+
+        self.stdout.write(
+            f'{results["connected"]}/{options["connections"]} connected, '
+            f'{results["updates"]} updates ({results["updates_per_second"]}/s), '
+            f'{results["errors"]} errors'
+        )
+        for name in ('connect_ms', 'first_location_ms', 'update_latency_ms', 'loop_lag_ms'):
+            summary = results[name]
+            if summary:
+                self.stdout.write(
+                    f'{name:>18}: p50 {summary["p50"]:.1f}  p95 {summary["p95"]:.1f}  '
+                    f'p99 {summary["p99"]:.1f}  max {summary["max"]:.1f}'
+                )
+        if results['memory_per_connection_kb'] is not None:
+            self.stdout.write(f'memory per connection: {results["memory_per_connection_kb"]} KiB')
+        self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+    async def run(self, targets, options):
+        # Imported here so the application picks up the in-memory channel layer
+        from core.asgi import application
+        from tracking.simulation import engine
+        from tracking.writer import writer
+
+        loop = asyncio.get_running_loop()
+        loop_lag = []
+        measuring = False
+
+        async def watch_loop(interval=0.05):
+            while True:
+                started = loop.time()
+                await asyncio.sleep(interval)
+                if measuring:
+                    loop_lag.append((loop.time() - started - interval) * 1000)
+
+        connect_ms, first_location_ms, update_latency = [], [], []
+        counts = {'updates': 0, 'errors': 0}
+        connections = []
+        readers = []
+
+        async def read(communicator, started):
+            first = True
+            while True:
+                output = await communicator.receive_output(timeout=None)
+                if output['type'] != 'websocket.send':
+                    counts['errors'] += 1
+                    return
+                message = json.loads(output['text'])
+                if message.get('type') != 'location':
+                    continue
+                received = time.time()
+                if first:
+                    first_location_ms.append((loop.time() - started) * 1000)
+                    first = False
+                if measuring:
+                    counts['updates'] += 1
+                    recorded_at = parse_datetime(message['recorded_at'])
+                    update_latency.append((received - recorded_at.timestamp()) * 1000)
+
+        semaphore = asyncio.Semaphore(options['connect_concurrency'])
+
+        async def open_connection(token, vehicle_id):
+            async with semaphore:
+                communicator = WebsocketCommunicator(
+                    application, f'/ws/tracking/live/?vehicle_id={vehicle_id}&token={token}'
+                )
+                started = loop.time()
+                connected, _ = await communicator.connect(timeout=30)
+                if not connected:
+                    counts['errors'] += 1
+                    return
+                connect_ms.append((loop.time() - started) * 1000)
+                connections.append(communicator)
+                readers.append(asyncio.create_task(read(communicator, started)))
+
+        lag_task = asyncio.create_task(watch_loop())
+        if not options['no_tracemalloc']:
+            tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+
+        await asyncio.gather(*(open_connection(token, vehicle_id) for token, vehicle_id in targets))
+        memory_per_connection = None
+        if baseline is not None:
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            if connections:
+                memory_per_connection = round((current - baseline) / len(connections) / 1024, 1)
+
+        measuring = True
+        started = loop.time()
+        await asyncio.sleep(options['duration'])
+        measuring = False
+        elapsed = loop.time() - started
+
+        for reader in readers:
+            reader.cancel()
+        await asyncio.gather(*readers, return_exceptions=True)
+        await asyncio.gather(*(communicator.disconnect() for communicator in connections))
+        lag_task.cancel()
+        await writer.flush()
+        # Let the engine notice that every vehicle was released
+        await asyncio.sleep(engine.get_tick_seconds())
+
+        return {
+            'connected': len(connections),
+            'errors': counts['errors'],
+            'updates': counts['updates'],
+            'updates_per_second': round(counts['updates'] / elapsed, 1) if elapsed else 0,
+            'connect_ms': summarize(connect_ms),
+            'first_location_ms': summarize(first_location_ms),
+            'update_latency_ms': summarize(update_latency),
+            'loop_lag_ms': summarize(loop_lag),
+            'memory_per_connection_kb': memory_per_connection,
+        }
@@ -0,0 +1,114 @@
+"""
+Django management command to maintain the VehicleLocation partitions.
+Run it periodically (e.g. daily from cron) to create upcoming partitions and
+drop or detach the ones past the retention window. Run it once with
+--backfill after migrating to move the pre-partitioning history into the
+partitions in batches.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from tracking import partitions
+
+
+class Command(BaseCommand):
+    help = 'Create future VehicleLocation partitions and drop or detach old ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            choices=[partitions.INTERVAL_DAY, partitions.INTERVAL_MONTH],
+            default=getattr(settings, 'LOCATION_PARTITION_INTERVAL', partitions.INTERVAL_MONTH),
+            help='Size of each new partition',
+        )
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=getattr(settings, 'LOCATION_PARTITIONS_AHEAD', 3),
+            help='Number of future partitions to keep ready',
+        )
+        parser.add_argument(
+            '--retain',
+            type=int,
+            default=getattr(settings, 'LOCATION_PARTITION_RETENTION', None),
+            help='Number of past intervals to keep; older partitions are removed',
+        )
+        parser.add_argument(
+            '--detach',
+            action='store_true',
+            help='Detach old partitions instead of dropping them (e.g. to archive them)',
+        )
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='Move the rows left in the legacy table by migration 0004 into the partitions',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Rows moved per transaction by --backfill',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list the partitions that would be removed',
+        )
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            raise CommandError(
+                f'{partitions.PARENT_TABLE} is not a partitioned PostgreSQL table; run migrations first.'
+            )
+
+        if options['backfill']:
+            self.backfill(options['batch_size'])
+            return
+
+        interval = options['interval']
+        now = timezone.now()
+
+        if not options['dry_run']:
+            for name, moved in partitions.ensure_partitions(options['ahead'], interval, now):
+                self.stdout.write(self.style.SUCCESS(
+                    f'Created partition {name} (moved {moved} rows from the default partition)'
+                ))
+
+        retain = options['retain']
+        if retain is None:
+            return
+
+        cutoff = partitions.period_start(now, interval)
+        for _ in range(retain):
+            cutoff = partitions.previous_period(cutoff, interval)
+
+        if options['dry_run']:
+            for name, _, end in partitions.list_partitions():
+                if end <= cutoff:
+                    self.stdout.write(f'Would remove partition {name}')
+            return
+
+        action = 'Detached' if options['detach'] else 'Dropped'
+        for name in partitions.remove_partitions_before(cutoff, detach=options['detach']):
+            self.stdout.write(self.style.WARNING(f'{action} partition {name}'))
+
+    def backfill(self, batch_size):
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+        if not partitions.legacy_table_exists():
+            self.stdout.write('Nothing to backfill: the legacy table is gone.')
+            return
+
+        total_moved = total_inserted = 0
+        while True:
+            moved, inserted = partitions.backfill_legacy_batch(batch_size)
+            if not moved:
+                break
+            total_moved += moved
+            total_inserted += inserted
+            self.stdout.write(f'Moved {total_moved} rows ({total_inserted} inserted)')
+        partitions.drop_legacy_table()
+        self.stdout.write(self.style.SUCCESS(
+            f'Backfill complete: {total_inserted} of {total_moved} legacy rows kept; '
+            f'dropped {partitions.LEGACY_TABLE}'
+        ))
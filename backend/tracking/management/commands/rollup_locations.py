@@ -0,0 +1,67 @@
+"""
+Django management command to downsample the location history.
+Run it periodically (e.g. every few minutes from cron) to roll raw points up
+into per-minute and per-hour summaries and to delete raw points past the
+retention period.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from tracking import rollups
+
+
+class Command(BaseCommand):
+    help = 'Roll up VehicleLocation points into minute/hour summaries and prune old raw points'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Recompute rollups from this ISO 8601 datetime (default: continue from the last run)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows fetched and rollups written per batch',
+        )
+        parser.add_argument(
+            '--skip-prune',
+            action='store_true',
+            help='Only build rollups; keep every raw point',
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError('--since must be an ISO 8601 datetime')
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        now = timezone.now()
+        for start, end, minutes, hours in rollups.rollup_pending(now, since, options['batch_size']):
+            self.stdout.write(
+                f'{start:%Y-%m-%d %H:%M} - {end:%Y-%m-%d %H:%M}: '
+                f'{minutes} minute and {hours} hour rollups'
+            )
+
+        if options['skip_prune']:
+            return
+
+        retention = rollups.raw_retention()
+        rolled_up_until = rollups.rolled_up_until()
+        if retention and rolled_up_until:
+            # Never delete raw points that are not rolled up yet
+            cutoff = min(now - retention, rolled_up_until)
+            dropped, deleted = rollups.prune_raw_locations(cutoff)
+            for name in dropped:
+                self.stdout.write(self.style.WARNING(f'Dropped partition {name}'))
+            self.stdout.write(self.style.SUCCESS(
+                f'Deleted {deleted} raw points recorded before {cutoff:%Y-%m-%d %H:%M}'
+            ))
+
+        retention = rollups.minute_rollup_retention()
+        if retention:
+            deleted = rollups.prune_rollups(rollups.Resolution.MINUTE, now - retention)
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} minute rollups'))
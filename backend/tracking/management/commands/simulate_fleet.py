@@ -0,0 +1,197 @@
+"""
+Django management command to load-test the tracking pipeline.
+Creates a synthetic fleet (vehicles with routes, users with permissions and
+plans), then drives positions at a fixed rate through the ingestion WebSocket
+(``ws/tracking/ingest/`` of core/asgi.py, run in-process) as an admin service
+account, and reports the achieved throughput, the latency from sending each
+batch to its acknowledgement and the broadcast latency from a position's
+timestamp to its arrival on the fleet channel group.
+"""
+import asyncio
+import json
+import random
+import time
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework_simplejwt.tokens import AccessToken
+from vehicles.models import Vehicle
+from tracking.loadtest import ensure_fleet, ensure_ingest_user, remove_fleet, summarize
+from tracking.routes import CompiledRoute
+from tracking.spatial import FLEET_GROUP
+
+
+class Command(BaseCommand):
+    help = 'Generate a simulated fleet and drive positions through the ingestion path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vehicles', type=int, default=10000, help='Simulated vehicles')
+        parser.add_argument('--users', type=int, default=10, help='Users sharing the fleet (one permission per vehicle)')
+        parser.add_argument('--rate', type=float, default=1000, help='Target positions per second')
+        parser.add_argument('--batch-size', type=int, default=500, help='Positions per ingestion message')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to drive the fleet')
+        parser.add_argument('--concurrency', type=int, default=4, help='Ingestion connections, one batch in flight each')
+        parser.add_argument('--speed', type=float, default=45, help='Average vehicle speed in km/h')
+        parser.add_argument('--prefix', default='SIM-', help='Plate prefix of the simulated vehicles')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of routes and speeds')
+        parser.add_argument('--output', help='Write the report as JSON to this file')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the simulated fleet and exit')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            vehicles, users = remove_fleet(options['prefix'])
+            self.stdout.write(self.style.SUCCESS(f'Removed {vehicles} vehicles and {users} users'))
+            return
+        if options['vehicles'] < 1 or options['users'] < 1 or options['rate'] <= 0:
+            raise CommandError('--vehicles, --users and --rate must be positive')
+        max_points = getattr(settings, 'LOCATION_INGEST_MAX_POINTS', 5000)
+        if not 1 <= options['batch_size'] <= max_points:
+            raise CommandError(f'--batch-size must be between 1 and {max_points}')
+
+        started = time.perf_counter()
+        fleet = ensure_fleet(
+            options['vehicles'], min(options['users'], options['vehicles']),
+            prefix=options['prefix'], seed=options['seed'],
+        )
+        self.stdout.write(
+            f'Fleet of {options["vehicles"]} vehicles and {len(fleet)} users ready '
+            f'in {time.perf_counter() - started:.1f}s'
+        )
+
+        token = str(AccessToken.for_user(ensure_ingest_user(options['prefix'])))
+        routes = {
+            vehicle_id: CompiledRoute(route)
+            for vehicle_id, route in Vehicle.objects.filter(
+                id__in=[vehicle_id for ids in fleet.values() for vehicle_id in ids]
+            ).values_list('id', 'simulation_route')
+        }
+        report = asyncio.run(self.drive(fleet, routes, token, options))
+
+        self.stdout.write(
+            f'{report["accepted"]} positions accepted in {report["elapsed_seconds"]}s: '
+            f'{report["throughput"]} positions/s (target {options["rate"]:g})'
+        )
+        if report['rejected']:
+            self.stdout.write(self.style.WARNING(f'{report["rejected"]} positions rejected'))
+        for name in ('ack_latency_ms', 'broadcast_latency_ms'):
+            summary = report[name]
+            if summary:
+                self.stdout.write(
+                    f'{name:>22}: p50 {summary["p50"]:.1f}  p95 {summary["p95"]:.1f}  '
+                    f'p99 {summary["p99"]:.1f}  max {summary["max"]:.1f}'
+                )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Report written to {options["output"]}'))
+
+    async def drive(self, fleet, routes, token, options):
+        # Imported here so the management command does not build the ASGI stack unless it runs
+        from core.asgi import application
+
+        rng = random.Random(options['seed'])
+        speeds = {vehicle_id: options['speed'] * rng.uniform(0.85, 1.15) for vehicle_id in routes}
+        offsets = {vehicle_id: rng.uniform(0, route.total_km) for vehicle_id, route in routes.items()}
+
+        # Batches of one user's vehicles, taken round-robin over the users
+        batch_size = options['batch_size']
+        chunks = [
+            [vehicle_ids[start:start + batch_size] for start in range(0, len(vehicle_ids), batch_size)]
+            for vehicle_ids in fleet.values()
+        ]
+        batches = [chunk for group in zip(*chunks) for chunk in group]
+        batches += [chunk for group in chunks for chunk in group[min(map(len, chunks)):]]
+
+        channel_layer = get_channel_layer()
+        listener = await channel_layer.new_channel()
+        await channel_layer.group_add(FLEET_GROUP, listener)
+        broadcast_latency = []
+
+        async def receive():
+            while True:
+                message = await channel_layer.receive(listener)
+                received = time.time()
+                for position in message.get('positions', ()):
+                    recorded_at = parse_datetime(position['recorded_at'])
+                    broadcast_latency.append((received - recorded_at.timestamp()) * 1000)
+
+        # One connection per batch in flight; a batch waits for its ack before the next is sent
+        connections = asyncio.Queue()
+        communicators = []
+        for _ in range(max(1, options['concurrency'])):
+            communicator = WebsocketCommunicator(application, f'/ws/tracking/ingest/?token={token}')
+            connected, code = await communicator.connect(timeout=30)
+            if not connected:
+                raise CommandError(f'Ingestion WebSocket rejected the connection (code {code})')
+            communicators.append(communicator)
+            connections.put_nowait(communicator)
+
+        ack_latency = []
+        totals = {'accepted': 0, 'rejected': 0}
+
+        async def run_batch(communicator, seq, vehicle_ids, elapsed_hours):
+            try:
+                now = timezone.now()
+                points = []
+                for vehicle_id in vehicle_ids:
+                    lat, lng, heading = routes[vehicle_id].position_at(
+                        offsets[vehicle_id] + speeds[vehicle_id] * elapsed_hours
+                    )
+                    points.append({
+                        'vehicle': vehicle_id, 'lat': round(lat, 6), 'lng': round(lng, 6),
+                        'speed': round(speeds[vehicle_id], 2), 'heading': round(heading, 1) % 360,
+                        'recorded_at': now.isoformat(),
+                    })
+                started = time.perf_counter()
+                await communicator.send_to(text_data=json.dumps({'seq': seq, 'points': points}))
+                ack = json.loads(await communicator.receive_from(timeout=60))
+                ack_latency.append((time.perf_counter() - started) * 1000)
+                if ack.get('type') != 'ack':
+                    totals['rejected'] += len(points)
+                    return
+                totals['accepted'] += ack['accepted']
+                totals['rejected'] += len(ack['rejected'])
+            finally:
+                connections.put_nowait(communicator)
+
+        receiver = asyncio.create_task(receive())
+        loop = asyncio.get_running_loop()
+        interval = batch_size / options['rate']
+        started = loop.time()
+        tasks = []
+        index = 0
+        while loop.time() - started < options['duration']:
+            # Keep the schedule; when the pipeline falls behind, waiting for a free connection slows the producer down
+            delay = started + index * interval - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            communicator = await connections.get()
+            tasks.append(asyncio.create_task(
+                run_batch(communicator, index, batches[index % len(batches)], (loop.time() - started) / 3600)
+            ))
+            index += 1
+        await asyncio.gather(*tasks)
+        elapsed = loop.time() - started
+        # Let the last broadcasts arrive
+        await asyncio.sleep(0.5)
+        receiver.cancel()
+        await channel_layer.group_discard(FLEET_GROUP, listener)
+        await asyncio.gather(*(communicator.disconnect() for communicator in communicators))
+
+        return {
+            'vehicles': len(routes),
+            'users': len(fleet),
+            'target_rate': options['rate'],
+            'batch_size': batch_size,
+            'concurrency': len(communicators),
+            'batches': index,
+            'accepted': totals['accepted'],
+            'rejected': totals['rejected'],
+            'elapsed_seconds': round(elapsed, 2),
+            'throughput': round(totals['accepted'] / elapsed, 1) if elapsed else 0,
+            'ack_latency_ms': summarize(ack_latency),
+            'broadcast_latency_ms': summarize(broadcast_latency),
+        }
@@ -2,15 +2,8 @@
 Custom middleware for JWT authentication in WebSocket connections.
 """
 from channels.middleware import BaseMiddleware
-from channels.db import database_sync_to_async
-from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.tokens import UntypedToken
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-from jwt import decode as jwt_decode
-from django.conf import settings
 from urllib.parse import parse_qs
-
-User = get_user_model()
+from accounts.principals import authenticate_token
 
 
 class JWTAuthMiddleware(BaseMiddleware):
@@ -34,31 +27,11 @@ class JWTAuthMiddleware(BaseMiddleware):
             if auth_header.startswith('Bearer '):
                 token = auth_header.split('Bearer ')[1]
         
-        # 2. التحقق من صحة التوكن وجلب المستخدم
-        user = None
-        if token:
-            try:
-                # التحقق الأولي من هيكلية التوكن
-                UntypedToken(token)
-                # فك تشفير التوكن للحصول على معرف المستخدم (user_id)
-                decoded_data = jwt_decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-                user_id = decoded_data.get('user_id')
-                
-                if user_id:
-                    user = await self.get_user(user_id)
-            except (InvalidToken, TokenError, Exception):
-                # في حال كان التوكن منتهياً أو غير صالح، نترك المستخدم None
-                user = None
+        # 2. التحقق من التوكن مرة واحدة وبناء مستخدم خفيف (UserPrincipal) من الذاكرة المؤقتة
+        # في حال كان التوكن منتهياً أو غير صالح أو الحساب معطلاً، يبقى المستخدم None
+        user = await authenticate_token(token) if token else None
         
         # 3. إضافة كائن المستخدم إلى الـ scope ليكون متاحاً في الـ Consumer
         scope['user'] = user
         
         return await super().__call__(scope, receive, send)
-    
-    @database_sync_to_async
-    def get_user(self, user_id):
-        """جلب المستخدم من قاعدة البيانات بشكل غير متزامن."""
-        try:
-            return User.objects.get(id=user_id)
-        except User.DoesNotExist:
-            return None
\ No newline at end of file
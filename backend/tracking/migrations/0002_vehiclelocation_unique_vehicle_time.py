@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:04
+
+from django.db import migrations, models
+
+
+def delete_duplicate_locations(apps, schema_editor):
+    """Keep the first row of every (vehicle, recorded_at) pair before adding the constraint."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DELETE FROM tracking_vehiclelocation a USING tracking_vehiclelocation b '
+        'WHERE a.vehicle_id = b.vehicle_id AND a.recorded_at = b.recorded_at AND a.id > b.id'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracking', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_locations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='vehiclelocation',
+            constraint=models.UniqueConstraint(fields=('vehicle', 'recorded_at'), name='tracking_location_vehicle_time_uniq'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_current_locations(apps, schema_editor):
+    """Seed one current row per vehicle from the location history."""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'INSERT INTO tracking_vehiclecurrentlocation '
+            '(vehicle_id, lat, lng, speed, heading, recorded_at, source, updated_at) '
+            'SELECT DISTINCT ON (vehicle_id) vehicle_id, lat, lng, speed, heading, recorded_at, source, NOW() '
+            'FROM tracking_vehiclelocation ORDER BY vehicle_id, recorded_at DESC'
+        )
+        return
+
+    VehicleLocation = apps.get_model('tracking', 'VehicleLocation')
+    VehicleCurrentLocation = apps.get_model('tracking', 'VehicleCurrentLocation')
+    vehicle_ids = VehicleLocation.objects.order_by().values_list('vehicle_id', flat=True).distinct()
+    for vehicle_id in vehicle_ids:
+        location = VehicleLocation.objects.filter(vehicle_id=vehicle_id).order_by('-recorded_at').first()
+        VehicleCurrentLocation.objects.create(
+            vehicle_id=vehicle_id,
+            lat=location.lat,
+            lng=location.lng,
+            speed=location.speed,
+            heading=location.heading,
+            recorded_at=location.recorded_at,
+            source=location.source,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0003_alter_vehicle_owner'),
+        ('tracking', '0002_vehiclelocation_unique_vehicle_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleCurrentLocation',
+            fields=[
+                ('vehicle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='current_location', serialize=False, to='vehicles.vehicle')),
+                ('lat', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('lng', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('speed', models.FloatField(blank=True, null=True)),
+                ('heading', models.FloatField(blank=True, null=True)),
+                ('recorded_at', models.DateTimeField()),
+                ('source', models.CharField(choices=[('SIMULATED', 'Simulated'), ('REAL', 'Real')], max_length=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-recorded_at'],
+            },
+        ),
+        migrations.RunPython(backfill_current_locations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,160 @@
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+
+LEGACY_TABLE = 'tracking_vehiclelocation_legacy'
+TABLE = 'tracking_vehiclelocation'
+SEQUENCE = 'tracking_vehiclelocation_part_id_seq'
+COLUMNS = 'id, lat, lng, speed, heading, recorded_at, source, vehicle_id'
+# Monthly partitions created ahead of the current month; later ones come from
+# the manage_location_partitions command.
+MONTHS_AHEAD = 3
+
+
+def _month_starts(first, last):
+    current = first.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while current <= last:
+        yield current
+        if current.month == 12:
+            current = current.replace(year=current.year + 1, month=1)
+        else:
+            current = current.replace(month=current.month + 1)
+
+
+def _next_month(moment):
+    if moment.month == 12:
+        return moment.replace(year=moment.year + 1, month=1)
+    return moment.replace(month=moment.month + 1)
+
+
+def _create_indexes(execute):
+    # Same names as the model state so later migrations can address them
+    execute(f'CREATE INDEX tracking_ve_vehicle_70981b_idx ON {TABLE} (vehicle_id, recorded_at DESC)')
+    execute(f'CREATE INDEX tracking_ve_recorde_5c0981_idx ON {TABLE} (recorded_at)')
+    execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT tracking_location_vehicle_time_uniq '
+        'UNIQUE (vehicle_id, recorded_at)'
+    )
+    execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT tracking_vehiclelocation_vehicle_id_fk_vehicles_vehicle_id '
+        'FOREIGN KEY (vehicle_id) REFERENCES vehicles_vehicle (id) DEFERRABLE INITIALLY DEFERRED'
+    )
+
+
+def partition_locations(apps, schema_editor):
+    """Replace the location history with a table range-partitioned by recorded_at.
+
+    The primary key becomes (id, recorded_at) because PostgreSQL requires the
+    partition key in every unique constraint; Django keeps addressing rows by id.
+
+    No rows are copied here, so the migration only holds its locks for the
+    renames and the DDL. The existing rows stay in tracking_vehiclelocation_legacy
+    (its indexes renamed and its foreign keys dropped) until
+    ``manage_location_partitions --backfill`` moves them over in small batches;
+    history reads do not see them before that.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    execute = schema_editor.execute
+    execute(f'ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT indexname FROM pg_indexes WHERE tablename = %s', [LEGACY_TABLE])
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [LEGACY_TABLE],
+        )
+        foreign_keys = [row[0] for row in cursor.fetchall()]
+        cursor.execute(f'SELECT MIN(recorded_at), MAX(id) FROM {LEGACY_TABLE}')
+        first_recorded_at, max_id = cursor.fetchone()
+    # Index names are unique per schema; renaming an index also renames its constraint
+    for name in indexes:
+        execute(f'ALTER INDEX "{name}" RENAME TO "{name[:56]}_legacy"')
+    # Vehicles deleted before the backfill must not be blocked by staged rows
+    for name in foreign_keys:
+        execute(f'ALTER TABLE {LEGACY_TABLE} DROP CONSTRAINT "{name}"')
+
+    now = datetime.now(timezone.utc)
+    last = now
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(last)
+    first = min(first_recorded_at, now) if first_recorded_at else now
+    first = first.astimezone(timezone.utc)
+
+    execute(f'CREATE SEQUENCE {SEQUENCE}')
+    execute(
+        f'CREATE TABLE {TABLE} ('
+        f" id bigint NOT NULL DEFAULT nextval('{SEQUENCE}'),"
+        ' lat numeric(9, 6) NOT NULL,'
+        ' lng numeric(9, 6) NOT NULL,'
+        ' speed double precision NULL,'
+        ' heading double precision NULL,'
+        ' recorded_at timestamp with time zone NOT NULL,'
+        ' source varchar(10) NOT NULL,'
+        ' vehicle_id bigint NOT NULL,'
+        ' PRIMARY KEY (id, recorded_at)'
+        ') PARTITION BY RANGE (recorded_at)'
+    )
+    execute(f'ALTER SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id')
+    execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+    for start in _month_starts(first, last):
+        end = _next_month(start)
+        execute(
+            f'CREATE TABLE {TABLE}_p{start:%Y%m%d}_{end:%Y%m%d} PARTITION OF {TABLE} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [start, end],
+        )
+    # New ids continue after the staged rows so the backfill keeps theirs
+    if max_id:
+        execute(f"SELECT setval('{SEQUENCE}', %s)", [max_id])
+    _create_indexes(execute)
+
+
+def unpartition_locations(apps, schema_editor):
+    """Rebuild a plain location table from the partitions and any rows not yet backfilled.
+
+    This copies every row in one transaction, so plan a maintenance window
+    before rolling back a large history.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    plain = f'{TABLE}_plain'
+    execute = schema_editor.execute
+    execute(f'CREATE TABLE {plain} (LIKE {TABLE})')
+    execute(f'INSERT INTO {plain} ({COLUMNS}) SELECT {COLUMNS} FROM {TABLE}')
+    execute(f'DROP TABLE {TABLE}')
+    execute(f'ALTER TABLE {plain} RENAME TO {TABLE}')
+    execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id)')
+    _create_indexes(execute)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [LEGACY_TABLE])
+        has_legacy = cursor.fetchone()[0] is not None
+    if has_legacy:
+        execute(
+            f'INSERT INTO {TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {LEGACY_TABLE} l '
+            'WHERE EXISTS (SELECT 1 FROM vehicles_vehicle v WHERE v.id = l.vehicle_id) '
+            'ON CONFLICT DO NOTHING'
+        )
+        execute(f'DROP TABLE {LEGACY_TABLE}')
+        # Run the deferred foreign key checks now; ALTER TABLE refuses pending trigger events
+        execute('SET CONSTRAINTS ALL IMMEDIATE')
+    execute(f'ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+    execute(
+        f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), "
+        f'COALESCE((SELECT MAX(id) FROM {TABLE}), 0) + 1, false)'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0003_alter_vehicle_owner'),
+        ('tracking', '0003_vehiclecurrentlocation'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_locations, unpartition_locations),
+    ]
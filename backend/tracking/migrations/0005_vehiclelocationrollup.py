@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0003_alter_vehicle_owner'),
+        ('tracking', '0004_partition_vehiclelocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleLocationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('MINUTE', 'Minute'), ('HOUR', 'Hour')], max_length=6)),
+                ('bucket', models.DateTimeField()),
+                ('lat', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('lng', models.DecimalField(decimal_places=6, max_digits=9)),
+                ('heading', models.FloatField(blank=True, null=True)),
+                ('recorded_at', models.DateTimeField()),
+                ('avg_speed', models.FloatField(blank=True, null=True)),
+                ('max_speed', models.FloatField(blank=True, null=True)),
+                ('distance_km', models.FloatField(default=0)),
+                ('point_count', models.PositiveIntegerField(default=0)),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='location_rollups', to='vehicles.vehicle')),
+            ],
+            options={
+                'ordering': ['-bucket'],
+                'indexes': [models.Index(fields=['resolution', 'bucket'], name='tracking_ve_resolut_15b302_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='vehiclelocationrollup',
+            constraint=models.UniqueConstraint(fields=('vehicle', 'resolution', 'bucket'), name='tracking_rollup_vehicle_bucket_uniq'),
+        ),
+    ]
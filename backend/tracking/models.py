@@ -1,8 +1,65 @@
-from django.db import models
+from django.db import connections, models
+from django.db.models.expressions import Col
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from vehicles.models import Vehicle
 
 
+class VehicleLocationManager(models.Manager):
+    """Manager for batch inserts of location points."""
+
+    def insert_new(self, locations, batch_size=500):
+        """Insert ``locations``, skipping points already stored for the same vehicle and time.
+
+        Returns the locations that were actually inserted, with their ids set.
+        A point that another writer stored first is left out, so callers only
+        count and publish what this call wrote. ``locations`` must not repeat
+        a ``(vehicle, recorded_at)`` pair.
+        """
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        fields = [self.model._meta.get_field(name) for name in (
+            'vehicle', 'lat', 'lng', 'speed', 'heading', 'recorded_at', 'source'
+        )]
+        columns = [field.column for field in fields]
+        # RETURNING bypasses the ORM, so convert recorded_at like a query would
+        recorded_at_col = Col(self.model._meta.db_table, fields[5])
+        converters = (
+            connection.ops.get_db_converters(recorded_at_col) +
+            fields[5].get_db_converters(connection)
+        )
+        row_placeholder = '(%s)' % ', '.join(['%s'] * len(columns))
+
+        inserted = []
+        for start in range(0, len(locations), batch_size):
+            batch = locations[start:start + batch_size]
+            by_key = {(location.vehicle_id, location.recorded_at): location for location in batch}
+            params = []
+            for location in batch:
+                params.extend(
+                    field.get_db_prep_save(getattr(location, field.attname), connection)
+                    for field in fields
+                )
+            sql = (
+                f'INSERT INTO {table} ({", ".join(quote(column) for column in columns)}) '
+                f'VALUES {", ".join([row_placeholder] * len(batch))} '
+                f'ON CONFLICT ({quote(columns[0])}, {quote(columns[5])}) DO NOTHING '
+                f'RETURNING {quote("id")}, {quote(columns[0])}, {quote(columns[5])}'
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+            for pk, vehicle_id, recorded_at in rows:
+                for converter in converters:
+                    recorded_at = converter(recorded_at, recorded_at_col, connection)
+                location = by_key[(vehicle_id, recorded_at)]
+                location.pk = pk
+                location._state.adding = False
+                inserted.append(location)
+        return inserted
+
+
 class VehicleLocation(models.Model):
     """Vehicle location tracking model."""
     
@@ -17,11 +74,12 @@ class VehicleLocation(models.Model):
     heading = models.FloatField(null=True, blank=True)
     recorded_at = models.DateTimeField(db_index=True)
     source = models.CharField(max_length=10, choices=Source.choices, default=Source.REAL)
+
+    objects = VehicleLocationManager()
     
     def save(self, *args, **kwargs):
         """Set recorded_at to now if not provided."""
         if not self.recorded_at:
-            from django.utils import timezone
             self.recorded_at = timezone.now()
         super().save(*args, **kwargs)
 
@@ -31,6 +89,9 @@ class VehicleLocation(models.Model):
             models.Index(fields=['vehicle', '-recorded_at']),
             models.Index(fields=['recorded_at']),
         ]
+        constraints = [
+            models.UniqueConstraint(fields=['vehicle', 'recorded_at'], name='tracking_location_vehicle_time_uniq'),
+        ]
 
     def __str__(self):
         return f"{self.vehicle.plate} - {self.recorded_at}"
@@ -47,3 +108,119 @@ class VehicleLocation(models.Model):
         if self.heading is not None:
             if self.heading < 0 or self.heading >= 360:
                 raise ValidationError({'heading': 'Heading must be between 0 and 360 degrees'})
+
+
+class VehicleCurrentLocationManager(models.Manager):
+    """Manager that keeps one row per vehicle in sync with incoming locations."""
+
+    def upsert_latest(self, locations):
+        """Store the newest of ``locations`` per vehicle.
+
+        A row is only replaced when the incoming point is newer than the stored
+        one, so concurrent or out-of-order writers cannot move a vehicle back
+        in time.
+        """
+        latest = {}
+        for location in locations:
+            current = latest.get(location.vehicle_id)
+            if current is None or location.recorded_at > current.recorded_at:
+                latest[location.vehicle_id] = location
+        if not latest:
+            return 0
+
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        fields = [self.model._meta.get_field(name) for name in (
+            'vehicle', 'lat', 'lng', 'speed', 'heading', 'recorded_at', 'source', 'updated_at'
+        )]
+        columns = [field.column for field in fields]
+        now = timezone.now()
+
+        params = []
+        # Sorted by vehicle so concurrent upserts lock rows in the same order
+        for vehicle_id in sorted(latest):
+            location = latest[vehicle_id]
+            values = (
+                vehicle_id, location.lat, location.lng, location.speed,
+                location.heading, location.recorded_at, location.source, now,
+            )
+            params.extend(
+                field.get_db_prep_save(value, connection)
+                for field, value in zip(fields, values)
+            )
+
+        row_placeholder = '(%s)' % ', '.join(['%s'] * len(columns))
+        updates = ', '.join(
+            f'{quote(column)} = EXCLUDED.{quote(column)}' for column in columns[1:]
+        )
+        sql = (
+            f'INSERT INTO {table} ({", ".join(quote(column) for column in columns)}) '
+            f'VALUES {", ".join([row_placeholder] * len(latest))} '
+            f'ON CONFLICT ({quote(columns[0])}) DO UPDATE SET {updates} '
+            f'WHERE {table}.{quote("recorded_at")} < EXCLUDED.{quote("recorded_at")}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+
+class VehicleCurrentLocation(models.Model):
+    """Latest known position of each vehicle, maintained on write."""
+    vehicle = models.OneToOneField(
+        Vehicle,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='current_location'
+    )
+    lat = models.DecimalField(max_digits=9, decimal_places=6)
+    lng = models.DecimalField(max_digits=9, decimal_places=6)
+    speed = models.FloatField(null=True, blank=True)
+    heading = models.FloatField(null=True, blank=True)
+    recorded_at = models.DateTimeField()
+    source = models.CharField(max_length=10, choices=VehicleLocation.Source.choices)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = VehicleCurrentLocationManager()
+
+    class Meta:
+        ordering = ['-recorded_at']
+
+    def __str__(self):
+        return f"{self.vehicle_id} @ {self.recorded_at}"
+
+
+class VehicleLocationRollup(models.Model):
+    """Per-minute or per-hour summary of a vehicle's location history."""
+
+    class Resolution(models.TextChoices):
+        MINUTE = 'MINUTE', 'Minute'
+        HOUR = 'HOUR', 'Hour'
+
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='location_rollups')
+    resolution = models.CharField(max_length=6, choices=Resolution.choices)
+    bucket = models.DateTimeField()
+    # Last position inside the bucket
+    lat = models.DecimalField(max_digits=9, decimal_places=6)
+    lng = models.DecimalField(max_digits=9, decimal_places=6)
+    heading = models.FloatField(null=True, blank=True)
+    recorded_at = models.DateTimeField()
+    avg_speed = models.FloatField(null=True, blank=True)
+    max_speed = models.FloatField(null=True, blank=True)
+    distance_km = models.FloatField(default=0)
+    point_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-bucket']
+        indexes = [
+            models.Index(fields=['resolution', 'bucket']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['vehicle', 'resolution', 'bucket'],
+                name='tracking_rollup_vehicle_bucket_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicle_id} {self.resolution} @ {self.bucket}"
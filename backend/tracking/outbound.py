@@ -0,0 +1,200 @@
+"""
+Per-connection outbound buffering of the tracking WebSockets.
+
+Consumers do not send a location as soon as it arrives. Updates are put in
+an ``OutboundBuffer`` keyed by kind and vehicle, where a newer update
+replaces one the client has not received yet, and a single sender task per
+connection drains the buffer:
+
+* at most one frame per ``interval`` seconds (the connection's max rate),
+  each frame carrying every pending update;
+* optionally at most ``max_rate`` updates per second for single keys, so a
+  subscription can ask for a slower rate for some vehicles;
+* with an ack window, at most ``ack_window`` frames the client has not
+  acknowledged; a client that falls behind receives only the latest update
+  of each vehicle instead of an ever growing backlog in the server.
+
+Counters of all connections of this worker are kept in ``outbound_stats``.
+"""
+import asyncio
+from urllib.parse import parse_qs
+from django.conf import settings
+
+MAX_ACK_WINDOW = 64
+
+
+class OutboundStats:
+    """Worker-wide counters of the outbound buffers."""
+
+    def __init__(self):
+        self.connections = 0
+        self.updates = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.frames = 0
+        self.sent = 0
+        self.ack_waits = 0
+
+    def get_stats(self):
+        return {
+            'connections': self.connections,
+            'updates': self.updates,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'frames': self.frames,
+            'sent': self.sent,
+            'ack_waits': self.ack_waits,
+        }
+
+
+outbound_stats = OutboundStats()
+
+
+def client_options(scope, default_interval=0.0):
+    """Frame interval and ack window requested with `?max_rate=` and `?ack_window=`.
+
+    `max_rate` is in frames per second and capped at TRACKING_MAX_CLIENT_RATE.
+    """
+    params = parse_qs(scope.get('query_string', b'').decode())
+    interval = default_interval
+    ack_window = 0
+    try:
+        max_rate = float(params['max_rate'][0])
+        if max_rate > 0:
+            max_rate = min(max_rate, getattr(settings, 'TRACKING_MAX_CLIENT_RATE', 20))
+            interval = max(interval, 1 / max_rate)
+    except (KeyError, ValueError):
+        pass
+    try:
+        ack_window = min(max(int(params['ack_window'][0]), 0), MAX_ACK_WINDOW)
+    except (KeyError, ValueError):
+        pass
+    return interval, ack_window
+
+
+class OutboundBuffer:
+    """Latest-wins queue of the updates not yet sent on one connection.
+
+    ``send(batch, seq)`` is awaited with ``{kind: {key: value}}`` for each
+    frame; ``seq`` numbers the frames when an ack window is used, else it is
+    None.
+    """
+
+    def __init__(self, send, interval=0.0, ack_window=0):
+        self.send = send
+        self.interval = interval
+        self.ack_window = ack_window
+        self.seq = 0
+        self.acked = 0
+        self._items = {}
+        self._min_intervals = {}
+        self._last_sent = {}
+        self._ready = asyncio.Event()
+        self._window = asyncio.Event()
+        self._window.set()
+        self._task = None
+
+    def start(self):
+        outbound_stats.connections += 1
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        outbound_stats.connections -= 1
+        outbound_stats.dropped += sum(len(items) for items in self._items.values())
+        self._items = {}
+
+    def put(self, kind, key, value):
+        items = self._items.setdefault(kind, {})
+        if key in items:
+            outbound_stats.coalesced += 1
+        items[key] = value
+        outbound_stats.updates += 1
+        self._ready.set()
+
+    def discard(self, kind, key):
+        """Remove a pending update that no longer applies (not counted as dropped)."""
+        return self._items.get(kind, {}).pop(key, None) is not None
+
+    def drop(self, kind, key):
+        """Remove a pending update the client will not receive."""
+        if self.discard(kind, key):
+            outbound_stats.dropped += 1
+
+    def set_rate(self, kind, key, max_rate):
+        """Send updates of one key at most ``max_rate`` times per second (None: no limit)."""
+        if max_rate:
+            self._min_intervals[kind, key] = 1 / max_rate
+        else:
+            self._min_intervals.pop((kind, key), None)
+            self._last_sent.pop((kind, key), None)
+
+    def ack(self, seq):
+        """The client processed every frame up to ``seq``."""
+        self.acked = max(self.acked, min(seq, self.seq))
+        if self.seq - self.acked < self.ack_window:
+            self._window.set()
+
+    def _take(self, now):
+        """Pending updates allowed by the per-key rates; the rest stay queued."""
+        batch = {}
+        held = False
+        for kind, items in self._items.items():
+            ready = {}
+            for key, value in items.items():
+                min_interval = self._min_intervals.get((kind, key))
+                if min_interval:
+                    if now - self._last_sent.get((kind, key), -min_interval) < min_interval:
+                        held = True
+                        continue
+                    self._last_sent[kind, key] = now
+                ready[key] = value
+            if ready:
+                batch[kind] = ready
+        if held:
+            self._items = {
+                kind: {key: value for key, value in items.items() if key not in batch.get(kind, ())}
+                for kind, items in self._items.items()
+            }
+        else:
+            self._items = {}
+        return batch, held
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_frame = 0.0
+        while True:
+            await self._ready.wait()
+            if not self._window.is_set():
+                outbound_stats.ack_waits += 1
+                await self._window.wait()
+            delay = next_frame - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            now = loop.time()
+            self._ready.clear()
+            batch, held = self._take(now)
+            if held:
+                # Wake up again for the updates held back by their key's rate
+                loop.call_later(max(self.interval, 0.05), self._ready.set)
+            if not batch:
+                continue
+
+            next_frame = now + self.interval
+            seq = None
+            if self.ack_window:
+                self.seq += 1
+                seq = self.seq
+                if self.seq - self.acked >= self.ack_window:
+                    self._window.clear()
+            outbound_stats.frames += 1
+            outbound_stats.sent += sum(len(items) for items in batch.values())
+            await self.send(batch, seq)
@@ -0,0 +1,19 @@
+"""
+Pagination of the location history endpoints.
+"""
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class LocationCursorPagination(CursorPagination):
+    """Keyset pagination on ``(recorded_at, id)``, newest first.
+
+    Each page filters on the cursor position instead of using ``OFFSET`` and
+    no ``COUNT(*)`` is run, so page N costs the same as page 1. Bulk consumers
+    can raise the page size with ``?page_size=`` up to
+    LOCATION_HISTORY_MAX_PAGE_SIZE.
+    """
+    ordering = ('-recorded_at', '-id')
+    page_size = getattr(settings, 'LOCATION_HISTORY_PAGE_SIZE', 20)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'LOCATION_HISTORY_MAX_PAGE_SIZE', 5000)
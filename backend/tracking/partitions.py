@@ -0,0 +1,202 @@
+"""
+Range partitions of the VehicleLocation history table (PostgreSQL only).
+
+The parent table ``tracking_vehiclelocation`` is partitioned by
+``recorded_at``. Each partition is named after its bounds,
+``tracking_vehiclelocation_p<YYYYMMDD>_<YYYYMMDD>`` (start inclusive, end
+exclusive, UTC), and a default partition catches rows outside every range.
+
+Migration 0004 leaves the rows of the former unpartitioned table in
+``tracking_vehiclelocation_legacy``; ``backfill_legacy_batch`` moves them into
+the partitioned table a batch per transaction.
+"""
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import connection, transaction
+from vehicles.models import Vehicle
+from .models import VehicleLocation
+
+PARENT_TABLE = VehicleLocation._meta.db_table
+DEFAULT_PARTITION = f'{PARENT_TABLE}_default'
+LEGACY_TABLE = f'{PARENT_TABLE}_legacy'
+LOCATION_COLUMNS = 'id, lat, lng, speed, heading, recorded_at, source, vehicle_id'
+PARTITION_NAME_RE = re.compile(rf'^{PARENT_TABLE}_p(\d{{8}})_(\d{{8}})$')
+
+INTERVAL_DAY = 'day'
+INTERVAL_MONTH = 'month'
+
+
+def period_start(moment, interval):
+    """Start (UTC midnight) of the period containing ``moment``."""
+    moment = moment.astimezone(dt_timezone.utc)
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == INTERVAL_MONTH:
+        start = start.replace(day=1)
+    return start
+
+
+def next_period(start, interval):
+    if interval == INTERVAL_MONTH:
+        if start.month == 12:
+            return start.replace(year=start.year + 1, month=1)
+        return start.replace(month=start.month + 1)
+    return start + timedelta(days=1)
+
+
+def previous_period(start, interval):
+    if interval == INTERVAL_MONTH:
+        if start.month == 1:
+            return start.replace(year=start.year - 1, month=12)
+        return start.replace(month=start.month - 1)
+    return start - timedelta(days=1)
+
+
+def partition_name(start, end):
+    return f'{PARENT_TABLE}_p{start:%Y%m%d}_{end:%Y%m%d}'
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+            'WHERE c.relname = %s',
+            [PARENT_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """Return ``(name, start, end)`` for every ranged partition, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid '
+            'JOIN pg_class p ON p.oid = i.inhparent '
+            'WHERE p.relname = %s',
+            [PARENT_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if not match:
+            continue
+        start, end = (
+            datetime.strptime(value, '%Y%m%d').replace(tzinfo=dt_timezone.utc)
+            for value in match.groups()
+        )
+        partitions.append((name, start, end))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partition(start, end):
+    """Create the partition for ``[start, end)``.
+
+    Rows that already landed in the default partition for that range are
+    moved into the new partition, since PostgreSQL refuses to attach a range
+    that the default partition still holds rows for.
+    """
+    name = partition_name(start, end)
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE tracking_partition_moved AS '
+            f'SELECT * FROM {quote(DEFAULT_PARTITION)} WHERE recorded_at >= %s AND recorded_at < %s',
+            [start, end],
+        )
+        cursor.execute(
+            f'DELETE FROM {quote(DEFAULT_PARTITION)} WHERE recorded_at >= %s AND recorded_at < %s',
+            [start, end],
+        )
+        cursor.execute(
+            f'CREATE TABLE {quote(name)} PARTITION OF {quote(PARENT_TABLE)} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [start, end],
+        )
+        cursor.execute(
+            f'INSERT INTO {quote(PARENT_TABLE)} SELECT * FROM tracking_partition_moved'
+        )
+        moved = cursor.rowcount
+        cursor.execute('DROP TABLE tracking_partition_moved')
+        return moved
+
+
+def ensure_partitions(ahead, interval, now):
+    """Create partitions from the current period up to ``ahead`` periods ahead.
+
+    Ranges that overlap an existing partition are skipped, so the interval can
+    be changed without conflicting with partitions made under the old one.
+    """
+    existing = list_partitions()
+    created = []
+    start = period_start(now, interval)
+    for _ in range(ahead + 1):
+        end = next_period(start, interval)
+        overlaps = any(s < end and e > start for _, s, e in existing)
+        if not overlaps:
+            moved = create_partition(start, end)
+            created.append((partition_name(start, end), moved))
+            existing.append((partition_name(start, end), start, end))
+        start = end
+    return created
+
+
+def remove_partitions_before(cutoff, detach=False):
+    """Drop (or detach) every partition whose range ends at or before ``cutoff``."""
+    quote = connection.ops.quote_name
+    removed = []
+    for name, _, end in list_partitions():
+        if end > cutoff:
+            continue
+        with connection.cursor() as cursor:
+            if detach:
+                cursor.execute(f'ALTER TABLE {quote(PARENT_TABLE)} DETACH PARTITION {quote(name)}')
+            else:
+                cursor.execute(f'DROP TABLE {quote(name)}')
+        removed.append(name)
+    return removed
+
+
+def legacy_table_exists():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [LEGACY_TABLE])
+        return cursor.fetchone()[0] is not None
+
+
+def backfill_legacy_batch(batch_size):
+    """Move the ``batch_size`` lowest-id legacy rows into the partitioned table.
+
+    One short transaction per batch, so the copy can run while the server
+    writes new positions and can be interrupted and resumed at any time.
+    Rows of deleted vehicles and rows whose (vehicle, recorded_at) was written
+    again since the migration are discarded. Returns ``(moved, inserted)``.
+    """
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE tracking_legacy_batch ON COMMIT DROP AS '
+            f'SELECT {LOCATION_COLUMNS} FROM {quote(LEGACY_TABLE)} ORDER BY id LIMIT %s',
+            [batch_size],
+        )
+        moved = cursor.rowcount
+        cursor.execute(
+            f'INSERT INTO {quote(PARENT_TABLE)} ({LOCATION_COLUMNS}) '
+            f'SELECT {LOCATION_COLUMNS} FROM tracking_legacy_batch b '
+            f'WHERE EXISTS (SELECT 1 FROM {quote(Vehicle._meta.db_table)} v WHERE v.id = b.vehicle_id) '
+            f'ON CONFLICT DO NOTHING'
+        )
+        inserted = cursor.rowcount
+        cursor.execute(
+            f'DELETE FROM {quote(LEGACY_TABLE)} WHERE id IN (SELECT id FROM tracking_legacy_batch)'
+        )
+    return moved, inserted
+
+
+def drop_legacy_table():
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE {connection.ops.quote_name(LEGACY_TABLE)}')
@@ -0,0 +1,239 @@
+"""
+Renderers of the location export formats.
+
+Each renderer is registered with DRF so `?format=` and the Accept header go
+through normal content negotiation. The export itself is streamed with
+``stream(rows)``; ``render`` only serialises the small error payloads that
+the view returns as ordinary responses.
+"""
+import csv
+import json
+from abc import ABC, abstractmethod
+import math
+import struct
+import sys
+import zlib
+from array import array
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+# Rows of text joined into one chunk of the streamed body
+ROWS_PER_CHUNK = 500
+
+
+class _Echo:
+    """File-like object whose write returns the written value (for csv.writer)."""
+
+    def write(self, value):
+        return value
+
+
+def _chunked(pieces):
+    buffer = []
+    for piece in pieces:
+        buffer.append(piece)
+        if len(buffer) >= ROWS_PER_CHUNK:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+class LocationExportRenderer(ABC, BaseRenderer):
+    """Base class of the streamed export formats.
+
+    Rows are ``(vehicle_id, lat, lng, speed, heading, recorded_at, source)``
+    tuples, ordered by vehicle and time. Subclasses implement ``pieces``.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data).encode(self.charset)
+
+    def stream(self, rows):
+        return _chunked(self.pieces(rows))
+
+    @abstractmethod
+    def pieces(self, rows):
+        """Yield the text pieces of the export of ``rows``."""
+
+
+class NDJSONRenderer(LocationExportRenderer):
+    """One JSON object per line."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def pieces(self, rows):
+        for vehicle_id, lat, lng, speed, heading, recorded_at, source in rows:
+            yield json.dumps({
+                'vehicle': vehicle_id,
+                'lat': float(lat),
+                'lng': float(lng),
+                'speed': speed,
+                'heading': heading,
+                'recorded_at': _iso(recorded_at),
+                'source': source,
+            }) + '\n'
+
+
+class CSVRenderer(LocationExportRenderer):
+    """Comma separated values with a header row."""
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('vehicle', 'lat', 'lng', 'speed', 'heading', 'recorded_at', 'source')
+
+    def pieces(self, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(self.header)
+        for vehicle_id, lat, lng, speed, heading, recorded_at, source in rows:
+            yield writer.writerow((vehicle_id, lat, lng, speed, heading, _iso(recorded_at), source))
+
+
+class GeoJSONRenderer(LocationExportRenderer):
+    """FeatureCollection with one LineString track per vehicle.
+
+    A vehicle with a single point is exported as a Point feature. The first
+    and last timestamps of each track are written as its `start` and `end`
+    members, after the coordinates, since they are only known at the end.
+    """
+    media_type = 'application/geo+json'
+    format = 'geojson'
+
+    def _feature_start(self, vehicle_id, geometry_type):
+        return (
+            '{"type": "Feature", "properties": {"vehicle": %s}, '
+            '"geometry": {"type": "%s", "coordinates": ' % (json.dumps(vehicle_id), geometry_type)
+        )
+
+    def _feature_end(self, first, last):
+        return '}, "start": %s, "end": %s}' % (json.dumps(_iso(first)), json.dumps(_iso(last)))
+
+    def pieces(self, rows):
+        yield '{"type": "FeatureCollection", "features": ['
+        features = 0
+        vehicle_id = None
+        # (lng, lat, recorded_at) of the vehicle's first point; the geometry
+        # type is only known once a second point of the same vehicle arrives
+        first = None
+        last_recorded_at = None
+
+        def separator():
+            nonlocal features
+            features += 1
+            return ', ' if features > 1 else ''
+
+        def close():
+            if first is None:
+                return ''
+            if last_recorded_at is None:
+                return (
+                    separator()
+                    + self._feature_start(vehicle_id, 'Point')
+                    + json.dumps([first[0], first[1]])
+                    + self._feature_end(first[2], first[2])
+                )
+            return ']' + self._feature_end(first[2], last_recorded_at)
+
+        for row_vehicle_id, lat, lng, _, _, recorded_at, _ in rows:
+            position = [float(lng), float(lat)]
+            if row_vehicle_id != vehicle_id:
+                yield close()
+                vehicle_id = row_vehicle_id
+                first = (position[0], position[1], recorded_at)
+                last_recorded_at = None
+                continue
+
+            if last_recorded_at is None:
+                yield (
+                    separator()
+                    + self._feature_start(vehicle_id, 'LineString')
+                    + '[' + json.dumps([first[0], first[1]])
+                )
+            yield ', ' + json.dumps(position)
+            last_recorded_at = recorded_at
+        yield close()
+        yield ']}'
+
+
+class CompactJSONRenderer(JSONRenderer):
+    """Plain JSON selected with `?format=compact` for the columnar history path."""
+    format = 'compact'
+
+
+class PackedTrackRenderer(BaseRenderer):
+    """Columnar binary track for map playback, selected with `?format=packed`.
+
+    Layout (little-endian)::
+
+        header   magic b'VTRK', version u8, flags u8, reserved u16,
+                 count u32, base_time i64 (epoch seconds of the first point)
+        columns  vehicle  i32[count]  vehicle ids
+                 time     i32[count]  seconds since the previous point (first is 0)
+                 lat      i32[count]  delta of degrees x 1e6 (first is absolute)
+                 lng      i32[count]  delta of degrees x 1e6 (first is absolute)
+                 speed    f32[count]  NaN when unknown
+                 heading  f32[count]  NaN when unknown
+
+    With FLAG_ZLIB the column block is zlib-compressed; FLAG_TRUNCATED marks
+    a track cut at the point limit. Rows are ``(vehicle_id, lat, lng, speed,
+    heading, recorded_at)`` in ascending time.
+    """
+    media_type = 'application/vnd.tracking.packed-track'
+    format = 'packed'
+    charset = None
+    render_style = 'binary'
+
+    MAGIC = b'VTRK'
+    VERSION = 1
+    FLAG_ZLIB = 1
+    FLAG_TRUNCATED = 2
+    HEADER = struct.Struct('<4sBBHIq')
+    COORDINATE_SCALE = 1000000
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data).encode('utf-8')
+
+    def pack(self, rows, compress=True):
+        vehicles, times, lats, lngs = array('i'), array('i'), array('i'), array('i')
+        speeds, headings = array('f'), array('f')
+        base_time = previous_time = previous_lat = previous_lng = 0
+        scale = self.COORDINATE_SCALE
+
+        for index, (vehicle_id, lat, lng, speed, heading, recorded_at) in enumerate(rows):
+            timestamp = round(recorded_at.timestamp())
+            lat = round(lat * scale)
+            lng = round(lng * scale)
+            if index == 0:
+                base_time = previous_time = timestamp
+            vehicles.append(vehicle_id)
+            times.append(timestamp - previous_time)
+            lats.append(lat - previous_lat)
+            lngs.append(lng - previous_lng)
+            speeds.append(math.nan if speed is None else speed)
+            headings.append(math.nan if heading is None else heading)
+            previous_time, previous_lat, previous_lng = timestamp, lat, lng
+
+        columns = (vehicles, times, lats, lngs, speeds, headings)
+        if sys.byteorder != 'little':
+            for column in columns:
+                column.byteswap()
+        body = b''.join(column.tobytes() for column in columns)
+
+        flags = 0
+        if compress:
+            body = zlib.compress(body)
+            flags |= self.FLAG_ZLIB
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, flags, 0, len(vehicles), base_time)
+        return header + body
+
+    def mark_truncated(self, payload):
+        """Set FLAG_TRUNCATED on an already packed track."""
+        flags = payload[5] | self.FLAG_TRUNCATED
+        return payload[:5] + bytes([flags]) + payload[6:]
@@ -0,0 +1,239 @@
+"""
+Downsampling of the location history into per-minute and per-hour rollups.
+
+Raw points are streamed in ``(vehicle, recorded_at)`` order, which the unique
+constraint index serves directly, and folded into one MINUTE rollup per
+vehicle and minute. HOUR rollups are then derived from the MINUTE rows, so raw
+points are read only once. Rollups are upserted, so re-running a window (for
+late points) simply replaces its buckets.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Max, Min
+from . import partitions
+from .geo import haversine_km
+from .models import VehicleLocation, VehicleLocationRollup
+
+Resolution = VehicleLocationRollup.Resolution
+
+ROLLUP_UPDATE_FIELDS = [
+    'lat', 'lng', 'heading', 'recorded_at',
+    'avg_speed', 'max_speed', 'distance_km', 'point_count',
+]
+# Window processed per step; each one is committed on its own
+ROLLUP_WINDOW = timedelta(days=1)
+
+
+def bucket_start(moment, resolution):
+    """Start of the MINUTE or HOUR bucket containing ``moment``."""
+    moment = moment.replace(second=0, microsecond=0)
+    if resolution == Resolution.HOUR:
+        moment = moment.replace(minute=0)
+    return moment
+
+
+class _Bucket:
+    """Running aggregate of one vehicle over one bucket."""
+
+    __slots__ = (
+        'vehicle_id', 'bucket', 'lat', 'lng', 'heading', 'recorded_at',
+        'speed_sum', 'speed_count', 'max_speed', 'distance_km', 'point_count',
+    )
+
+    def __init__(self, vehicle_id, bucket):
+        self.vehicle_id = vehicle_id
+        self.bucket = bucket
+        self.speed_sum = 0.0
+        self.speed_count = 0
+        self.max_speed = None
+        self.distance_km = 0.0
+        self.point_count = 0
+
+    def add_speed(self, speed, weight=1):
+        if speed is None:
+            return
+        self.speed_sum += speed * weight
+        self.speed_count += weight
+
+    def add_max_speed(self, speed):
+        if speed is not None and (self.max_speed is None or speed > self.max_speed):
+            self.max_speed = speed
+
+    def to_rollup(self, resolution):
+        return VehicleLocationRollup(
+            vehicle_id=self.vehicle_id,
+            resolution=resolution,
+            bucket=self.bucket,
+            lat=self.lat,
+            lng=self.lng,
+            heading=self.heading,
+            recorded_at=self.recorded_at,
+            avg_speed=self.speed_sum / self.speed_count if self.speed_count else None,
+            max_speed=self.max_speed,
+            distance_km=round(self.distance_km, 6),
+            point_count=self.point_count,
+        )
+
+
+def _save(rollups):
+    if rollups:
+        VehicleLocationRollup.objects.bulk_create(
+            rollups,
+            update_conflicts=True,
+            unique_fields=['vehicle', 'resolution', 'bucket'],
+            update_fields=ROLLUP_UPDATE_FIELDS,
+        )
+    return len(rollups)
+
+
+def _previous_positions(since):
+    """Last rolled-up position per vehicle in the hour before ``since``.
+
+    Seeds the distance of the first point of each vehicle in a window, so the
+    segment that crosses the window boundary is not lost.
+    """
+    positions = {}
+    rows = VehicleLocationRollup.objects.filter(
+        resolution=Resolution.MINUTE,
+        bucket__gte=since - timedelta(hours=1),
+        bucket__lt=since,
+    ).order_by('vehicle_id', 'bucket').values_list('vehicle_id', 'lat', 'lng')
+    for vehicle_id, lat, lng in rows:
+        positions[vehicle_id] = (lat, lng)
+    return positions
+
+
+def rollup_minutes(since, until, batch_size=1000):
+    """Build the MINUTE rollups of raw points in ``[since, until)``."""
+    previous = _previous_positions(since)
+    rows = VehicleLocation.objects.filter(
+        recorded_at__gte=since, recorded_at__lt=until
+    ).order_by('vehicle_id', 'recorded_at').values_list(
+        'vehicle_id', 'lat', 'lng', 'speed', 'heading', 'recorded_at'
+    ).iterator(chunk_size=batch_size)
+
+    saved = 0
+    pending = []
+    current = None
+    for vehicle_id, lat, lng, speed, heading, recorded_at in rows:
+        bucket = bucket_start(recorded_at, Resolution.MINUTE)
+        if current is None or current.vehicle_id != vehicle_id or current.bucket != bucket:
+            if current is not None:
+                pending.append(current.to_rollup(Resolution.MINUTE))
+                if len(pending) >= batch_size:
+                    saved += _save(pending)
+                    pending = []
+            current = _Bucket(vehicle_id, bucket)
+
+        last = previous.get(vehicle_id)
+        if last is not None:
+            current.distance_km += haversine_km(last[0], last[1], lat, lng)
+        previous[vehicle_id] = (lat, lng)
+
+        current.lat, current.lng, current.heading, current.recorded_at = lat, lng, heading, recorded_at
+        current.add_speed(speed)
+        current.add_max_speed(speed)
+        current.point_count += 1
+
+    if current is not None:
+        pending.append(current.to_rollup(Resolution.MINUTE))
+    return saved + _save(pending)
+
+
+def rollup_hours(since, until, batch_size=1000):
+    """Build the HOUR rollups covering ``[since, until)`` from MINUTE rollups."""
+    rows = VehicleLocationRollup.objects.filter(
+        resolution=Resolution.MINUTE,
+        bucket__gte=bucket_start(since, Resolution.HOUR),
+        bucket__lt=until,
+    ).order_by('vehicle_id', 'bucket').values_list(
+        'vehicle_id', 'bucket', 'lat', 'lng', 'heading', 'recorded_at',
+        'avg_speed', 'max_speed', 'distance_km', 'point_count',
+    ).iterator(chunk_size=batch_size)
+
+    saved = 0
+    pending = []
+    current = None
+    for (vehicle_id, minute, lat, lng, heading, recorded_at,
+         avg_speed, max_speed, distance_km, point_count) in rows:
+        bucket = bucket_start(minute, Resolution.HOUR)
+        if current is None or current.vehicle_id != vehicle_id or current.bucket != bucket:
+            if current is not None:
+                pending.append(current.to_rollup(Resolution.HOUR))
+                if len(pending) >= batch_size:
+                    saved += _save(pending)
+                    pending = []
+            current = _Bucket(vehicle_id, bucket)
+
+        current.lat, current.lng, current.heading, current.recorded_at = lat, lng, heading, recorded_at
+        # Weighted by point count; minutes without any speed do not count
+        current.add_speed(avg_speed, point_count)
+        current.add_max_speed(max_speed)
+        current.distance_km += distance_km
+        current.point_count += point_count
+
+    if current is not None:
+        pending.append(current.to_rollup(Resolution.HOUR))
+    return saved + _save(pending)
+
+
+def rolled_up_until():
+    """Start of the newest MINUTE bucket; raw points before it are rolled up."""
+    return VehicleLocationRollup.objects.filter(
+        resolution=Resolution.MINUTE
+    ).aggregate(until=Max('bucket'))['until']
+
+
+def rollup_pending(now, since=None, batch_size=1000):
+    """Roll up every complete minute from ``since`` (default: the watermark) to ``now``.
+
+    Yields ``(window_start, window_end, minutes, hours)`` per processed window.
+    The newest MINUTE bucket is recomputed on every run, so points that arrive
+    shortly after a run are still picked up.
+    """
+    if since is None:
+        since = rolled_up_until()
+    if since is None:
+        since = VehicleLocation.objects.aggregate(first=Min('recorded_at'))['first']
+    if since is None:
+        return
+
+    start = bucket_start(since, Resolution.MINUTE)
+    until = bucket_start(now, Resolution.MINUTE)
+    while start < until:
+        end = min(start + ROLLUP_WINDOW, until)
+        minutes = rollup_minutes(start, end, batch_size)
+        hours = rollup_hours(start, end, batch_size)
+        yield start, end, minutes, hours
+        start = end
+
+
+def prune_raw_locations(cutoff):
+    """Delete raw points recorded before ``cutoff``.
+
+    Whole partitions below the cutoff are dropped, which is far cheaper than
+    deleting their rows; the remainder is removed with a range DELETE.
+    Returns ``(dropped_partitions, deleted_rows)``.
+    """
+    dropped = []
+    if partitions.is_partitioned():
+        dropped = partitions.remove_partitions_before(cutoff)
+    deleted, _ = VehicleLocation.objects.filter(recorded_at__lt=cutoff).delete()
+    return dropped, deleted
+
+
+def prune_rollups(resolution, cutoff):
+    deleted, _ = VehicleLocationRollup.objects.filter(
+        resolution=resolution, bucket__lt=cutoff
+    ).delete()
+    return deleted
+
+
+def raw_retention():
+    days = getattr(settings, 'LOCATION_RAW_RETENTION_DAYS', None)
+    return timedelta(days=days) if days else None
+
+
+def minute_rollup_retention():
+    days = getattr(settings, 'LOCATION_MINUTE_ROLLUP_RETENTION_DAYS', None)
+    return timedelta(days=days) if days else None
@@ -0,0 +1,62 @@
+"""
+Compiled simulation routes.
+
+A route from ``Vehicle.get_simulation_route()`` is a closed loop of
+``[lat, lng]`` points. ``compile_route`` precomputes the cumulative
+haversine distance and the bearing of every segment once per route version
+(the compiled routes are cached by their points, so vehicles on the same
+route share one), and ``CompiledRoute.position_at`` samples a position at
+any distance along the loop with a binary search. Simulated vehicles then
+move at a constant speed whatever the length of the segments.
+"""
+from bisect import bisect_right
+from functools import lru_cache
+from .geo import bearing_degrees, haversine_km
+
+
+class CompiledRoute:
+    """Closed route with cumulative distances (km) and segment bearings."""
+
+    def __init__(self, points):
+        self.points = [(float(lat), float(lng)) for lat, lng in points]
+        self.starts = []
+        self.bearings = []
+        total = 0.0
+        count = len(self.points)
+        for index in range(count):
+            lat1, lng1 = self.points[index]
+            lat2, lng2 = self.points[(index + 1) % count]
+            self.starts.append(total)
+            self.bearings.append(bearing_degrees(lat1, lng1, lat2, lng2))
+            total += haversine_km(lat1, lng1, lat2, lng2)
+        self.total_km = total
+
+    def position_at(self, distance_km):
+        """``(lat, lng, heading)`` at ``distance_km`` along the loop."""
+        if self.total_km <= 0:
+            lat, lng = self.points[0]
+            return lat, lng, 0.0
+        distance_km %= self.total_km
+        index = bisect_right(self.starts, distance_km) - 1
+        start = self.starts[index]
+        end = self.starts[index + 1] if index + 1 < len(self.starts) else self.total_km
+        fraction = (distance_km - start) / (end - start) if end > start else 0.0
+        lat1, lng1 = self.points[index]
+        lat2, lng2 = self.points[(index + 1) % len(self.points)]
+        return (
+            lat1 + (lat2 - lat1) * fraction,
+            lng1 + (lng2 - lng1) * fraction,
+            self.bearings[index],
+        )
+
+
+@lru_cache(maxsize=1024)
+def _compile(points):
+    return CompiledRoute(points)
+
+
+def compile_route(route):
+    """Cached ``CompiledRoute`` of a route; None when it has fewer than two points."""
+    if not route or len(route) < 2:
+        return None
+    return _compile(tuple((float(lat), float(lng)) for lat, lng in route))
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import VehicleLocation
+from .models import VehicleCurrentLocation, VehicleLocation, VehicleLocationRollup
 from vehicles.serializers import VehicleSerializer
 
 
@@ -11,3 +11,74 @@ class VehicleLocationSerializer(serializers.ModelSerializer):
         model = VehicleLocation
         fields = ('id', 'vehicle', 'vehicle_info', 'lat', 'lng', 'speed', 'heading', 'recorded_at', 'source')
         read_only_fields = ('id',)
+
+
+class VehicleCurrentLocationSerializer(serializers.ModelSerializer):
+    """Latest known position of a vehicle."""
+    vehicle_info = VehicleSerializer(source='vehicle', read_only=True)
+
+    class Meta:
+        model = VehicleCurrentLocation
+        fields = ('vehicle', 'vehicle_info', 'lat', 'lng', 'speed', 'heading', 'recorded_at', 'source')
+        read_only_fields = fields
+
+
+class VehicleLocationRollupSerializer(serializers.ModelSerializer):
+    """Minute or hour summary of a vehicle's locations."""
+    vehicle_info = VehicleSerializer(source='vehicle', read_only=True)
+    speed = serializers.FloatField(source='avg_speed', read_only=True)
+
+    class Meta:
+        model = VehicleLocationRollup
+        fields = (
+            'id', 'vehicle', 'vehicle_info', 'resolution', 'bucket', 'lat', 'lng',
+            'speed', 'max_speed', 'heading', 'distance_km', 'point_count', 'recorded_at'
+        )
+        read_only_fields = fields
+
+
+class CompactLocationSerializer:
+    """Flat, columnar serialization of location rows read with ``values()``.
+
+    Skips DRF field introspection and the nested vehicle: each output column
+    is one list, so a page of N rows is a handful of arrays instead of N
+    objects. ``fields`` maps output names to model fields.
+    """
+    fields = (
+        ('id', 'id'), ('vehicle', 'vehicle_id'), ('lat', 'lat'), ('lng', 'lng'),
+        ('speed', 'speed'), ('heading', 'heading'), ('recorded_at', 'recorded_at'),
+        ('source', 'source'),
+    )
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @classmethod
+    def value_fields(cls):
+        return [field for _, field in cls.fields]
+
+    @staticmethod
+    def _convert(value):
+        if value is None or isinstance(value, (int, float, str)):
+            return value
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return float(value)
+
+    @property
+    def data(self):
+        convert = self._convert
+        return {
+            name: [convert(row[field]) for row in self.rows]
+            for name, field in self.fields
+        }
+
+
+class CompactRollupSerializer(CompactLocationSerializer):
+    """Columnar serialization of rollup rows."""
+    fields = (
+        ('id', 'id'), ('vehicle', 'vehicle_id'), ('resolution', 'resolution'),
+        ('bucket', 'bucket'), ('lat', 'lat'), ('lng', 'lng'), ('speed', 'avg_speed'),
+        ('max_speed', 'max_speed'), ('heading', 'heading'), ('distance_km', 'distance_km'),
+        ('point_count', 'point_count'), ('recorded_at', 'recorded_at'),
+    )
@@ -0,0 +1,75 @@
+"""
+Push access changes to the live tracking consumers.
+
+Saving or deleting a Plan or a VehicleUserPermission (or scheduling a batch
+of plans) sends an ``access.changed`` message to ACCESS_GROUP once the transaction commits.
+Consumers of non-admin users are members of that group and re-check the
+affected vehicles right away. Fleet consumers ignore changes to vehicles
+they neither stream nor may see, so they only query the database when their
+access may have changed or when the current plan window ends.
+
+Saving a Vehicle whose ``is_streaming`` flag changed publishes it as a
+streaming control event for the simulation engine (see tracking.simulation).
+"""
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from planning.models import Plan, VehicleUserPermission
+from planning.scheduling import plans_scheduled
+from vehicles.models import Vehicle
+from .simulation import publish_streaming
+
+logger = logging.getLogger(__name__)
+
+ACCESS_GROUP = 'tracking_access'
+
+
+def notify_access_changed(vehicle_ids, user_id=None):
+    """Tell the consumers that access to some vehicles changed (for one user, or all with None)."""
+    def send():
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(ACCESS_GROUP, {
+                'type': 'access.changed',
+                'vehicle_ids': sorted(vehicle_ids),
+                'user_id': user_id,
+            })
+        except Exception:
+            logger.exception('Failed to notify access change of vehicles %s', vehicle_ids)
+
+    transaction.on_commit(send)
+
+
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+def plan_changed(sender, instance, **kwargs):
+    notify_access_changed([instance.vehicle_id])
+
+
+@receiver(plans_scheduled)
+def plans_bulk_scheduled(sender, plans, **kwargs):
+    # One message for the whole batch
+    notify_access_changed({plan.vehicle_id for plan in plans})
+
+
+@receiver(post_save, sender=VehicleUserPermission)
+@receiver(post_delete, sender=VehicleUserPermission)
+def permission_changed(sender, instance, **kwargs):
+    notify_access_changed([instance.vehicle_id], instance.user_id)
+
+
+@receiver(post_save, sender=Vehicle)
+def vehicle_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'is_streaming' not in update_fields:
+        return
+    # Unknown for instances that were not loaded from the database: publish then
+    stored = getattr(instance, '_stored_is_streaming', None)
+    instance._stored_is_streaming = instance.is_streaming
+    if created or stored == instance.is_streaming:
+        return
+    publish_streaming([instance.pk], instance.is_streaming)
@@ -0,0 +1,262 @@
+"""
+Shared simulation engine for live tracking.
+
+Every worker process owns a single engine. Consumers acquire a vehicle when a
+viewer subscribes and release it on disconnect. The engine advances each
+acquired vehicle once per tick, queues one VehicleLocation row per vehicle on
+the shared writer and fans the position out to the vehicle's channel layer
+group, so the work scales with the number of watched vehicles rather than with
+the number of viewers.
+
+Whether a vehicle streams is read from the database when the engine starts
+watching it; afterwards changes arrive as STREAMING_EVENT on the event bus
+(published by the streaming endpoints and by Vehicle saves), so paused
+vehicles cost nothing per tick and pause/resume reach viewers at once. The
+flags of all watched vehicles are also re-read every
+SIMULATION_STREAMING_RESYNC_SECONDS, which repairs events lost while the bus
+listener was (re)joining or the channel layer was unreachable.
+"""
+import asyncio
+import logging
+import random
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from core import events
+from vehicles.models import Vehicle
+from .models import VehicleLocation
+from .routes import compile_route
+from .spatial import broadcast_positions
+from .writer import writer
+
+logger = logging.getLogger(__name__)
+
+# {"vehicle_ids": [...], "streaming": bool}
+STREAMING_EVENT = 'tracking.streaming'
+
+
+def vehicle_group_name(vehicle_id):
+    """Channel layer group that receives live updates for one vehicle."""
+    return f'tracking_vehicle_{vehicle_id}'
+
+
+class VehicleSimulation:
+    """Position of one simulated vehicle along its compiled route."""
+
+    def __init__(self, vehicle_id, route):
+        self.vehicle_id = vehicle_id
+        self.route = route
+        self.distance_km = 0.0
+        # سرعة ثابتة لكل سيارة حول السرعة المحددة في الإعدادات
+        self.speed_kmh = getattr(settings, 'SIMULATION_SPEED_KMH', 45.0) * random.uniform(0.85, 1.15)
+        self.subscribers = 0
+        self.streaming = None
+
+    def advance(self, elapsed_seconds, recorded_at):
+        """Move ``elapsed_seconds`` at the vehicle's speed and return the new position."""
+        self.distance_km += self.speed_kmh * elapsed_seconds / 3600
+        lat, lng, heading = self.route.position_at(self.distance_km)
+        return {
+            'type': 'location',
+            'vehicle_id': self.vehicle_id,
+            'lat': round(lat, 6),
+            'lng': round(lng, 6),
+            'speed': round(self.speed_kmh, 2),
+            'heading': round(heading, 1) % 360,
+            'source': VehicleLocation.Source.SIMULATED,
+            'recorded_at': recorded_at,
+        }
+
+
+class SimulationEngine:
+    """Advance all watched vehicles from one background task."""
+
+    def __init__(self, tick_seconds=None):
+        self.tick_seconds = tick_seconds
+        self.simulations = {}
+        # vehicle id -> is_streaming of the watched vehicles
+        self.streaming = {}
+        # Vehicles changed by an event while a resync query was running
+        self._changed_during_sync = set()
+        self._task = None
+        self._last_tick = None
+        self._last_sync = None
+
+    def get_tick_seconds(self):
+        if self.tick_seconds is not None:
+            return self.tick_seconds
+        return getattr(settings, 'SIMULATION_TICK_SECONDS', 2)
+
+    def get_resync_seconds(self):
+        return getattr(settings, 'SIMULATION_STREAMING_RESYNC_SECONDS', 30)
+
+    def acquire(self, vehicle_id, route):
+        """Register one more viewer of a vehicle and make sure the engine runs.
+
+        Returns the vehicle's simulation, or None when the route is unusable.
+        """
+        simulation = self.simulations.get(vehicle_id)
+        if simulation is None:
+            compiled = compile_route(route)
+            if compiled is None:
+                return None
+            simulation = VehicleSimulation(vehicle_id, compiled)
+            self.simulations[vehicle_id] = simulation
+        simulation.subscribers += 1
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return simulation
+
+    def release(self, vehicle_id):
+        """Drop one viewer; the vehicle stops advancing when nobody watches it."""
+        simulation = self.simulations.get(vehicle_id)
+        if simulation is None:
+            return
+        simulation.subscribers -= 1
+        if simulation.subscribers <= 0:
+            del self.simulations[vehicle_id]
+            self.streaming.pop(vehicle_id, None)
+
+    def set_streaming(self, vehicle_ids, is_streaming):
+        """Apply a streaming control event; viewers are notified without waiting for a tick.
+
+        May be called from any thread (views publish from a worker thread).
+        """
+        changed = False
+        for vehicle_id in vehicle_ids:
+            if vehicle_id in self.simulations:
+                self.streaming[vehicle_id] = is_streaming
+                self._changed_during_sync.add(vehicle_id)
+                changed = True
+        if changed and self._task is not None and not self._task.done():
+            loop = self._task.get_loop()
+            loop.call_soon_threadsafe(loop.create_task, self.announce())
+
+    async def announce(self):
+        """Send the pause/resume status of simulations whose streaming flag changed."""
+        channel_layer = get_channel_layer()
+        for simulation in list(self.simulations.values()):
+            if simulation.vehicle_id in self.streaming:
+                await self._update_status(
+                    channel_layer, simulation, self.streaming[simulation.vehicle_id]
+                )
+
+    async def _update_status(self, channel_layer, simulation, is_streaming):
+        if is_streaming == simulation.streaming:
+            return
+        # لا يُرسل "استئناف" لمحاكاة جديدة لم يسبق إيقافها
+        if not is_streaming or simulation.streaming is False:
+            await channel_layer.group_send(
+                vehicle_group_name(simulation.vehicle_id),
+                {
+                    'type': 'tracking.status',
+                    'vehicle_id': simulation.vehicle_id,
+                    'message': 'Simulation Resumed' if is_streaming else 'Simulation Paused',
+                    'streaming': is_streaming,
+                },
+            )
+        simulation.streaming = is_streaming
+
+    async def _run(self):
+        self._last_tick = None
+        self._last_sync = None
+        while self.simulations:
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception('Simulation tick failed')
+            await asyncio.sleep(self.get_tick_seconds())
+
+    async def tick(self):
+        """Advance every watched vehicle once, persist and broadcast."""
+        simulations = list(self.simulations.values())
+        if not simulations:
+            return
+
+        # Vehicles watched for the first time are read from the database, and
+        # all of them once per resync period
+        now = asyncio.get_running_loop().time()
+        if self._last_sync is None or now - self._last_sync >= self.get_resync_seconds():
+            self._last_sync = now
+            await self.resync_streaming([sim.vehicle_id for sim in simulations])
+        else:
+            unknown = [sim.vehicle_id for sim in simulations if sim.vehicle_id not in self.streaming]
+            if unknown:
+                fetched = await self._fetch_streaming(unknown)
+                for vehicle_id in unknown:
+                    self.streaming.setdefault(vehicle_id, fetched.get(vehicle_id, False))
+        channel_layer = get_channel_layer()
+
+        # Vehicles move by the time actually elapsed since the previous tick
+        elapsed = self.get_tick_seconds() if self._last_tick is None else now - self._last_tick
+        self._last_tick = now
+
+        streaming = []
+        for simulation in simulations:
+            is_streaming = self.streaming.get(simulation.vehicle_id, False)
+            await self._update_status(channel_layer, simulation, is_streaming)
+            if is_streaming:
+                streaming.append(simulation)
+
+        # One pass over all vehicles: O(log n) per vehicle on the shared compiled routes
+        recorded_at = timezone.now().isoformat()
+        locations = [simulation.advance(elapsed, recorded_at) for simulation in streaming]
+        for location in locations:
+            await channel_layer.group_send(
+                vehicle_group_name(location['vehicle_id']),
+                {'type': 'location.update', 'location': location},
+            )
+        await broadcast_positions(channel_layer, locations)
+
+        await writer.submit_many([
+            VehicleLocation(
+                vehicle_id=location['vehicle_id'],
+                lat=location['lat'],
+                lng=location['lng'],
+                speed=location['speed'],
+                heading=location['heading'],
+                recorded_at=parse_datetime(location['recorded_at']),
+                source=VehicleLocation.Source.SIMULATED,
+            )
+            for location in locations
+        ])
+
+    async def resync_streaming(self, vehicle_ids):
+        """Replace the streaming flags of ``vehicle_ids`` with the stored ones.
+
+        A flag changed by an event while the query ran is newer than what the
+        query may have read, so it is kept.
+        """
+        self._changed_during_sync.clear()
+        fetched = await self._fetch_streaming(vehicle_ids)
+        for vehicle_id in vehicle_ids:
+            if vehicle_id in self.simulations and vehicle_id not in self._changed_during_sync:
+                self.streaming[vehicle_id] = fetched.get(vehicle_id, False)
+
+    @database_sync_to_async
+    def _fetch_streaming(self, vehicle_ids):
+        return dict(
+            Vehicle.objects.filter(id__in=vehicle_ids).values_list('id', 'is_streaming')
+        )
+
+
+engine = SimulationEngine()
+
+
+def _apply_streaming(payload):
+    engine.set_streaming(payload.get('vehicle_ids', ()), bool(payload.get('streaming')))
+
+
+events.subscribe(STREAMING_EVENT, _apply_streaming)
+
+
+def publish_streaming(vehicle_ids, is_streaming):
+    """Tell every worker that vehicles started or stopped streaming (after the commit)."""
+    vehicle_ids = list(vehicle_ids)
+    transaction.on_commit(lambda: events.publish(
+        STREAMING_EVENT, {'vehicle_ids': vehicle_ids, 'streaming': is_streaming}
+    ))
@@ -0,0 +1,148 @@
+"""
+Grid spatial index of current vehicle positions and per-cell broadcast.
+
+The map is cut into square cells of SPATIAL_CELL_DEGREES. Every live position
+is sent to the channel layer group of its cell (and of the cell it just left),
+so viewport subscribers only join the groups of the cells their bounding box
+covers and only receive vehicles in, entering or leaving their view. Each
+worker keeps a ``GridIndex`` of the latest positions, updated from the same
+``tracking.positions`` bus event as the position cache, to answer viewport
+snapshots without a database query.
+"""
+import math
+import threading
+from collections import defaultdict
+from django.conf import settings
+from core import events
+from .cache import POSITIONS_EVENT
+from .geo import in_bbox
+
+# Group that receives every live position, batched per tick. Used by
+# viewports too large to be covered cell by cell.
+FLEET_GROUP = 'tracking_fleet'
+
+
+def cell_group_name(cell):
+    """Channel layer group of one grid cell."""
+    return f'tracking_cell_{cell[0]}_{cell[1]}'
+
+
+class GridIndex:
+    """Vehicle id -> (lat, lng) with a cell -> vehicle ids bucket map."""
+
+    def __init__(self, cell_degrees=None):
+        self.cell_degrees = cell_degrees or getattr(settings, 'SPATIAL_CELL_DEGREES', 0.05)
+        self.loaded = False
+        self._positions = {}
+        self._cells = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def cell_of(self, lat, lng):
+        return (
+            math.floor(float(lat) / self.cell_degrees),
+            math.floor(float(lng) / self.cell_degrees),
+        )
+
+    def cells_in_bbox(self, bbox, limit=None):
+        """Cells covering ``bbox``; None when there are more than ``limit``."""
+        south, west, north, east = bbox
+        spans = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+        rows = range(self.cell_of(south, 0)[0], self.cell_of(north, 0)[0] + 1)
+        columns = []
+        for span_west, span_east in spans:
+            columns.extend(range(self.cell_of(0, span_west)[1], self.cell_of(0, span_east)[1] + 1))
+        if limit is not None and len(rows) * len(columns) > limit:
+            return None
+        return [(row, column) for row in rows for column in columns]
+
+    def _move(self, vehicle_id, lat, lng):
+        cell = self.cell_of(lat, lng)
+        previous = self._positions.get(vehicle_id)
+        old_cell = previous[2] if previous else None
+        if old_cell is not None and old_cell != cell:
+            self._cells[old_cell].discard(vehicle_id)
+            if not self._cells[old_cell]:
+                del self._cells[old_cell]
+        self._positions[vehicle_id] = (float(lat), float(lng), cell)
+        self._cells[cell].add(vehicle_id)
+        return old_cell, cell
+
+    def update(self, vehicle_id, lat, lng):
+        """Store a position; return ``(old_cell, new_cell)``."""
+        with self._lock:
+            return self._move(vehicle_id, lat, lng)
+
+    def update_many(self, messages):
+        with self._lock:
+            for message in messages:
+                self._move(message['vehicle_id'], message['lat'], message['lng'])
+
+    def load(self, positions):
+        """Seed positions of vehicles not seen yet (from the current-location table)."""
+        with self._lock:
+            for vehicle_id, lat, lng in positions:
+                if vehicle_id not in self._positions:
+                    self._move(vehicle_id, lat, lng)
+            self.loaded = True
+
+    def vehicles_in_bbox(self, bbox):
+        """Vehicle id -> (lat, lng) of the vehicles inside ``bbox``."""
+        found = {}
+        with self._lock:
+            # Walk the occupied cells when the box covers more cells than are occupied
+            cells = self.cells_in_bbox(bbox, limit=max(len(self._cells), 1))
+            if cells is None:
+                candidates = self._positions.keys()
+            else:
+                candidates = [
+                    vehicle_id for cell in cells for vehicle_id in self._cells.get(cell, ())
+                ]
+            for vehicle_id in candidates:
+                lat, lng, _ = self._positions[vehicle_id]
+                if in_bbox(bbox, lat, lng):
+                    found[vehicle_id] = (lat, lng)
+        return found
+
+    def get_stats(self):
+        with self._lock:
+            return {'vehicles': len(self._positions), 'cells': len(self._cells), 'loaded': self.loaded}
+
+
+grid_index = GridIndex()
+
+
+def _apply_positions(payload):
+    grid_index.update_many(payload.get('positions', ()))
+
+
+events.subscribe(POSITIONS_EVENT, _apply_positions)
+
+
+def ensure_index_loaded():
+    """Fill the index from the current-location table on first use."""
+    if grid_index.loaded:
+        return
+    from .models import VehicleCurrentLocation
+    grid_index.load(list(VehicleCurrentLocation.objects.values_list('vehicle_id', 'lat', 'lng')))
+
+
+async def broadcast_positions(channel_layer, messages):
+    """Send live location messages to their cell groups and to the fleet group.
+
+    A vehicle that changed cell is also sent to the cell it left, so viewport
+    subscribers of that cell see it leave.
+    """
+    if not messages:
+        return
+    by_cell = defaultdict(list)
+    for message in messages:
+        old_cell, cell = grid_index.update(message['vehicle_id'], message['lat'], message['lng'])
+        by_cell[cell].append(message)
+        if old_cell is not None and old_cell != cell:
+            by_cell[old_cell].append(message)
+
+    for cell, cell_messages in by_cell.items():
+        await channel_layer.group_send(
+            cell_group_name(cell), {'type': 'cell.positions', 'positions': cell_messages}
+        )
+    await channel_layer.group_send(FLEET_GROUP, {'type': 'fleet.positions', 'positions': messages})
@@ -0,0 +1,139 @@
+import asyncio
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.test import SimpleTestCase, TransactionTestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from accounts.models import User
+from core.asgi import application
+from planning.models import VehicleUserPermission
+from vehicles.models import Vehicle
+from .models import VehicleLocation
+from .outbound import OutboundBuffer
+
+
+class LocationIngestPermissionTests(TransactionTestCase):
+    """Only admins may report REAL positions; a permission on a vehicle only allows watching it."""
+
+    def setUp(self):
+        self.vehicle = Vehicle.objects.create(plate='ING-1', brand='Ford', model='Transit', year=2020)
+        self.user = User.objects.create_user(
+            email='viewer@example.com', username='viewer', password='secret', role=User.Role.USER,
+        )
+        VehicleUserPermission.objects.create(user=self.user, vehicle=self.vehicle)
+        self.admin = User.objects.create_user(
+            email='admin@example.com', username='admin', password='secret', role=User.Role.ADMIN,
+        )
+        self.points = [{'vehicle': self.vehicle.id, 'lat': 41.0, 'lng': 29.0, 'recorded_at': 1700000000}]
+
+    def post_points(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post('/api/tracking/ingest/', {'points': self.points}, format='json')
+
+    def connect(self, user):
+        async def run():
+            communicator = WebsocketCommunicator(
+                application, f'/ws/tracking/ingest/?token={AccessToken.for_user(user)}'
+            )
+            connected, code = await communicator.connect()
+            await communicator.disconnect()
+            return connected, code
+        return async_to_sync(run)()
+
+    def test_http_ingest_rejects_permitted_user(self):
+        response = self.post_points(self.user)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(VehicleLocation.objects.exists())
+
+    def test_http_ingest_accepts_admin(self):
+        response = self.post_points(self.admin)
+        self.assertEqual(response.status_code, 201)
+
+    def test_ws_ingest_rejects_permitted_user(self):
+        self.assertEqual(self.connect(self.user), (False, 4003))
+
+    def test_ws_ingest_accepts_admin(self):
+        connected, _ = self.connect(self.admin)
+        self.assertTrue(connected)
+
+
+class OutboundBufferTests(SimpleTestCase):
+    """Latest-wins coalescing, per-key rates and the ack window of the outbound buffer."""
+
+    def setUp(self):
+        self.frames = []
+
+    async def send(self, batch, seq):
+        self.frames.append((batch, seq))
+
+    def test_newer_update_replaces_pending_one(self):
+        buffer = OutboundBuffer(self.send)
+        buffer.put('positions', 1, 'old')
+        buffer.put('positions', 1, 'new')
+        buffer.put('positions', 2, 'other')
+        batch, held = buffer._take(0)
+        self.assertEqual(batch, {'positions': {1: 'new', 2: 'other'}})
+        self.assertFalse(held)
+        self.assertEqual(buffer._take(1), ({}, False))
+
+    def test_discarded_update_is_not_sent(self):
+        buffer = OutboundBuffer(self.send)
+        buffer.put('enter', 1, 1)
+        buffer.put('leave', 2, 2)
+        self.assertTrue(buffer.discard('enter', 1))
+        self.assertFalse(buffer.discard('enter', 1))
+        buffer.drop('leave', 2)
+        self.assertEqual(buffer._take(0), ({}, False))
+
+    def test_key_rate_holds_back_updates_until_its_interval_passed(self):
+        buffer = OutboundBuffer(self.send)
+        buffer.set_rate('positions', 1, 2)
+        buffer.put('positions', 1, 'a')
+        self.assertEqual(buffer._take(10.0), ({'positions': {1: 'a'}}, False))
+
+        buffer.put('positions', 1, 'b')
+        buffer.put('positions', 2, 'x')
+        # Key 1 was sent 0.2s ago (limit 0.5s): only the unlimited key goes out
+        self.assertEqual(buffer._take(10.2), ({'positions': {2: 'x'}}, True))
+        buffer.put('positions', 1, 'c')
+        self.assertEqual(buffer._take(10.5), ({'positions': {1: 'c'}}, False))
+
+        buffer.set_rate('positions', 1, None)
+        buffer.put('positions', 1, 'd')
+        self.assertEqual(buffer._take(10.6), ({'positions': {1: 'd'}}, False))
+
+    async def test_updates_within_an_interval_share_one_frame(self):
+        buffer = OutboundBuffer(self.send, interval=0.1)
+        buffer.start()
+        try:
+            buffer.put('positions', 1, 'a')
+            await asyncio.sleep(0.02)
+            for value in ('b', 'c'):
+                buffer.put('positions', 1, value)
+                buffer.put('positions', 2, value)
+            await asyncio.sleep(0.15)
+        finally:
+            await buffer.stop()
+        self.assertEqual(self.frames, [
+            ({'positions': {1: 'a'}}, None),
+            ({'positions': {1: 'c', 2: 'c'}}, None),
+        ])
+
+    async def test_ack_window_holds_frames_until_acknowledged(self):
+        buffer = OutboundBuffer(self.send, ack_window=1)
+        buffer.start()
+        try:
+            buffer.put('positions', 1, 'a')
+            await asyncio.sleep(0.02)
+            buffer.put('positions', 1, 'b')
+            buffer.put('positions', 1, 'c')
+            await asyncio.sleep(0.02)
+            self.assertEqual(self.frames, [({'positions': {1: 'a'}}, 1)])
+
+            buffer.ack(1)
+            await asyncio.sleep(0.02)
+        finally:
+            await buffer.stop()
+        # A client that fell behind only gets the latest update
+        self.assertEqual(self.frames, [({'positions': {1: 'a'}}, 1), ({'positions': {1: 'c'}}, 2)])
@@ -2,9 +2,13 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     VehicleLocationViewSet,
+    ingest_locations_view,
+    export_locations_view,
+    tracking_stats_view,
     set_simulation_route,
     start_streaming,
-    stop_streaming
+    stop_streaming,
+    bulk_streaming_view
 )
 
 router = DefaultRouter()
@@ -12,6 +16,10 @@ router.register(r'locations', VehicleLocationViewSet, basename='vehicle-location
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('ingest/', ingest_locations_view, name='ingest-locations'),
+    path('export/', export_locations_view, name='export-locations'),
+    path('stats/', tracking_stats_view, name='tracking-stats'),
     path('start/<int:vehicle_id>/', start_streaming, name='start-streaming'),
     path('stop/<int:vehicle_id>/', stop_streaming, name='stop-streaming'),
+    path('streaming/', bulk_streaming_view, name='bulk-streaming'),
 ]
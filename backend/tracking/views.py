@@ -1,64 +1,219 @@
+from datetime import timedelta
+from itertools import islice
+from decimal import Decimal
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.decorators import api_view, permission_classes, renderer_classes, action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from django.http import HttpResponse
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from django.db.models import Max
-from .models import VehicleLocation
-from .serializers import VehicleLocationSerializer
+from .models import VehicleCurrentLocation, VehicleLocation, VehicleLocationRollup
+from .serializers import (
+    CompactLocationSerializer,
+    CompactRollupSerializer,
+    VehicleLocationRollupSerializer,
+    VehicleLocationSerializer,
+)
+from .pagination import LocationCursorPagination
+from .renderers import (
+    CompactJSONRenderer,
+    CSVRenderer,
+    GeoJSONRenderer,
+    NDJSONRenderer,
+    PackedTrackRenderer,
+)
+from .export import export_rows, streaming_response
+from . import rollups
+from .ingest import ingest_points
+from .cache import cache_enabled, location_message, position_cache
+from .writer import writer
+from .spatial import grid_index
+from .outbound import outbound_stats
+from .simulation import publish_streaming
+from accounts.access import access_cache, can_access_vehicle, permitted_vehicle_ids
 from accounts.permissions import VehicleAccessPermission, IsAdminRole
+from accounts.principals import user_cache
 from vehicles.models import Vehicle
 
 
-class VehicleLocationViewSet(viewsets.ReadOnlyModelViewSet):
-    """Vehicle location viewset."""
-    queryset = VehicleLocation.objects.all()
-    serializer_class = VehicleLocationSerializer
-    permission_classes = [VehicleAccessPermission]
+RESOLUTION_AUTO = 'auto'
+HISTORY_RESOLUTIONS = {
+    'raw': None,
+    'minute': VehicleLocationRollup.Resolution.MINUTE,
+    'hour': VehicleLocationRollup.Resolution.HOUR,
+    RESOLUTION_AUTO: None,
+}
 
-    def get_queryset(self):
-        """Filter locations based on user vehicle permissions."""
-        user = self.request.user
-        
-        # Admins can see all locations
-        if user.role == 'ADMIN':
-            queryset = VehicleLocation.objects.all()
-        else:
-            # Users can only see locations for vehicles they have permission for
-            from planning.models import VehicleUserPermission
-            permitted_vehicles = VehicleUserPermission.objects.filter(
-                user=user
-            ).values_list('vehicle_id', flat=True)
-            queryset = VehicleLocation.objects.filter(vehicle_id__in=permitted_vehicles)
-        
-        # Apply date range filters
+
+class LocationHistoryMixin:
+    """Shared `from`/`to` and `resolution` handling of the location history endpoints."""
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, CompactJSONRenderer, PackedTrackRenderer]
+
+    def get_time_range(self):
+        """Return the requested (from, to) datetimes; either may be None.
+
+        Without `from`, LOCATION_HISTORY_DEFAULT_DAYS (when set) bounds the
+        range so the query never has to visit every history partition.
+        """
+        from_datetime = to_datetime = None
         from_date = self.request.query_params.get('from', None)
         to_date = self.request.query_params.get('to', None)
         
         if from_date:
             try:
                 from_datetime = parse_datetime(from_date)
-                if from_datetime:
-                    queryset = queryset.filter(recorded_at__gte=from_datetime)
             except (ValueError, TypeError):
                 pass
         
         if to_date:
             try:
                 to_datetime = parse_datetime(to_date)
-                if to_datetime:
-                    queryset = queryset.filter(recorded_at__lte=to_datetime)
             except (ValueError, TypeError):
                 pass
-        
-        return queryset.order_by('-recorded_at')
 
+        default_days = getattr(settings, 'LOCATION_HISTORY_DEFAULT_DAYS', None)
+        if from_datetime is None and default_days:
+            from_datetime = (to_datetime or timezone.now()) - timedelta(days=default_days)
+
+        return from_datetime, to_datetime
+
+    def filter_time_range(self, queryset, field='recorded_at', resolution=None):
+        """Constrain the time column so PostgreSQL prunes to the matching partitions."""
+        from_datetime, to_datetime = self.get_time_range()
+        if from_datetime:
+            if resolution:
+                # Include the bucket that contains `from`
+                from_datetime = rollups.bucket_start(from_datetime, resolution)
+            queryset = queryset.filter(**{f'{field}__gte': from_datetime})
+        if to_datetime:
+            queryset = queryset.filter(**{f'{field}__lte': to_datetime})
+        return queryset
+
+    def get_resolution(self):
+        """Resolve `?resolution=raw|minute|hour|auto` (default auto).
+
+        `auto` picks the coarsest resolution that still fits the requested
+        range: raw points for short ranges, minute rollups up to
+        LOCATION_HISTORY_MINUTE_MAX_DAYS and hour rollups beyond. Ranges that
+        start before the raw retention window never use raw points. Rollups
+        only reach the last `rollup_locations` run, so a range that ends more
+        than LOCATION_ROLLUP_MAX_LAG_MINUTES after it is answered from raw
+        points (which are never pruned before they are rolled up).
+        """
+        if not hasattr(self, '_resolution'):
+            self._resolution = self.resolve_resolution()
+        return self._resolution
+
+    def resolve_resolution(self):
+        value = self.request.query_params.get('resolution', RESOLUTION_AUTO).lower()
+        if value not in HISTORY_RESOLUTIONS:
+            raise ValidationError({
+                'resolution': f'Must be one of: {", ".join(HISTORY_RESOLUTIONS)}'
+            })
+        if value != RESOLUTION_AUTO:
+            return HISTORY_RESOLUTIONS[value]
+
+        from_datetime, to_datetime = self.get_time_range()
+        if from_datetime is None:
+            return None
+
+        now = timezone.now()
+        span = (to_datetime or now) - from_datetime
+        raw_max = timedelta(hours=getattr(settings, 'LOCATION_HISTORY_RAW_MAX_HOURS', 6))
+        minute_max = timedelta(days=getattr(settings, 'LOCATION_HISTORY_MINUTE_MAX_DAYS', 7))
+        raw_retention = rollups.raw_retention()
+        minute_retention = rollups.minute_rollup_retention()
+
+        if span <= raw_max and not (raw_retention and from_datetime < now - raw_retention):
+            return None
+        rolled_up_until = rollups.rolled_up_until()
+        max_lag = timedelta(minutes=getattr(settings, 'LOCATION_ROLLUP_MAX_LAG_MINUTES', 5))
+        if rolled_up_until is None or (to_datetime or now) > rolled_up_until + max_lag:
+            return None
+        if span <= minute_max and not (minute_retention and from_datetime < now - minute_retention):
+            return VehicleLocationRollup.Resolution.MINUTE
+        return VehicleLocationRollup.Resolution.HOUR
+
+    def get_serializer_class(self):
+        if self.get_resolution():
+            return VehicleLocationRollupSerializer
+        return VehicleLocationSerializer
+
+    def history_queryset(self, **filters):
+        """Raw locations or rollups matching `filters` and the requested range."""
+        resolution = self.get_resolution()
+        if resolution is None:
+            queryset = VehicleLocation.objects.filter(**filters)
+            queryset = self.filter_time_range(queryset)
+        else:
+            queryset = VehicleLocationRollup.objects.filter(resolution=resolution, **filters)
+            queryset = self.filter_time_range(queryset, 'bucket', resolution)
+        return queryset.select_related('vehicle').order_by('-recorded_at', '-id')
+
+    def list(self, request, *args, **kwargs):
+        """`?format=compact` returns columnar arrays read with `values()`, `?format=packed` a binary track."""
+        if request.accepted_renderer.format == PackedTrackRenderer.format:
+            return self.packed_list(request)
+        if request.accepted_renderer.format != CompactJSONRenderer.format:
+            return super().list(request, *args, **kwargs)
+
+        serializer_class = CompactRollupSerializer if self.get_resolution() else CompactLocationSerializer
+        queryset = self.filter_queryset(self.get_queryset()).values(*serializer_class.value_fields())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer_class(page).data)
+        return Response(serializer_class(queryset).data)
+
+    def packed_list(self, request):
+        """Whole track as one binary payload, oldest point first, unpaginated.
+
+        At most LOCATION_PACKED_MAX_POINTS points are returned; a longer track
+        is cut and flagged as truncated. `?compress=false` skips zlib.
+        """
+        speed_field = 'avg_speed' if self.get_resolution() else 'speed'
+        max_points = getattr(settings, 'LOCATION_PACKED_MAX_POINTS', 1000000)
+        rows = (
+            self.filter_queryset(self.get_queryset())
+            .order_by('recorded_at', 'id')
+            .values_list('vehicle_id', 'lat', 'lng', speed_field, 'heading', 'recorded_at')[:max_points + 1]
+            .iterator(chunk_size=getattr(settings, 'LOCATION_EXPORT_CHUNK_SIZE', 2000))
+        )
+        compress = request.query_params.get('compress', 'true').lower() not in ('0', 'false', 'no')
+        renderer = request.accepted_renderer
+        body = renderer.pack(islice(rows, max_points), compress=compress)
+        truncated = next(rows, None) is not None
+        if truncated:
+            body = renderer.mark_truncated(body)
+        response = HttpResponse(body, content_type=renderer.media_type)
+        response['X-Track-Truncated'] = 'true' if truncated else 'false'
+        return response
+
+
+class VehicleLocationViewSet(LocationHistoryMixin, viewsets.ReadOnlyModelViewSet):
+    """Vehicle location viewset."""
+    queryset = VehicleLocation.objects.all()
+    serializer_class = VehicleLocationSerializer
+    permission_classes = [VehicleAccessPermission]
+    pagination_class = LocationCursorPagination
 
-class VehicleLocationNestedViewSet(viewsets.ReadOnlyModelViewSet):
+    def get_queryset(self):
+        """Filter locations based on user vehicle permissions."""
+        # Admins can see all locations, users only those of their permitted vehicles
+        vehicle_ids = permitted_vehicle_ids(self.request.user)
+        filters = {} if vehicle_ids is None else {'vehicle_id__in': vehicle_ids}
+        return self.history_queryset(**filters)
+
+
+class VehicleLocationNestedViewSet(LocationHistoryMixin, viewsets.ReadOnlyModelViewSet):
     """Nested vehicle location viewset for specific vehicle."""
     serializer_class = VehicleLocationSerializer
     permission_classes = [VehicleAccessPermission]
+    pagination_class = LocationCursorPagination
     lookup_field = 'id'
 
     def get_queryset(self):
@@ -69,70 +224,60 @@ class VehicleLocationNestedViewSet(viewsets.ReadOnlyModelViewSet):
             return VehicleLocation.objects.none()
         
         # Check if user has permission to access this vehicle
-        user = self.request.user
-        
-        if user.role != 'ADMIN':
-            from planning.models import VehicleUserPermission
-            has_permission = VehicleUserPermission.objects.filter(
-                user=user,
-                vehicle_id=vehicle_id
-            ).exists()
-            if not has_permission:
-                return VehicleLocation.objects.none()
-        
-        queryset = VehicleLocation.objects.filter(vehicle_id=vehicle_id)
-        
-        # Apply date range filters
-        from_date = self.request.query_params.get('from', None)
-        to_date = self.request.query_params.get('to', None)
-        
-        if from_date:
-            try:
-                from_datetime = parse_datetime(from_date)
-                if from_datetime:
-                    queryset = queryset.filter(recorded_at__gte=from_datetime)
-            except (ValueError, TypeError):
-                pass
-        
-        if to_date:
-            try:
-                to_datetime = parse_datetime(to_date)
-                if to_datetime:
-                    queryset = queryset.filter(recorded_at__lte=to_datetime)
-            except (ValueError, TypeError):
-                pass
+        if not can_access_vehicle(self.request.user, vehicle_id):
+            return VehicleLocation.objects.none()
         
-        return queryset.order_by('-recorded_at')
+        return self.history_queryset(vehicle_id=vehicle_id)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def last_locations_view(request):
     """Get last known location for each permitted vehicle."""
-    from .serializers import VehicleLocationSerializer
+    from .serializers import VehicleCurrentLocationSerializer
     from vehicles.serializers import VehicleSerializer
     
-    user = request.user
-    
     # Get permitted vehicles
-    if user.role == 'ADMIN':
-        vehicles = Vehicle.objects.all()
-    else:
-        from planning.models import VehicleUserPermission
-        permitted_vehicle_ids = VehicleUserPermission.objects.filter(
-            user=user
-        ).values_list('vehicle_id', flat=True)
-        vehicles = Vehicle.objects.filter(id__in=permitted_vehicle_ids)
+    vehicles = Vehicle.objects.all()
+    vehicle_ids = permitted_vehicle_ids(request.user)
+    if vehicle_ids is not None:
+        vehicles = vehicles.filter(id__in=vehicle_ids)
     
-    # Get last location for each vehicle
+    # Positions come from the in-process cache; vehicles it does not hold are
+    # read from the current-position table (O(vehicles) rows, never history).
+    vehicles = list(vehicles)
+    if cache_enabled():
+        cached, missing = position_cache.get_many([vehicle.id for vehicle in vehicles])
+    else:
+        cached, missing = {}, [vehicle.id for vehicle in vehicles]
+
+    stored = {}
+    if missing:
+        stored = {
+            current.vehicle_id: current
+            for current in VehicleCurrentLocation.objects.filter(vehicle_id__in=missing)
+        }
+        position_cache.put_many([location_message(current) for current in stored.values()])
+
     last_locations = []
     for vehicle in vehicles:
-        last_location = VehicleLocation.objects.filter(
-            vehicle=vehicle
-        ).order_by('-recorded_at').first()
+        current_location = stored.get(vehicle.id)
+        message = cached.get(vehicle.id)
+        if message:
+            current_location = VehicleCurrentLocation(
+                vehicle=vehicle,
+                lat=Decimal(str(message['lat'])),
+                lng=Decimal(str(message['lng'])),
+                speed=message['speed'],
+                heading=message['heading'],
+                recorded_at=parse_datetime(message['recorded_at']),
+                source=message['source'],
+            )
+        elif current_location:
+            current_location.vehicle = vehicle
         
-        if last_location:
-            serializer = VehicleLocationSerializer(last_location)
+        if current_location:
+            serializer = VehicleCurrentLocationSerializer(current_location)
             last_locations.append(serializer.data)
         else:
             # Include vehicle info even if no location exists
@@ -150,6 +295,86 @@ def last_locations_view(request):
     return Response(last_locations)
 
 
+@api_view(['POST'])
+@permission_classes([IsAdminRole])
+def ingest_locations_view(request):
+    """Store a batch of REAL positions reported by trackers (admin only)."""
+    points = request.data
+    if isinstance(points, dict):
+        points = points.get('points')
+
+    if not isinstance(points, list) or not points:
+        return Response(
+            {'error': 'Body must be a non-empty list of points or {"points": [...]}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    max_points = getattr(settings, 'LOCATION_INGEST_MAX_POINTS', 5000)
+    if len(points) > max_points:
+        return Response(
+            {'error': f'At most {max_points} points can be sent per request'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    result = ingest_points(points)
+    return Response(
+        result,
+        status=status.HTTP_201_CREATED if result['accepted'] else status.HTTP_200_OK
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([NDJSONRenderer, CSVRenderer, GeoJSONRenderer])
+def export_locations_view(request):
+    """Stream the location history as NDJSON, CSV or GeoJSON.
+
+    Query params: `from` (required), `to`, `vehicle` (comma separated ids,
+    default every permitted vehicle) and `format` (ndjson, csv or geojson).
+    """
+    try:
+        from_datetime = parse_datetime(request.query_params.get('from', ''))
+        to_datetime = parse_datetime(request.query_params.get('to', ''))
+    except ValueError:
+        from_datetime = to_datetime = None
+    if from_datetime is None or (request.query_params.get('to') and to_datetime is None):
+        return Response(
+            {'error': '`from` (required) and `to` must be ISO 8601 datetimes'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    requested = set()
+    try:
+        for value in request.query_params.getlist('vehicle'):
+            requested.update(int(part) for part in value.split(',') if part)
+    except ValueError:
+        return Response(
+            {'error': '`vehicle` must be a comma separated list of ids'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    vehicles = Vehicle.objects.all()
+    permitted = permitted_vehicle_ids(request.user)
+    if permitted is not None:
+        vehicles = vehicles.filter(id__in=permitted)
+    if requested:
+        vehicles = vehicles.filter(id__in=requested)
+    vehicle_ids = set(vehicles.values_list('id', flat=True))
+    if requested - vehicle_ids:
+        return Response(
+            {'error': 'Vehicle not found or not permitted'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    renderer = request.accepted_renderer
+    return streaming_response(
+        request,
+        renderer.stream(export_rows(vehicle_ids, from_datetime, to_datetime)),
+        content_type=f'{renderer.media_type}; charset={renderer.charset}',
+        filename=f'locations.{renderer.format}',
+    )
+
+
 @api_view(['PUT'])
 @permission_classes([IsAdminRole])
 def set_simulation_route(request, vehicle_id):
@@ -205,8 +430,9 @@ def start_streaming(request, vehicle_id):
             status=status.HTTP_404_NOT_FOUND
         )
     
+    # The post_save signal publishes the change to the running streams
     vehicle.is_streaming = True
-    vehicle.save()
+    vehicle.save(update_fields=['is_streaming'])
     
     return Response({
         'message': 'Streaming started',
@@ -227,11 +453,61 @@ def stop_streaming(request, vehicle_id):
             status=status.HTTP_404_NOT_FOUND
         )
     
+    # The post_save signal publishes the change to the running streams
     vehicle.is_streaming = False
-    vehicle.save()
+    vehicle.save(update_fields=['is_streaming'])
     
     return Response({
         'message': 'Streaming stopped',
         'vehicle_id': vehicle_id,
         'streaming': False
     })
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminRole])
+def bulk_streaming_view(request):
+    """Start or stop streaming of many vehicles in one call (admin only).
+
+    Body: {"vehicles": [1, 2, ...], "streaming": true | false}
+    """
+    vehicle_ids = request.data.get('vehicles')
+    is_streaming = request.data.get('streaming')
+    if not isinstance(vehicle_ids, list) or not isinstance(is_streaming, bool):
+        return Response(
+            {'error': 'Expected {"vehicles": [ids], "streaming": true | false}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        vehicle_ids = {int(vehicle_id) for vehicle_id in vehicle_ids}
+    except (TypeError, ValueError):
+        return Response(
+            {'error': 'Vehicle ids must be integers'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    found = set(Vehicle.objects.filter(id__in=vehicle_ids).values_list('id', flat=True))
+    # update() skips the post_save signal, so the change is published here
+    Vehicle.objects.filter(id__in=found).update(is_streaming=is_streaming)
+    publish_streaming(found, is_streaming)
+
+    return Response({
+        'message': 'Streaming started' if is_streaming else 'Streaming stopped',
+        'vehicles': sorted(found),
+        'not_found': sorted(vehicle_ids - found),
+        'streaming': is_streaming
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminRole])
+def tracking_stats_view(request):
+    """Runtime counters of the tracking pipeline in this worker (admin only)."""
+    return Response({
+        'position_cache': position_cache.get_stats(),
+        'location_writer': writer.stats,
+        'spatial_index': grid_index.get_stats(),
+        'outbound': outbound_stats.get_stats(),
+        'user_cache': user_cache.get_stats(),
+        'access_cache': access_cache.get_stats(),
+    })
@@ -0,0 +1,126 @@
+"""
+Write-behind buffer for VehicleLocation rows.
+
+Producers (the simulation engine, ingestion consumers) hand rows to the shared
+writer instead of inserting them one by one. A background task drains the
+bounded queue and flushes it with ``bulk_create`` whenever the batch is full or
+the flush interval has elapsed. A full queue makes ``submit`` wait, which pushes
+back on the producers instead of growing memory without limit.
+
+Daphne does not run the ASGI lifespan protocol, so there is no asynchronous
+shutdown step: the only shutdown flush is the ``atexit`` hook below, which runs
+when the server exits normally (e.g. on SIGTERM) and is best effort (see
+``flush_sync``). A process that is killed (SIGKILL, a crashed worker) loses
+the rows still queued, which the periodic flush bounds to about
+LOCATION_WRITER_FLUSH_SECONDS of positions.
+"""
+import asyncio
+import atexit
+import logging
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from .cache import publish_positions
+from .models import VehicleCurrentLocation, VehicleLocation
+
+logger = logging.getLogger(__name__)
+
+
+class LocationWriter:
+    """Batch VehicleLocation inserts behind a bounded asyncio queue."""
+
+    def __init__(self, batch_size=None, flush_interval=None, max_queue=None):
+        self.batch_size = batch_size or getattr(settings, 'LOCATION_WRITER_BATCH_SIZE', 500)
+        self.flush_interval = flush_interval or getattr(settings, 'LOCATION_WRITER_FLUSH_SECONDS', 1.0)
+        self.max_queue = max_queue or getattr(settings, 'LOCATION_WRITER_MAX_QUEUE', 10000)
+        self.queue = None
+        self._task = None
+        self._pending = []
+        self.stats = {'written': 0, 'dropped': 0, 'failed': 0, 'flushes': 0}
+
+    def start(self):
+        """Bind the queue to the running event loop and start the flush task."""
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, location):
+        """Queue one row, waiting while the queue is full."""
+        self.start()
+        await self.queue.put(location)
+
+    async def submit_many(self, locations):
+        for location in locations:
+            await self.submit(location)
+
+    def submit_nowait(self, location):
+        """Queue one row without waiting; return False if it was dropped."""
+        self.start()
+        try:
+            self.queue.put_nowait(location)
+        except asyncio.QueueFull:
+            self.stats['dropped'] += 1
+            return False
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._pending.append(await self.queue.get())
+            deadline = loop.time() + self.flush_interval
+            while len(self._pending) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            batch, self._pending = self._pending, []
+            await database_sync_to_async(self._write)(batch)
+
+    def _drain(self):
+        batch, self._pending = self._pending, []
+        while self.queue is not None and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    def _write(self, batch, publish=True):
+        try:
+            with transaction.atomic():
+                VehicleLocation.objects.bulk_create(batch, batch_size=self.batch_size, ignore_conflicts=True)
+                VehicleCurrentLocation.objects.upsert_latest(batch)
+        except Exception:
+            self.stats['failed'] += len(batch)
+            logger.exception('Failed to write %d vehicle locations', len(batch))
+            return
+        self.stats['written'] += len(batch)
+        self.stats['flushes'] += 1
+        if publish:
+            publish_positions(batch)
+
+    async def flush(self):
+        """Write everything currently queued."""
+        batch = self._drain()
+        if batch:
+            await database_sync_to_async(self._write)(batch)
+
+    def flush_sync(self):
+        """Write the remaining rows from synchronous code (process exit).
+
+        It writes the rows still queued and the batch being collected, in the
+        calling thread and without the event loop. It cannot recover a batch
+        whose write was in flight when the loop stopped, nor the rows of
+        producers still waiting on a full queue, and it does not publish them
+        to the position caches (no loop is left to publish from).
+        """
+        batch = self._drain()
+        if batch:
+            # No event loop is left to publish cache updates from at exit
+            self._write(batch, publish=False)
+
+
+writer = LocationWriter()
+atexit.register(writer.flush_sync)
+
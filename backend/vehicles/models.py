@@ -41,6 +41,13 @@ class Vehicle(models.Model):
     def __str__(self):
         return f"{self.brand} {self.model} - {self.plate}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # حالة البث كما حُمّلت من قاعدة البيانات لمعرفة ما إذا تغيّرت عند الحفظ
+        instance._stored_is_streaming = instance.__dict__.get('is_streaming')
+        return instance
+
     def clean(self):
         """Validate vehicle data."""
         super().clean()
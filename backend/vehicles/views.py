@@ -2,9 +2,14 @@ from rest_framework import viewsets, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
 from .models import Vehicle
 from .serializers import VehicleSerializer
+from accounts.access import is_admin
 from accounts.permissions import VehicleAccessPermission, IsAdminRole
 
 class VehicleViewSet(viewsets.ModelViewSet):
@@ -38,13 +43,7 @@ class VehicleViewSet(viewsets.ModelViewSet):
             return Vehicle.objects.none()
             
         # 1. المسؤول (ADMIN/Superuser/Staff) يرى جميع المركبات دون قيود
-        is_admin = (
-            user.is_superuser or 
-            user.is_staff or 
-            (hasattr(user, 'role') and str(user.role).upper() == 'ADMIN')
-        )
-        
-        if is_admin:
+        if is_admin(user):
             return Vehicle.objects.all()
         
         # 2. المستخدم العادي (USER): يرى المركبات التي يملكها فقط
@@ -72,4 +71,87 @@ class VehicleViewSet(viewsets.ModelViewSet):
         if owner_id:
             serializer.save(owner_id=owner_id)
         else:
-            serializer.save(owner=self.request.user)
\ No newline at end of file
+            serializer.save(owner=self.request.user)
+
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        """
+        المركبات المتاحة خلال النافذة الزمنية [start, end): بدون خطة PLANNED أو ACTIVE متداخلة وليست في الصيانة.
+        - فلاتر القائمة نفسها متاحة (brand, status, plate, search, ordering).
+        - near=lat,lng مع radius_km: المركبات القريبة حسب آخر موقع معروف، مرتبة حسب المسافة.
+        """
+        from planning.models import Plan, TsTzRange
+        from tracking.geo import bbox_around, haversine_km
+
+        try:
+            start = parse_datetime(request.query_params.get('start', ''))
+            end = parse_datetime(request.query_params.get('end', ''))
+        except ValueError:
+            start = end = None
+        if start is None or end is None or start >= end:
+            return Response(
+                {'error': '`start` and `end` (ISO 8601, start before end) are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        if timezone.is_naive(end):
+            end = timezone.make_aware(end)
+
+        near = None
+        if request.query_params.get('near'):
+            try:
+                lat, lng = (float(part) for part in request.query_params['near'].split(','))
+                radius_km = float(request.query_params['radius_km'])
+            except (KeyError, ValueError):
+                lat = lng = radius_km = None
+            if lat is None or not (-90 <= lat <= 90 and -180 <= lng <= 180 and radius_km > 0):
+                return Response(
+                    {'error': '`near` must be "lat,lng" and `radius_km` a positive number'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            near = lat, lng, radius_km
+
+        # استعلام واحد مع NOT EXISTS يستخدم فهرس GiST الخاص بقيد منع تداخل الخطط
+        busy = Plan.objects.annotate(period=TsTzRange('start_at', 'end_at')).filter(
+            vehicle=OuterRef('pk'),
+            status__in=[Plan.Status.PLANNED, Plan.Status.ACTIVE],
+            period__overlap=DateTimeTZRange(start, end),
+        )
+        vehicles = self.filter_queryset(self.get_queryset()).exclude(
+            status=Vehicle.Status.MAINTENANCE
+        ).filter(~Exists(busy))
+
+        if near is None:
+            page = self.paginate_queryset(vehicles)
+            if page is not None:
+                return self.get_paginated_response(self.get_serializer(page, many=True).data)
+            return Response(self.get_serializer(vehicles, many=True).data)
+
+        # تصفية أولية بالمربع المحيط في قاعدة البيانات ثم المسافة الدقيقة
+        lat, lng, radius_km = near
+        south, west, north, east = bbox_around(lat, lng, radius_km)
+        lng_filter = (
+            Q(current_location__lng__gte=west, current_location__lng__lte=east) if west <= east
+            else Q(current_location__lng__gte=west) | Q(current_location__lng__lte=east)
+        )
+        candidates = vehicles.filter(
+            lng_filter, current_location__lat__gte=south, current_location__lat__lte=north
+        ).select_related('current_location')
+        nearby = []
+        for vehicle in candidates:
+            location = vehicle.current_location
+            distance = haversine_km(lat, lng, location.lat, location.lng)
+            if distance <= radius_km:
+                nearby.append((distance, vehicle))
+        nearby.sort(key=lambda item: item[0])
+
+        page = self.paginate_queryset(nearby)
+        rows = page if page is not None else nearby
+        data = [
+            {**self.get_serializer(vehicle).data, 'distance_km': round(distance, 3)}
+            for distance, vehicle in rows
+        ]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
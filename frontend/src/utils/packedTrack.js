@@ -0,0 +1,70 @@
+/**
+ * Decoder of the packed binary track returned by the location history
+ * endpoints with `?format=packed` (see PackedTrackRenderer in the backend).
+ *
+ * Usage:
+ *   const response = await api.get(`/vehicles/${id}/locations/?format=packed&from=...`, { responseType: 'arraybuffer' })
+ *   const track = await decodePackedTrack(response.data)
+ */
+
+const MAGIC = 'VTRK'
+const HEADER_SIZE = 20
+const FLAG_ZLIB = 1
+const FLAG_TRUNCATED = 2
+const COORDINATE_SCALE = 1e6
+
+const inflate = async (buffer) => {
+  const stream = new Blob([buffer]).stream().pipeThrough(new DecompressionStream('deflate'))
+  return await new Response(stream).arrayBuffer()
+}
+
+export const decodePackedTrack = async (arrayBuffer) => {
+  const header = new DataView(arrayBuffer, 0, HEADER_SIZE)
+  const magic = String.fromCharCode(...new Uint8Array(arrayBuffer, 0, 4))
+  if (magic !== MAGIC) {
+    throw new Error('Not a packed track')
+  }
+  const flags = header.getUint8(5)
+  const count = header.getUint32(8, true)
+  const baseTime = Number(header.getBigInt64(12, true))
+
+  let body = arrayBuffer.slice(HEADER_SIZE)
+  if (flags & FLAG_ZLIB) {
+    body = await inflate(body)
+  }
+
+  const column = (index, Type) => new Type(body, index * count * 4, count)
+  const vehicles = column(0, Int32Array)
+  const timeDeltas = column(1, Int32Array)
+  const latDeltas = column(2, Int32Array)
+  const lngDeltas = column(3, Int32Array)
+  const speeds = column(4, Float32Array)
+  const headings = column(5, Float32Array)
+
+  // Undo the delta encoding into plain arrays usable by the map
+  const times = new Float64Array(count)
+  const lats = new Float64Array(count)
+  const lngs = new Float64Array(count)
+  let time = baseTime
+  let lat = 0
+  let lng = 0
+  for (let i = 0; i < count; i++) {
+    time += timeDeltas[i]
+    lat += latDeltas[i]
+    lng += lngDeltas[i]
+    times[i] = time
+    lats[i] = lat / COORDINATE_SCALE
+    lngs[i] = lng / COORDINATE_SCALE
+  }
+
+  return {
+    count,
+    truncated: Boolean(flags & FLAG_TRUNCATED),
+    vehicles,
+    times,
+    lats,
+    lngs,
+    speeds,
+    headings,
+  }
+}